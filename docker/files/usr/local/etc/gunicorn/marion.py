@@ -1,4 +1,7 @@
 # Gunicorn-django settings
+import os
+from pathlib import Path
+
 bind = ["0.0.0.0:8000"]
 name = "marion"
 python_path = "/app"
@@ -7,6 +10,15 @@ python_path = "/app"
 graceful_timeout = 90
 timeout = 90
 workers = 3
+# Use memory instead of the container file system for workers heartbeat
+worker_tmp_dir = "/dev/shm"
+
+# Recycle workers to release memory retained by document renderings: workers
+# are restarted after a (jittered) number of requests and when marion's memory
+# watchdog flags them (see the MARION_WORKER_MAX_RSS and
+# MARION_WORKER_MAX_RENDERS settings and the post_request hook below)
+max_requests = 1000
+max_requests_jitter = 100
 
 # Logging
 # Using '-' for the access log file makes gunicorn log accesses to stdout
@@ -14,3 +26,59 @@ accesslog = "-"
 # Using '-' for the error log file makes gunicorn log errors to stderr
 errorlog = "-"
 loglevel = "info"
+
+
+# Metrics
+# When the PROMETHEUS_MULTIPROC_DIR environment variable is set, marion's
+# metrics are aggregated across workers using prometheus_client's multiprocess
+# mode (see the MARION_METRICS_ENABLED setting)
+def on_starting(server):  # pylint: disable=unused-argument
+    """Remove metrics files left by a previous run"""
+
+    metrics_dir = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if metrics_dir is None:
+        return
+    for path in Path(metrics_dir).glob("*.db"):
+        path.unlink()
+
+
+def child_exit(server, worker):  # pylint: disable=unused-argument
+    """Remove live gauges metrics files of an exited worker"""
+
+    if "PROMETHEUS_MULTIPROC_DIR" not in os.environ:
+        return
+
+    # pylint: disable=import-outside-toplevel
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
+
+
+# Renderer
+def post_worker_init(worker):  # pylint: disable=unused-argument
+    """Start marion's renderer before handling requests.
+
+    With the MARION_RENDERER_CLASS = "marion.renderers.ProcessPoolRenderer"
+    setting, render worker processes are forked and warmed up once the
+    application has been loaded, instead of during the first rendering request.
+
+    """
+
+    # pylint: disable=import-outside-toplevel
+    from marion.renderers import get_renderer
+
+    get_renderer().start()
+
+
+# Memory watchdog
+def post_request(worker, req, environ, resp):  # pylint: disable=unused-argument
+    """Gracefully recycle the worker once marion's memory watchdog asks to"""
+
+    # pylint: disable=import-outside-toplevel
+    from marion.watchdog import memory_watchdog
+
+    if memory_watchdog.recycle_reason is not None:
+        worker.log.info(
+            "Recycling worker %s: %s", worker.pid, memory_watchdog.recycle_reason
+        )
+        worker.alive = False
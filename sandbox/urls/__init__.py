@@ -9,6 +9,7 @@ urlpatterns = (
     [
         path("admin/", admin.site.urls),
         path("api/documents/", include("marion.urls")),
+        path("metrics/", include("marion.urls.metrics")),
     ]
     + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
     + static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
@@ -0,0 +1,80 @@
+"""Benchmark samples for the howard application"""
+
+import base64
+from pathlib import Path
+
+STATIC_ROOT = Path(__file__).parent / "static"
+
+
+def _data_uri(static_path, mime_type):
+    """Get a base64-encoded data URI for an howard static file"""
+
+    encoded = base64.b64encode(STATIC_ROOT.joinpath(static_path).read_bytes())
+    return f"data:{mime_type};base64,{encoded.decode()}"
+
+
+# Certificates are usually issued for the same organization, with the same
+# signature and logo (passed as data URIs)
+ORGANIZATION = {
+    "name": "Arnold's",
+    "representative": "Arnold Takahashi",
+    "signature": _data_uri("howard/test-signature.png", "image/png"),
+    "logo": _data_uri("howard/logo-fun.png", "image/png"),
+}
+
+SAMPLES = {
+    "howard.issuers.CertificateDocument": {
+        "student": {"name": "Richie Cunningham"},
+        "course": {"name": "Rock'n'roll 101"},
+        "organization": ORGANIZATION,
+    },
+    "howard.issuers.InvoiceDocument": {
+        "metadata": {
+            "reference": "20210101000000-a1b2c3d4",
+            "issued_on": "2021-01-01T00:00:00Z",
+            "type": "invoice",
+        },
+        "order": {
+            "customer": {
+                "name": "Richie Cunningham",
+                "address": "565 North Clinton Drive, Milwaukee",
+            },
+            "company": "Happy Days",
+            "product": {
+                "name": "Rock'n'roll 101",
+                "description": "An introduction to rock'n'roll",
+            },
+            "amount": {
+                "total": "120.00",
+                "subtotal": "100.00",
+                "vat_amount": "20.00",
+                "vat": "20.00",
+                "currency": "€",
+            },
+            "seller": {"address": "Arnold's, Milwaukee"},
+        },
+    },
+    "howard.issuers.RealisationCertificate": {
+        "student": {
+            "first_name": "Richie",
+            "last_name": "Cunningham",
+            "gender": "Mr",
+            "organization": {"name": "Happy Days"},
+        },
+        "course_run": {
+            "course": {
+                "name": "Rock'n'roll 101",
+                "duration": 10,
+                "scope": "action de formation",
+                "organization": {"name": "Arnold's"},
+            },
+            "start": "2021-01-01",
+            "end": "2021-03-01",
+            "manager": {
+                "first_name": "Arnold",
+                "last_name": "Takahashi",
+                "position": "Owner",
+            },
+        },
+    },
+}
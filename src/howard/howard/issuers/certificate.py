@@ -80,3 +80,7 @@ class CertificateDocument(AbstractDocument):
             "delivery_stamp": self.created,
             **context,
         }
+
+    def get_bookmark_label(self) -> str:
+        """Label certificates with the student name in merged PDF files"""
+        return self.context.student.name
@@ -155,3 +155,8 @@ class RealisationCertificate(AbstractDocument):
             "delivery_stamp": self.created,
             **self.context_query.model_dump(),
         }
+
+    def get_bookmark_label(self) -> str:
+        """Label certificates with the student name in merged PDF files"""
+        student = self.context.student
+        return f"{student.first_name} {student.last_name}"
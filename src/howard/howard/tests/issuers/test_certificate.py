@@ -4,6 +4,7 @@ import datetime
 import re
 import uuid
 
+from howard.benchmarks import SAMPLES
 from howard.issuers.certificate import (
     CertificateDocument,
     ContextQueryModel,
@@ -88,3 +89,14 @@ def test_certificate_should_render_without_error(context_query):
     with certificate_document_path.open("rb") as certificate_document_file:
         text_content = pdf_extract_text(certificate_document_file)
         assert re.search(".*CERTIFICATE.*", text_content)
+
+
+def test_certificate_get_bookmark_label():
+    """Test certificates bookmark label in merged PDF files"""
+
+    certificate_document = CertificateDocument(
+        context_query=SAMPLES["howard.issuers.CertificateDocument"]
+    )
+    certificate_document.set_context(certificate_document.fetch_context())
+
+    assert certificate_document.get_bookmark_label() == "Richie Cunningham"
@@ -4,6 +4,7 @@ import datetime
 import uuid
 
 import pytest
+from howard.benchmarks import SAMPLES
 from howard.issuers.realisation import (
     ArrowDate,
     ContextQueryModel,
@@ -80,3 +81,14 @@ def test_realisation_certificate_fetch_context(monkeypatch, context_query):
     context = test_certificate.fetch_context()
 
     assert context == expected
+
+
+def test_realisation_certificate_get_bookmark_label():
+    """Test realisation certificates bookmark label in merged PDF files"""
+
+    test_certificate = RealisationCertificate(
+        context_query=SAMPLES["howard.issuers.RealisationCertificate"]
+    )
+    test_certificate.set_context(test_certificate.fetch_context())
+
+    assert test_certificate.get_bookmark_label() == "Richie Cunningham"
@@ -2,9 +2,44 @@
 
 from django.apps import AppConfig
 
+from . import defaults, metrics
+from .cache import preload_templates
+from .registry import build_registry
+from .signals import document_created
+from .utils import preload_static_files
+from .watchdog import memory_watchdog
+
 
 class DocumentsConfig(AppConfig):
     """Documents application configuration"""
 
-    default = False
-    name = "document"
+    name = "marion"
+
+    def ready(self):
+        """Build the issuers registry and warm up issuers rendering caches"""
+
+        # pylint: disable=import-outside-toplevel,unused-import
+        from . import checks  # noqa: F401
+
+        if metrics.is_enabled():
+            document_created.connect(
+                metrics.observe_document_created, dispatch_uid="marion.metrics"
+            )
+        if memory_watchdog.enabled:
+            document_created.connect(
+                memory_watchdog.document_created, dispatch_uid="marion.watchdog"
+            )
+
+        try:
+            registry = build_registry()
+        except ImportError:
+            # Reported by the marion.E001 system check
+            return
+
+        if defaults.PRELOAD_TEMPLATES:
+            preload_templates(registry.get(issuer) for issuer in registry)
+
+        if defaults.PRELOAD_STATIC_FILES:
+            # Issuers static files are expected to be stored in a directory
+            # named after the application that provides them
+            preload_static_files({issuer.split(".")[0] for issuer in registry})
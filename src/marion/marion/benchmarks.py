@@ -0,0 +1,175 @@
+"""Benchmarks for the marion application.
+
+Benchmark samples are dictionaries mapping an issuer class path to a context
+query that will be used to render documents with this issuer. Django
+applications that ship issuers may define their own samples (see
+`howard.benchmarks.SAMPLES`).
+
+"""
+
+import math
+import resource
+import statistics
+import time
+import uuid
+
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+from rest_framework.test import APIRequestFactory
+
+from .cache import clear_font_config, images, templates
+from .models import DocumentRequest
+from .utils import static_files_cache
+from .watchdog import get_rss
+
+SAMPLES = {
+    "marion.issuers.DummyDocument": {"fullname": "Richie Cunningham"},
+}
+
+
+def clear_caches():
+    """Clear all rendering caches to perform cold renderings"""
+
+    clear_font_config()
+    images.clear()
+    templates.clear()
+    static_files_cache.clear()
+
+
+def time_renders(issuer_class, context_query, iterations=10, cold=False):
+    """Render a document `iterations` times and return durations (in seconds).
+
+    When `cold` is True, rendering caches are cleared before each rendering.
+
+    """
+
+    durations = []
+    for _ in range(iterations):
+        if cold:
+            clear_caches()
+        document = issuer_class(context_query=context_query)
+        start = time.perf_counter()
+        document.create(persist=False)
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def time_list_requests(issuer_path, context_query, rows=1000, iterations=10):
+    """List `rows` document requests `iterations` times using the API and
+    return durations (in seconds).
+
+    Document requests are listed in a single page (note that the page size is
+    limited by the DOCUMENT_REQUESTS_MAX_PAGE_SIZE setting).
+
+    Document requests are created (without rendering their document) in a
+    transaction that is rolled back once the benchmark is done.
+
+    """
+
+    # pylint: disable=import-outside-toplevel
+    from .views import DocumentRequestViewSet
+
+    document = import_string(issuer_path)(context_query=context_query)
+    document.load_context()
+    template = DocumentRequest(issuer=issuer_path)
+    template.set_document(document)
+
+    view = DocumentRequestViewSet.as_view({"get": "list"})
+    factory = APIRequestFactory()
+    durations = []
+    with transaction.atomic():
+        DocumentRequest.objects.bulk_create(
+            DocumentRequest(
+                issuer=template.issuer,
+                context_query=template.context_query,
+                context=template.context,
+                context_digest=template.context_digest,
+                status=template.status,
+                document_id=uuid.uuid4(),
+            )
+            for _ in range(rows)
+        )
+        for _ in range(iterations):
+            start = time.perf_counter()
+            view(factory.get("/", {"page_size": rows})).render()
+            durations.append(time.perf_counter() - start)
+        transaction.set_rollback(True)
+    return durations
+
+
+def time_batch_renders(
+    issuer_class, context_query, batch_size=10, iterations=10, cold=False
+):
+    """Render `iterations` batches of `batch_size` documents and return
+    durations per batch (in seconds).
+
+    Batches are rendered using the issuer's create_many method. When `cold` is
+    True, rendering caches are cleared before each batch.
+
+    """
+
+    durations = []
+    for _ in range(iterations):
+        if cold:
+            clear_caches()
+        start = time.perf_counter()
+        for _, result in issuer_class.create_many(
+            [context_query] * batch_size, persist=False
+        ):
+            if isinstance(result, Exception):
+                raise result
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def get_output_size(issuer_class, context_query):
+    """Get the size (in bytes) of a rendered document"""
+    return len(issuer_class(context_query=context_query).create(persist=False))
+
+
+def get_peak_rss():
+    """Get the current process peak resident set size (in KiB)"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def soak_renders(issuer_class, context_query, renders=10000, interval=1000):
+    """Render `renders` documents and sample the process resident set size.
+
+    The resident set size (in bytes, see the watchdog.get_rss function) is
+    sampled before rendering and every `interval` renders. Returns a list of
+    (renders, rss) tuples: memory usage is bounded if it stabilizes once
+    rendering caches are warm.
+
+    """
+
+    samples = [(0, get_rss())]
+    for index in range(1, renders + 1):
+        issuer_class(context_query=context_query).create(persist=False)
+        if index % interval == 0 or index == renders:
+            samples.append((index, get_rss()))
+    return samples
+
+
+def percentile(values, percent):
+    """Get the nearest-rank percentile of sorted values"""
+    return values[max(math.ceil(percent / 100 * len(values)) - 1, 0)]
+
+
+def summarize(durations, documents=1):
+    """Summarize durations (in seconds) as milliseconds statistics.
+
+    `documents` is the number of documents rendered per duration (_e.g._ the
+    batch size), it is used to compute the rendering throughput.
+
+    """
+
+    milliseconds = sorted(duration * 1000 for duration in durations)
+    return {
+        "mean": statistics.mean(milliseconds),
+        "min": milliseconds[0],
+        "max": milliseconds[-1],
+        "p50": percentile(milliseconds, 50),
+        "p95": percentile(milliseconds, 95),
+        "docs_per_second": documents * len(durations) / sum(durations),
+    }
@@ -0,0 +1,328 @@
+"""Rendering caches for the marion application.
+
+Those caches are process-wide: they are shared by all documents rendered by
+the current process (e.g. a gunicorn worker), whatever their issuer.
+
+"""
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+
+from weasyprint import CSS
+from weasyprint.images import RasterImage
+from weasyprint.text.fonts import FontConfiguration
+
+from . import defaults
+
+
+class LRUCache:
+    """Thread-safe bounded cache with a least recently used eviction policy.
+
+    By default, the cache size is the number of cached entries. A `weigh`
+    function can be provided to compute the weight of each cached value
+    (e.g. its size in bytes), in which case the cache size is the sum of
+    cached values weight. Values heavier than the maximum size are never
+    cached.
+
+    Cache hits and misses are counted to monitor cache efficiency.
+
+    """
+
+    def __init__(self, maxsize=128, weigh=None):
+        self.maxsize = maxsize
+        self.weigh = weigh
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __len__(self):
+        return len(self._data)
+
+    def _weigh(self, value):
+        """Get the weight of a cached value"""
+        return 1 if self.weigh is None else self.weigh(value)
+
+    def get(self, key, default=None):
+        """Get cached value for this key (or the default value if missing)"""
+
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        """Cache value for this key and evict least recently used entries"""
+
+        weight = self._weigh(value)
+        if weight > self.maxsize:
+            return
+
+        with self._lock:
+            if key in self._data:
+                self.size -= self._weigh(self._data.pop(key))
+            self._data[key] = value
+            self.size += weight
+            while self.size > self.maxsize:
+                _, evicted = self._data.popitem(last=False)
+                self.size -= self._weigh(evicted)
+
+    def clear(self):
+        """Remove all cached entries and reset counters"""
+
+        with self._lock:
+            self._data.clear()
+            self.size = 0
+            self.hits = 0
+            self.misses = 0
+
+    @property
+    def stats(self):
+        """Get cache statistics"""
+
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": self.size,
+            "maxsize": self.maxsize,
+        }
+
+
+class FontConfigurationCache:
+    """Process-wide Weasyprint's FontConfiguration cache.
+
+    Instantiating a FontConfiguration loads the fontconfig configuration,
+    system fonts and creates a new Pango font map; this is costly and useless
+    to perform for every rendered document. As Pango font maps are not
+    thread-safe, a font configuration is cached per thread.
+
+    Cached font configurations can be invalidated using the `clear` method
+    (e.g. when fonts have been installed or removed): each thread will
+    instantiate a fresh configuration during its next `get` call.
+
+    """
+
+    def __init__(self):
+        self._generation = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @property
+    def generation(self):
+        """Get the current cache generation (incremented by each clear)"""
+        return self._generation
+
+    def get(self) -> FontConfiguration:
+        """Get the cached font configuration for the current thread"""
+
+        generation = self._generation
+        if getattr(self._local, "generation", None) != generation:
+            self._local.font_config = FontConfiguration()
+            self._local.generation = generation
+        return self._local.font_config
+
+    def clear(self):
+        """Invalidate cached font configurations for all threads"""
+
+        with self._lock:
+            self._generation += 1
+
+
+font_configurations = FontConfigurationCache()
+
+
+def get_font_config() -> FontConfiguration:
+    """Get a font configuration to render a document.
+
+    Return the cached font configuration when the cache is active (see the
+    FONT_CONFIGURATION_CACHE setting), or a fresh instance otherwise.
+
+    """
+
+    if not defaults.FONT_CONFIGURATION_CACHE:
+        return FontConfiguration()
+    return font_configurations.get()
+
+
+def clear_font_config():
+    """Invalidate the font configuration cache"""
+
+    font_configurations.clear()
+    # Cached stylesheets are bound to invalidated font configurations
+    stylesheets.clear()
+
+
+stylesheets = LRUCache(maxsize=defaults.CSS_CACHE_SIZE)
+
+
+def get_stylesheet(issuer_class, css: str, font_config: FontConfiguration) -> CSS:
+    """Get a parsed stylesheet given its rendered CSS string.
+
+    Parsed stylesheets are cached given the issuer class and the rendered CSS
+    string digest. As font faces declared in the stylesheet are registered in
+    the font configuration while parsing the stylesheet, a cached stylesheet
+    is only used along with the font configuration it has been parsed with.
+
+    Stylesheets are not cached when the CSS cache or the font configuration
+    cache is disabled (see the CSS_CACHE_SIZE and FONT_CONFIGURATION_CACHE
+    settings).
+
+    """
+
+    if not defaults.CSS_CACHE_SIZE or not defaults.FONT_CONFIGURATION_CACHE:
+        return CSS(string=css, font_config=font_config)
+
+    key = (issuer_class, hashlib.sha256(css.encode()).hexdigest(), font_config)
+    stylesheet = stylesheets.get(key)
+    if stylesheet is None:
+        stylesheet = CSS(string=css, font_config=font_config)
+        stylesheets.set(key, stylesheet)
+    return stylesheet
+
+
+class TemplateCache:
+    """Compiled templates cache.
+
+    Compiled templates are cached per issuer class, template engine and
+    template path. When `check_mtime` is True, the template source file
+    modification time is checked for each `get` call, and the template is
+    compiled again if its source file has changed since it has been cached.
+
+    """
+
+    def __init__(self):
+        self._templates = {}
+
+    def __len__(self):
+        return len(self._templates)
+
+    @staticmethod
+    def _get_mtime(template):
+        """Get template source file modification time (if any)"""
+
+        try:
+            return os.stat(template.origin.name).st_mtime
+        except (AttributeError, TypeError, OSError):
+            return None
+
+    def get(self, issuer_class, engine, template_path, check_mtime=False):
+        """Get the compiled template for this issuer class and path"""
+
+        key = (issuer_class, engine, str(template_path))
+        cached = self._templates.get(key)
+        if cached is not None:
+            template, mtime = cached
+            if not check_mtime or self._get_mtime(template) == mtime:
+                return template
+
+        template = engine.get_template(template_path)
+        self._templates[key] = (template, self._get_mtime(template))
+        return template
+
+    def clear(self):
+        """Remove all cached templates"""
+
+        self._templates.clear()
+
+
+templates = TemplateCache()
+
+
+def get_template(issuer_class, engine, template_path):
+    """Get a compiled template for an issuer class.
+
+    Compiled templates are cached unless the TEMPLATE_CACHE setting is
+    disabled. In debug mode, template source files modification time is
+    checked to compile modified templates again, while in production, cached
+    templates are never invalidated.
+
+    """
+
+    if not defaults.TEMPLATE_CACHE:
+        return engine.get_template(template_path)
+    return templates.get(
+        issuer_class, engine, template_path, check_mtime=settings.DEBUG
+    )
+
+
+def preload_templates(issuer_classes):
+    """Compile and cache HTML and CSS templates of issuer classes"""
+
+    for issuer_class in issuer_classes:
+        issuer = issuer_class()
+        issuer.get_html()
+        issuer.get_css()
+
+
+images = LRUCache(maxsize=defaults.IMAGE_CACHE_SIZE)
+
+
+class DataURIImageCache(dict):
+    """Weasyprint images cache sharing data URI images across renderings.
+
+    Weasyprint caches images fetched while rendering a document in a
+    dictionary keyed by image URL. When the image URL is a data URI (e.g.
+    `data:image/png;base64,...`), decoded raster images are also stored in
+    the process-wide `images` LRU cache keyed by the data URI SHA-256 digest,
+    so that documents embedding the same data URI image reuse it instead of
+    decoding and parsing it again.
+
+    Other entries (e.g. images fetched from other URLs or raster images
+    data) are only cached for the current rendering, and SVG images are never
+    shared as they are bound to the layout context of the rendered document.
+
+    """
+
+    @staticmethod
+    def _get_digest(key):
+        """Get the cache key digest if the key is a data URI"""
+
+        if isinstance(key, str) and key.startswith("data:"):
+            return hashlib.sha256(key.encode()).hexdigest()
+        return None
+
+    def __contains__(self, key):
+        if super().__contains__(key):
+            return True
+
+        digest = self._get_digest(key)
+        if digest is None:
+            return False
+        image = images.get(digest)
+        if image is None:
+            return False
+        super().__setitem__(key, image)
+        return True
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+
+        digest = self._get_digest(key)
+        if digest is not None and isinstance(value, RasterImage):
+            images.set(digest, value)
+
+
+def get_image_cache():
+    """Get a Weasyprint images cache to render a document.
+
+    Return None (default Weasyprint's images cache) when the IMAGE_CACHE_SIZE
+    setting is set to 0.
+
+    """
+
+    if not defaults.IMAGE_CACHE_SIZE:
+        return None
+    return DataURIImageCache()
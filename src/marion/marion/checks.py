@@ -0,0 +1,82 @@
+"""System checks for the marion application"""
+
+from django.core import checks
+from django.utils.module_loading import import_string
+
+from . import defaults, metrics
+from .registry import get_registry
+
+# Maximum number of bulk document requests rendered one after the other in a
+# single API request before exceeding usual web servers timeouts
+SEQUENTIAL_BULK_MAX_ITEMS = 50
+
+
+@checks.register()
+def check_issuers_registry(app_configs, **kwargs):  # pylint: disable=unused-argument
+    """Check that active issuers can be imported and looked up by class name"""
+
+    try:
+        registry = get_registry()
+    except ImportError as error:
+        return [
+            checks.Error(
+                f"An active document issuer cannot be imported: {error}",
+                hint="Check the MARION_DOCUMENT_ISSUER_CHOICES_CLASS setting.",
+                id="marion.E001",
+            )
+        ]
+
+    return [
+        checks.Warning(
+            f"Document issuer class name {name} is ambiguous: {', '.join(paths)}",
+            hint="Use issuer full paths to look them up.",
+            id="marion.W001",
+        )
+        for name, paths in registry.ambiguous_names.items()
+    ]
+
+
+@checks.register()
+def check_metrics(app_configs, **kwargs):  # pylint: disable=unused-argument
+    """Check that metrics can be collected when they are enabled"""
+
+    if defaults.METRICS_ENABLED and metrics.prometheus_client is None:
+        return [
+            checks.Error(
+                "Metrics are enabled but the prometheus_client package is not "
+                "installed",
+                hint="Install marion with the metrics extra: django-marion[metrics].",
+                id="marion.E002",
+            )
+        ]
+    return []
+
+
+@checks.register()
+def check_bulk_rendering(app_configs, **kwargs):  # pylint: disable=unused-argument
+    """Check that bulk document requests can be rendered within an API request"""
+
+    if defaults.DOCUMENT_REQUEST_MODE != "sync":
+        return []
+    try:
+        renderer_class = import_string(defaults.RENDERER_CLASS)
+    except ImportError:
+        return []
+    if (
+        getattr(renderer_class, "parallel", False)
+        or defaults.BULK_MAX_ITEMS <= SEQUENTIAL_BULK_MAX_ITEMS
+    ):
+        return []
+    return [
+        checks.Warning(
+            f"Up to {defaults.BULK_MAX_ITEMS} bulk document requests are rendered "
+            "one after the other in a single API request",
+            hint=(
+                "Render documents in parallel with the MARION_RENDERER_CLASS = "
+                '"marion.renderers.ProcessPoolRenderer" setting, or lower the '
+                f"MARION_BULK_MAX_ITEMS setting (to {SEQUENTIAL_BULK_MAX_ITEMS} "
+                "at most)."
+            ),
+            id="marion.W002",
+        )
+    ]
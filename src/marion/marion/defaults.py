@@ -16,15 +16,57 @@ from django.conf import settings
 from django.db.models import TextChoices
 from django.utils.translation import gettext_lazy as _
 
+BULK_MAX_ITEMS = getattr(settings, "MARION_BULK_MAX_ITEMS", 50)
+CSS_CACHE_SIZE = getattr(settings, "MARION_CSS_CACHE_SIZE", 128)
+DEDUPLICATE_DOCUMENTS = getattr(settings, "MARION_DEDUPLICATE_DOCUMENTS", False)
 DOCUMENT_ISSUER_CHOICES_CLASS = getattr(
     settings,
     "MARION_DOCUMENT_ISSUER_CHOICES_CLASS",
     "marion.defaults.DocumentIssuerChoices",
 )
+DOCUMENT_REQUESTS_MAX_PAGE_SIZE = getattr(
+    settings, "MARION_DOCUMENT_REQUESTS_MAX_PAGE_SIZE", 1000
+)
+DOCUMENT_REQUESTS_PAGE_SIZE = getattr(
+    settings, "MARION_DOCUMENT_REQUESTS_PAGE_SIZE", 100
+)
+DOCUMENT_REQUEST_MODE = getattr(settings, "MARION_DOCUMENT_REQUEST_MODE", "sync")
+DOCUMENTS_RETENTION = getattr(settings, "MARION_DOCUMENTS_RETENTION", {})
 DOCUMENTS_ROOT = getattr(settings, "MARION_DOCUMENTS_ROOT", Path(settings.MEDIA_ROOT))
+DOCUMENTS_SHARD_DEPTH = getattr(settings, "MARION_DOCUMENTS_SHARD_DEPTH", 0)
+DOCUMENTS_SHARD_WIDTH = getattr(settings, "MARION_DOCUMENTS_SHARD_WIDTH", 2)
+DOCUMENTS_STORAGE = getattr(settings, "MARION_DOCUMENTS_STORAGE", None)
 DOCUMENTS_TEMPLATE_ROOT = getattr(
     settings, "MARION_DOCUMENTS_TEMPLATE_ROOT", Path("marion")
 )
+DOWNLOAD_CHUNK_SIZE = getattr(settings, "MARION_DOWNLOAD_CHUNK_SIZE", 64 * 1024)
+DOWNLOAD_SENDFILE_HEADER = getattr(settings, "MARION_DOWNLOAD_SENDFILE_HEADER", None)
+DOWNLOAD_SENDFILE_URL_PREFIX = getattr(
+    settings, "MARION_DOWNLOAD_SENDFILE_URL_PREFIX", None
+)
+FONT_CONFIGURATION_CACHE = getattr(settings, "MARION_FONT_CONFIGURATION_CACHE", True)
+IDEMPOTENCY_KEY_TTL = getattr(settings, "MARION_IDEMPOTENCY_KEY_TTL", 24 * 60 * 60)
+IDEMPOTENCY_KEY_WAIT_TIMEOUT = getattr(
+    settings, "MARION_IDEMPOTENCY_KEY_WAIT_TIMEOUT", 30
+)
+IMAGE_CACHE_SIZE = getattr(settings, "MARION_IMAGE_CACHE_SIZE", 64)
+METRICS_ENABLED = getattr(settings, "MARION_METRICS_ENABLED", False)
+PRELOAD_STATIC_FILES = getattr(settings, "MARION_PRELOAD_STATIC_FILES", False)
+PRELOAD_TEMPLATES = getattr(settings, "MARION_PRELOAD_TEMPLATES", False)
+RENDERER_CLASS = getattr(
+    settings, "MARION_RENDERER_CLASS", "marion.renderers.LocalRenderer"
+)
+RENDER_POOL_MAX_TASKS_PER_WORKER = getattr(
+    settings, "MARION_RENDER_POOL_MAX_TASKS_PER_WORKER", None
+)
+RENDER_POOL_SIZE = getattr(settings, "MARION_RENDER_POOL_SIZE", None)
+RENDER_POOL_TIMEOUT = getattr(settings, "MARION_RENDER_POOL_TIMEOUT", None)
+STATIC_FILES_CACHE_MAX_BYTES = getattr(
+    settings, "MARION_STATIC_FILES_CACHE_MAX_BYTES", 32 * 1024 * 1024
+)
+TEMPLATE_CACHE = getattr(settings, "MARION_TEMPLATE_CACHE", True)
+WORKER_MAX_RENDERS = getattr(settings, "MARION_WORKER_MAX_RENDERS", None)
+WORKER_MAX_RSS = getattr(settings, "MARION_WORKER_MAX_RSS", None)
 
 
 class DocumentIssuerChoices(TextChoices):
@@ -45,3 +45,12 @@ class DocumentIssuerMissingContextQuery(Exception):
     to perform an action, e.g. to create a document.
 
     """
+
+
+class DocumentIssuerRenderingTimeout(Exception):
+    """Document issuer rendering timeout error.
+
+    This exception is raised when a document rendering delegated to a render
+    worker process did not complete in time.
+
+    """
@@ -0,0 +1,58 @@
+"""Filters for the marion application"""
+
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.translation import gettext_lazy as _
+
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+from .registry import get_registry
+
+
+class DocumentRequestFilterBackend(BaseFilterBackend):
+    """Filter document requests using query parameters.
+
+    - issuer: the issuer path (or any unambiguous name of an active issuer)
+    - created_after: document requests created at or after this ISO 8601
+      date and time
+    - created_before: document requests created before this ISO 8601 date and
+      time
+
+    """
+
+    date_filters = (
+        ("created_after", "created_on__gte"),
+        ("created_before", "created_on__lt"),
+    )
+
+    def filter_queryset(self, request, queryset, view):
+        issuer = request.query_params.get("issuer")
+        if issuer:
+            registry = get_registry()
+            if issuer in registry:
+                issuer = registry.get_path(issuer)
+            queryset = queryset.filter(issuer=issuer)
+
+        for param, lookup in self.date_filters:
+            value = request.query_params.get(param)
+            if value:
+                queryset = queryset.filter(
+                    **{lookup: self.parse_datetime(param, value)}
+                )
+
+        return queryset
+
+    @staticmethod
+    def parse_datetime(param, value):
+        """Parse an ISO 8601 date and time query parameter"""
+
+        try:
+            parsed = parse_datetime(value)
+        except ValueError:
+            parsed = None
+        if parsed is None:
+            raise ValidationError({param: _("Enter a valid date/time.")})
+        if timezone.is_naive(parsed):
+            parsed = timezone.make_aware(parsed)
+        return parsed
@@ -1,10 +1,12 @@
 """Base document issuer for the marion application"""
 
+import time
 import uuid
 from abc import ABC, abstractmethod
 from typing import Union
+from urllib.parse import urlsplit
 
-from django.conf import settings
+from django.core.files.storage import FileSystemStorage
 from django.template import Context
 from django.template.engine import Engine
 from django.utils import timezone
@@ -13,19 +15,22 @@ from django.utils.text import re_camel_case
 from django.utils.translation import gettext_lazy as _
 
 from pydantic import BaseModel, ValidationError
-from weasyprint import CSS, DEFAULT_OPTIONS, HTML
+from weasyprint import DEFAULT_OPTIONS, HTML
 from weasyprint.document import DocumentMetadata
-from weasyprint.text.fonts import FontConfiguration
 
 from marion import __version__ as marion_version
 
 from .. import defaults
+from ..cache import get_font_config, get_image_cache, get_stylesheet, get_template
 from ..exceptions import (
     DocumentIssuerContextQueryValidationError,
     DocumentIssuerContextValidationError,
     DocumentIssuerMissingContext,
     DocumentIssuerMissingContextQuery,
 )
+from ..metrics import track_render
+from ..signals import document_created
+from ..storage import get_storage, open_for_writing
 from ..utils import static_file_fetcher
 
 
@@ -141,6 +146,9 @@ class AbstractDocument(PDFFileMetadataMixin, ABC):
         self.css = None
         self.html = None
 
+        # Rendering phases durations (in seconds)
+        self.timings = {}
+
         super().__init__()
 
     @classmethod
@@ -154,7 +162,7 @@ class AbstractDocument(PDFFileMetadataMixin, ABC):
             if isinstance(context, str):
                 context = cls.context_model.model_validate_json(context)
             elif isinstance(context, dict):
-                context = cls.context_model(**context)
+                context = cls.context_model.model_validate(context)
         except ValidationError as error:
             raise DocumentIssuerContextValidationError(
                 _(f"Document issuer context string is not valid: {error}")
@@ -176,7 +184,7 @@ class AbstractDocument(PDFFileMetadataMixin, ABC):
                     context_query
                 )
             if isinstance(context_query, dict):
-                context_query = cls.context_query_model(**context_query)
+                context_query = cls.context_query_model.model_validate(context_query)
         except ValidationError as error:
             raise DocumentIssuerContextQueryValidationError(
                 _(f"Document issuer context query string is not valid: {error}")
@@ -206,12 +214,11 @@ class AbstractDocument(PDFFileMetadataMixin, ABC):
         """Get a template from its relative path.
 
         This method always tries to return a template using the default
-        template engine if it is not set.
+        template engine if it is not set. Compiled templates are cached per
+        issuer class (see the marion.cache.get_template function).
 
         """
-        if self.template_engine is None:
-            template_engine = self.get_template_engine()
-        return template_engine.get_template(template_path)
+        return get_template(self.__class__, self.get_template_engine(), template_path)
 
     def generate_identifier(self, identifier=None):
         """Generate the document identifier.
@@ -236,20 +243,111 @@ class AbstractDocument(PDFFileMetadataMixin, ABC):
 
         if hasattr(self, "document_path") and self.document_path is not None:
             return self.document_path
-        return defaults.DOCUMENTS_ROOT.joinpath(f"{self.identifier}.pdf")
+        return self.get_default_document_path(self.identifier)
+
+    def get_document_name(self):
+        """Get (generated) document name in the documents storage.
+
+        The document name is the document path relative to the DOCUMENTS_ROOT
+        setting (see the DOCUMENTS_STORAGE setting). Documents located outside
+        of the DOCUMENTS_ROOT directory (_e.g._ when the get_document_path
+        method is overridden) are named after their file name in the
+        configured documents storage, or else written to their path (see the
+        write_pdf method).
+
+        """
+
+        document_path = self.get_document_path()
+        try:
+            return document_path.relative_to(defaults.DOCUMENTS_ROOT).as_posix()
+        except ValueError:
+            return document_path.name
 
     def get_document_url(self, host=None, schema="https"):
         """Get (generated) document URL.
 
         If the host argument is provided a fully qualified URL will be
-        returned, or else, an absolute URL will be generated.
+        returned, or else, an absolute URL will be generated (unless the
+        documents storage generates fully qualified URLs).
+
+        """
+        return self._get_document_name_url(self.get_document_name(), host, schema)
+
+    @classmethod
+    def get_default_document_name(cls, identifier, shard_depth=None):
+        """Get the default document name in the documents storage for a document
+        identifier (see the `get_default_document_path` method).
+
+        Documents are sharded in nested directories named after the identifier
+        first characters, _e.g._ `ab/cd/abcdef12-[...].pdf` with a shard depth
+        of 2 (default: the DOCUMENTS_SHARD_DEPTH setting, 0 means that all
+        documents are stored in the same directory).
 
         """
-        relative_path = self.get_document_path().relative_to(defaults.DOCUMENTS_ROOT)
-        relative_url = f"{settings.MEDIA_URL}{relative_path}"
-        if host is None:
-            return relative_url
-        return f"{schema}://{host}{relative_url}"
+
+        if shard_depth is None:
+            shard_depth = defaults.DOCUMENTS_SHARD_DEPTH
+        width = defaults.DOCUMENTS_SHARD_WIDTH
+        prefix = str(identifier).replace("-", "")
+        shards = [
+            prefix[start:][:width] for start in range(0, shard_depth * width, width)
+        ]
+        return "/".join([*filter(None, shards), f"{identifier}.pdf"])
+
+    @classmethod
+    def get_default_document_path(cls, identifier):
+        """Get the default document path for a document identifier.
+
+        Contrary to the `get_document_path` method, the issuer does not need to
+        be instantiated (hence the context query validated) to compute it.
+
+        """
+        return defaults.DOCUMENTS_ROOT.joinpath(
+            cls.get_default_document_name(identifier)
+        )
+
+    @classmethod
+    def get_default_document_url(cls, identifier, host=None, schema="https"):
+        """Get the default document URL for a document identifier.
+
+        See the `get_default_document_path` and `get_document_url` methods.
+
+        """
+        return cls._get_document_name_url(
+            cls.get_default_document_name(identifier), host, schema
+        )
+
+    @classmethod
+    def has_default_document_location(cls):
+        """Whether documents path, name and URL only depend on their identifier.
+
+        It is the case unless the issuer overrides the `get_document_path`,
+        `get_document_name` or `get_document_url` methods.
+
+        """
+        return (
+            cls.get_document_path is AbstractDocument.get_document_path
+            and cls.get_document_name is AbstractDocument.get_document_name
+            and cls.get_document_url is AbstractDocument.get_document_url
+        )
+
+    @staticmethod
+    def _get_document_name_url(document_name, host=None, schema="https"):
+        """Get the URL of a document given its name in the documents storage"""
+
+        url = get_storage().url(document_name)
+        if host is None or urlsplit(url).netloc:
+            return url
+        return f"{schema}://{host}{url}"
+
+    def get_bookmark_label(self):
+        """Get document bookmark label in merged PDF files.
+
+        Default label is the document PDF file title or the document
+        identifier.
+
+        """
+        return self.get_title() or self.identifier
 
     def get_css(self):
         """Get CSS template instance"""
@@ -320,6 +418,22 @@ class AbstractDocument(PDFFileMetadataMixin, ABC):
         """Validate and set context passed as a dictionary instance"""
         self.context = self.validate_context(context)
 
+    def load_context(self):
+        """Fetch, validate and set the document context"""
+
+        start = time.perf_counter()
+        context = self.fetch_context()
+        start = self._time_phase("fetch_context", start)
+        self.set_context(context)
+        self._time_phase("validate_context", start)
+
+    def _time_phase(self, phase, start):
+        """Record a rendering phase duration and return the current time"""
+
+        now = time.perf_counter()
+        self.timings[phase] = now - start
+        return now
+
     def get_django_context(self) -> Context:
         """Get the Django Context instance from the context model instance."""
         return Context(self.context.model_dump())
@@ -346,8 +460,9 @@ class AbstractDocument(PDFFileMetadataMixin, ABC):
         - persist<bool> = True
 
             By default persist is True. In this way file is created and
-            persisted into the document_path finally the path of the document is
-            returned as a pathlib.Path instance.
+            persisted into the documents storage (see the DOCUMENTS_STORAGE
+            setting) finally the path of the document is returned as a
+            pathlib.Path instance.
 
             When persist is False, document is created without persisting. In
             this case create returns the PDF document as bytes.
@@ -358,38 +473,216 @@ class AbstractDocument(PDFFileMetadataMixin, ABC):
             Check to see all available options:
             https://doc.courtbouillon.org/weasyprint/stable/api_reference.html#weasyprint.DEFAULT_OPTIONS
 
+        Rendering phases durations (in seconds) are stored in the timings
+        attribute and sent with the document_created signal.
+
+        """
+
+        with track_render(self.__class__):
+            return self.write_pdf(
+                self.render(), persist=persist, pdf_options=pdf_options
+            )
+
+    @classmethod
+    def create_many(
+        cls, context_queries, persist=True, pdf_options: DEFAULT_OPTIONS = None
+    ):
+        """Create documents for many context queries.
+
+        Templates, font configuration, parsed stylesheets and images are
+        shared across all documents of the batch. Documents are created
+        lazily: (document, result) tuples are yielded in the context queries
+        order, result being either the create method result for this document
+        or the exception raised while creating it (document is None if the
+        context query is not valid).
+
+        Context queries can also be issuer instances, _e.g._ with a set
+        identifier or context.
+
+        """
+
+        templates = {}
+        font_config = get_font_config()
+        image_cache = get_image_cache()
+        if image_cache is None:
+            image_cache = {}
+
+        for context_query in context_queries:
+            document = None
+            try:
+                document = cls._get_batch_document(context_query, templates)
+                with track_render(cls):
+                    result = document.write_pdf(
+                        document.render(
+                            font_config=font_config, image_cache=image_cache
+                        ),
+                        persist=persist,
+                        pdf_options=pdf_options,
+                    )
+            except Exception as error:  # pylint: disable=broad-except
+                result = error
+            yield document, result
+
+    @classmethod
+    def create_merged(
+        cls, context_queries, target=None, pdf_options: DEFAULT_OPTIONS = None
+    ):
+        """Create a single PDF file with documents for many context queries.
+
+        Documents are rendered with shared resources (see create_many) and
+        their pages are concatenated in a single Weasyprint document: fonts
+        and images used by many documents are only embedded once in the PDF
+        file. Each document gets a top-level bookmark (see the
+        get_bookmark_label method), its own bookmarks being nested. PDF file
+        metadata are those of the first document.
+
+        Arguments:
+
+        - context_queries<iterable>
+
+            Documents context queries (or issuer instances).
+
+        - target<str|pathlib.Path|file object> = None
+
+            Where the PDF file is written. When target is None, the PDF file is
+            returned as bytes.
+
+        - pdf_options<dict>
+
+            Additional options to pass to Weasyprint's write_pdf method (see
+            create).
+
+        A ValueError is raised if there is no document (with pages) to merge.
+
+        """
+
+        templates = {}
+        font_config = get_font_config()
+        image_cache = get_image_cache()
+        if image_cache is None:
+            image_cache = {}
+
+        first_rendered = None
+        pages = []
+        for context_query in context_queries:
+            document = cls._get_batch_document(context_query, templates)
+            rendered = document.render(font_config=font_config, image_cache=image_cache)
+            if not rendered.pages:
+                continue
+            for page in rendered.pages:
+                page.bookmarks = [
+                    (level + 1, label, position, state)
+                    for level, label, position, state in page.bookmarks
+                ]
+            rendered.pages[0].bookmarks.insert(
+                0, (1, document.get_bookmark_label(), (0, 0), "closed")
+            )
+            pages.extend(rendered.pages)
+            if first_rendered is None:
+                first_rendered = rendered
+
+        if first_rendered is None:
+            raise ValueError(
+                str(_("At least one document is required to create a merged PDF"))
+            )
+
+        return first_rendered.copy(pages).write_pdf(
+            target=target, **cls._get_write_pdf_options(pdf_options)
+        )
+
+    @classmethod
+    def _get_batch_document(cls, context_query, templates):
+        """Get a document sharing templates with other documents of a batch"""
+
+        document = (
+            context_query
+            if isinstance(context_query, cls)
+            else cls(context_query=context_query)
+        )
+        if not templates:
+            templates.update(html=document.get_html(), css=document.get_css())
+        if document.html is None:
+            document.html = templates["html"]
+        if document.css is None:
+            document.css = templates["css"]
+        return document
+
+    def render(self, font_config=None, image_cache=None):
+        """Render the document as a Weasyprint document.
+
+        The document context is fetched if required. A font configuration and
+        an images cache can be provided to share them with other renderings.
+
         """
 
         if self.context is None:
-            self.set_context(self.fetch_context())
+            self.load_context()
 
+        start = time.perf_counter()
         django_context = self.get_django_context()
         html_str = self.get_html().render(django_context)
         css_str = self.get_css().render(django_context)
+        start = self._time_phase("templates", start)
 
-        font_config = FontConfiguration()
+        if font_config is None:
+            font_config = get_font_config()
+        if image_cache is None:
+            image_cache = get_image_cache()
         html = HTML(string=html_str, url_fetcher=static_file_fetcher)
-        css = CSS(string=css_str, font_config=font_config)
+        css = get_stylesheet(self.__class__, css_str, font_config)
+        start = self._time_phase("parse", start)
 
-        document = html.render(stylesheets=[css], font_config=font_config)
+        document = html.render(
+            stylesheets=[css], font_config=font_config, cache=image_cache
+        )
+        self._time_phase("layout", start)
         document.metadata = self.metadata
+        return document
 
-        common_options = {"zoom": 1}
-        cleaned_pdf_options = (
-            self._clean_pdf_options(pdf_options) if pdf_options else {}
+    def write_pdf(self, document, persist=True, pdf_options: DEFAULT_OPTIONS = None):
+        """Write the rendered Weasyprint document as PDF (see create).
+
+        Once written, the document_created signal is sent with the rendering
+        phases durations (see the timings attribute) and the PDF size.
+
+        """
+
+        options = self._get_write_pdf_options(pdf_options)
+
+        start = time.perf_counter()
+        if persist is False:
+            result = document.write_pdf(**options)
+            size = len(result)
+        else:
+            result = self.get_document_path()
+            storage, name = get_storage(), self.get_document_name()
+            if defaults.DOCUMENTS_STORAGE is None and not result.is_relative_to(
+                defaults.DOCUMENTS_ROOT
+            ):
+                # Documents located outside of the DOCUMENTS_ROOT directory are
+                # written to their path in the local file system
+                storage, name = FileSystemStorage(location=result.parent), result.name
+            # The PDF is streamed to the documents storage
+            with open_for_writing(storage, name) as target:
+                document.write_pdf(target=target, **options)
+                size = target.tell()
+        self._time_phase("write_pdf", start)
+
+        document_created.send(
+            sender=self.__class__, document=self, timings=self.timings, size=size
         )
+        return result
+
+    @classmethod
+    def _get_write_pdf_options(cls, pdf_options: DEFAULT_OPTIONS = None) -> dict:
+        """Get Weasyprint's write_pdf method options given additional pdf options"""
+
+        common_options = {"zoom": 1}
+        cleaned_pdf_options = cls._clean_pdf_options(pdf_options) if pdf_options else {}
 
         if "uncompressed_pdf" not in cleaned_pdf_options:
             # MARK: Disable PDF compression by default until this issue is fixed:
             # https://github.com/Kozea/WeasyPrint/issues/1885
             cleaned_pdf_options["uncompressed_pdf"] = True
 
-        if persist is False:
-            return document.write_pdf(**common_options, **cleaned_pdf_options)
-
-        document_path = self.get_document_path()
-        document.write_pdf(
-            target=document_path, **common_options, **cleaned_pdf_options
-        )
-
-        return document_path
+        return {**common_options, **cleaned_pdf_options}
@@ -0,0 +1 @@
+"""Management for the marion application"""
@@ -0,0 +1,257 @@
+"""Benchmark document issuers rendering"""
+
+import json
+import platform
+from datetime import datetime, timezone
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.module_loading import import_string
+
+import weasyprint
+
+from ... import __version__, benchmarks
+
+
+class Command(BaseCommand):
+    """Render documents for each benchmark sample and report latencies.
+
+    Each issuer is benchmarked with cold rendering caches (caches are cleared
+    before each rendering) and warm rendering caches, rendering documents one
+    at a time and in batches. The document requests API list latency can also
+    be benchmarked using the --list-rows option.
+
+    Results can be written as JSON (see the --output option) to compare
+    versions. Note that the reported peak RSS is the benchmark process peak
+    resident set size so far.
+
+    The --soak option renders many documents per issuer while sampling the
+    process resident set size, to check that memory usage remains bounded
+    (Linux only): the command fails if it grows by more than the
+    --soak-max-growth option once rendering caches are warm.
+
+    """
+
+    help = "Benchmark document issuers rendering"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--samples",
+            action="append",
+            help=(
+                "Python path to benchmark samples (can be used multiple times, "
+                "default: marion.benchmarks.SAMPLES)"
+            ),
+        )
+        parser.add_argument(
+            "--issuer",
+            action="append",
+            help="Only benchmark this issuer (can be used multiple times)",
+        )
+        parser.add_argument(
+            "--iterations",
+            type=int,
+            default=10,
+            help="Number of documents (or batches) to render per issuer and scenario",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=10,
+            help="Number of documents per batch in batch scenarios",
+        )
+        parser.add_argument(
+            "--list-rows",
+            type=int,
+            default=None,
+            help=(
+                "Also benchmark the document requests API list latency with "
+                "this number of document requests per issuer (e.g. 1000)"
+            ),
+        )
+        parser.add_argument(
+            "--soak",
+            type=int,
+            default=None,
+            help=(
+                "Also render this number of documents per issuer while sampling "
+                "the process resident set size (e.g. 10000)"
+            ),
+        )
+        parser.add_argument(
+            "--soak-interval",
+            type=int,
+            default=1000,
+            help="Number of renders between resident set size samples",
+        )
+        parser.add_argument(
+            "--soak-max-growth",
+            type=float,
+            default=None,
+            help=(
+                "Fail if the resident set size grows by more than this number "
+                "of MiB after the first soak interval"
+            ),
+        )
+        parser.add_argument(
+            "--output",
+            help="Write benchmark results as JSON to this file",
+        )
+
+    def handle(self, *args, **options):
+        if options["soak"] and benchmarks.get_rss() is None:
+            raise CommandError(
+                "The process resident set size cannot be read on this platform "
+                "(/proc/self/statm is required by the --soak option)"
+            )
+
+        samples = {}
+        for samples_path in options["samples"] or ["marion.benchmarks.SAMPLES"]:
+            samples.update(import_string(samples_path))
+
+        results = []
+        for issuer_path, context_query in samples.items():
+            if options["issuer"] and issuer_path not in options["issuer"]:
+                continue
+            results += self.benchmark_issuer(issuer_path, context_query, options)
+
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as output:
+                json.dump(
+                    {
+                        "date": datetime.now(timezone.utc).isoformat(),
+                        "marion": __version__,
+                        "weasyprint": weasyprint.__version__,
+                        "python": platform.python_version(),
+                        "platform": platform.platform(),
+                        "iterations": options["iterations"],
+                        "batch_size": options["batch_size"],
+                        "results": results,
+                    },
+                    output,
+                    indent=2,
+                )
+
+        if options["soak_max_growth"] is not None:
+            unbounded = [
+                result["issuer"]
+                for result in results
+                if result["scenario"] == "soak"
+                and result["rss_growth"] > options["soak_max_growth"] * 1024**2
+            ]
+            if unbounded:
+                raise CommandError(
+                    f"Resident set size grew by more than "
+                    f"{options['soak_max_growth']}MiB while rendering documents "
+                    f"of: {', '.join(unbounded)}"
+                )
+
+    def benchmark_issuer(self, issuer_path, context_query, options):
+        """Run all benchmark scenarios for an issuer and return results"""
+
+        issuer_class = import_string(issuer_path)
+
+        # Perform a first rendering to exclude one-time initialization costs
+        benchmarks.time_renders(issuer_class, context_query, iterations=1)
+        output_size = benchmarks.get_output_size(issuer_class, context_query)
+
+        results = []
+        for scenario, cold in (("cold", True), ("warm", False)):
+            for mode, batch_size in (("single", 1), ("batch", options["batch_size"])):
+                if mode == "single":
+                    durations = benchmarks.time_renders(
+                        issuer_class,
+                        context_query,
+                        iterations=options["iterations"],
+                        cold=cold,
+                    )
+                else:
+                    durations = benchmarks.time_batch_renders(
+                        issuer_class,
+                        context_query,
+                        batch_size=batch_size,
+                        iterations=options["iterations"],
+                        cold=cold,
+                    )
+                results.append(
+                    {
+                        "issuer": issuer_path,
+                        "scenario": scenario,
+                        "mode": mode,
+                        "batch_size": batch_size,
+                        "output_size": output_size,
+                        "peak_rss": benchmarks.get_peak_rss(),
+                        **benchmarks.summarize(durations, documents=batch_size),
+                    }
+                )
+                self.write_result(results[-1])
+
+        if options["list_rows"]:
+            results.append(
+                {
+                    "issuer": issuer_path,
+                    "scenario": "list",
+                    "mode": "api",
+                    "rows": options["list_rows"],
+                    "peak_rss": benchmarks.get_peak_rss(),
+                    **benchmarks.summarize(
+                        benchmarks.time_list_requests(
+                            issuer_path,
+                            context_query,
+                            rows=options["list_rows"],
+                            iterations=options["iterations"],
+                        )
+                    ),
+                }
+            )
+            self.write_result(results[-1])
+
+        if options["soak"]:
+            samples = benchmarks.soak_renders(
+                issuer_class,
+                context_query,
+                renders=options["soak"],
+                interval=options["soak_interval"],
+            )
+            results.append(
+                {
+                    "issuer": issuer_path,
+                    "scenario": "soak",
+                    "mode": "single",
+                    "renders": options["soak"],
+                    "rss_samples": samples,
+                    # Growth after the first interval (rendering caches are warm)
+                    "rss_growth": samples[-1][1] - samples[1][1],
+                }
+            )
+            self.write_soak_result(results[-1])
+
+        return results
+
+    def write_result(self, result):
+        """Write a benchmark result line"""
+
+        label = f"{result['issuer']} [{result['scenario']} {result['mode']}]"
+        if "rows" in result:
+            label = f"{result['issuer']} [list {result['rows']} rows]"
+        line = (
+            f"{label} "
+            f"p50: {result['p50']:.1f}ms "
+            f"p95: {result['p95']:.1f}ms "
+            f"mean: {result['mean']:.1f}ms "
+            f"docs/s: {result['docs_per_second']:.1f} "
+            f"peak RSS: {result['peak_rss'] / 1024:.1f}MiB"
+        )
+        if "output_size" in result:
+            line += f" size: {result['output_size'] / 1024:.1f}KiB"
+        self.stdout.write(line)
+
+    def write_soak_result(self, result):
+        """Write a soak benchmark result line"""
+
+        samples = result["rss_samples"]
+        self.stdout.write(
+            f"{result['issuer']} [soak {result['renders']} renders] "
+            f"RSS: {samples[0][1] / 1024 ** 2:.1f}MiB "
+            f"-> {samples[-1][1] / 1024 ** 2:.1f}MiB "
+            f"growth after warm-up: {result['rss_growth'] / 1024 ** 2:.1f}MiB"
+        )
@@ -0,0 +1,132 @@
+"""Generate documents for pending document requests"""
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from ...models import DocumentRequest, DocumentRequestStatus
+from ...watchdog import memory_watchdog
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    """Claim pending document requests and generate their document.
+
+    Pending document requests are stored by the API in the asynchronous
+    request mode (see the DOCUMENT_REQUEST_MODE setting). The database is used
+    as a job queue: multiple workers can safely run concurrently.
+
+    While a document is rendered, the update date of its document request is
+    refreshed periodically (see the --heartbeat option), so that other
+    workers do not requeue it as stalled (see the --requeue-after option).
+
+    The command exits once the memory watchdog flags the process for recycling
+    (see the WORKER_MAX_RSS and WORKER_MAX_RENDERS settings): it is expected
+    to be restarted by a process manager.
+
+    """
+
+    help = "Generate documents for pending document requests"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Exit once there is no pending document request left",
+        )
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=1.0,
+            help="Time (in seconds) to wait before polling pending requests again",
+        )
+        parser.add_argument(
+            "--requeue-after",
+            type=float,
+            default=None,
+            help=(
+                "Switch back running document requests to pending after this "
+                "time (in seconds) without heartbeat, e.g. when their worker has "
+                "been killed"
+            ),
+        )
+        parser.add_argument(
+            "--heartbeat",
+            type=float,
+            default=10.0,
+            help=(
+                "Time (in seconds) between refreshes of the rendered document "
+                "request update date (default: 10)"
+            ),
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            if options["requeue_after"] is not None:
+                requeued = DocumentRequest.requeue_stalled(options["requeue_after"])
+                if requeued:
+                    logger.warning("Requeued %d stalled document requests", requeued)
+
+            document_request = DocumentRequest.claim_pending()
+            if document_request is None:
+                if options["once"]:
+                    return
+                time.sleep(options["sleep"])
+                continue
+
+            with self.heartbeat(document_request, options["heartbeat"]):
+                self.process(document_request)
+
+            if memory_watchdog.recycle_reason is not None:
+                logger.warning(
+                    "Exiting to recycle the worker: %s", memory_watchdog.recycle_reason
+                )
+                return
+
+    @staticmethod
+    @contextmanager
+    def heartbeat(document_request, interval):
+        """Refresh the document request update date while it is processed"""
+
+        stop = threading.Event()
+
+        def beat():
+            try:
+                while not stop.wait(interval):
+                    if not document_request.heartbeat():
+                        logger.warning(
+                            "Document request %s is no longer running",
+                            document_request.pk,
+                        )
+                        return
+            finally:
+                # Close the database connection opened by this thread
+                connection.close()
+
+        thread = threading.Thread(target=beat, daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            thread.join()
+
+    def process(self, document_request):
+        """Generate the document of a claimed document request"""
+
+        try:
+            document_request.generate_document()
+        except Exception as error:  # pylint: disable=broad-except
+            logger.exception(
+                "Document request %s rendering failed", document_request.pk
+            )
+            document_request.status = DocumentRequestStatus.FAILED
+            document_request.error = str(error)
+        document_request.save()
+
+        self.stdout.write(f"{document_request.pk} {document_request.status}")
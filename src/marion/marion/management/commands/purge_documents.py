@@ -0,0 +1,175 @@
+"""Delete expired and orphaned generated documents"""
+
+import logging
+from datetime import timedelta
+
+from django.core.files.storage import Storage
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from ... import defaults
+from ...models import DocumentRequest
+from ...storage import get_storage, walk_documents
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    """Apply documents retention policies and delete orphaned documents.
+
+    Document requests older than their issuer retention period (see the
+    DOCUMENTS_RETENTION setting) are deleted with their document. Documents
+    without document request (_e.g._ when saving the document request failed
+    after the document has been generated) are deleted once they are older
+    than the grace period.
+
+    Orphaned documents are found by walking the documents storage and the
+    document requests table sorted by identifier at the same time, hence
+    document requests are never loaded into memory all at once (documents are
+    listed one directory at a time, see the walk_documents function). Only
+    documents stored in the flat layout or in the configured shards layout
+    are walked, and each orphaned document is checked again against the
+    database before being deleted. As the grace period relies on documents
+    modification time, orphaned documents are not deleted if the storage does
+    not support it.
+
+    """
+
+    help = "Delete expired and orphaned generated documents"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.storage = None
+        self.dry_run = False
+        self.reclaimed = 0
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--grace-period",
+            type=float,
+            default=60 * 60,
+            help=(
+                "Only delete orphaned documents older than this time (in "
+                "seconds, default: 3600)"
+            ),
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of document requests fetched from the database at once",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report documents that would be deleted",
+        )
+
+    def handle(self, *args, **options):
+        self.storage = get_storage()
+        self.dry_run = options["dry_run"]
+        self.reclaimed = 0
+
+        # Checked before deleting anything
+        supports_modified_time = (
+            type(self.storage).get_modified_time is not Storage.get_modified_time
+        )
+        if not supports_modified_time:
+            self.stderr.write(
+                "The documents storage does not support files modification time: "
+                "orphaned documents will not be deleted"
+            )
+
+        expired = self.purge_expired(options["batch_size"])
+        orphaned = 0
+        if supports_modified_time:
+            orphaned = self.purge_orphaned(
+                timedelta(seconds=options["grace_period"]), options["batch_size"]
+            )
+
+        self.stdout.write(
+            f"{'Would delete' if self.dry_run else 'Deleted'} {expired} expired "
+            f"document requests and {orphaned} orphaned documents "
+            f"({self.reclaimed} bytes reclaimed)"
+        )
+
+    def delete_document(self, document_name):
+        """Delete a document from the storage and count reclaimed bytes"""
+
+        self.reclaimed += self.storage.size(document_name)
+        if not self.dry_run:
+            self.storage.delete(document_name)
+
+    def purge_expired(self, batch_size):
+        """Delete document requests older than their issuer retention period"""
+
+        deleted = 0
+        for issuer, days in defaults.DOCUMENTS_RETENTION.items():
+            if days is None:
+                continue
+
+            expired = (
+                DocumentRequest.objects.filter(
+                    issuer=issuer,
+                    created_on__lt=timezone.now() - timedelta(days=days),
+                )
+                .only("pk", "issuer", "document_id")
+                .order_by("pk")
+            )
+            batch = []
+            for document_request in expired.iterator(chunk_size=batch_size):
+                if document_request.document_id is not None:
+                    document_name = document_request.find_document_name(self.storage)
+                    if document_name is not None:
+                        self.delete_document(document_name)
+                batch.append(document_request.pk)
+                if len(batch) == batch_size:
+                    deleted += self.delete_document_requests(batch)
+                    batch = []
+            deleted += self.delete_document_requests(batch)
+        return deleted
+
+    def delete_document_requests(self, pks):
+        """Delete a batch of document requests"""
+
+        if not self.dry_run:
+            DocumentRequest.objects.filter(pk__in=pks).delete()
+        return len(pks)
+
+    def purge_orphaned(self, grace_period, batch_size):
+        """Delete documents that are not referenced by any document request"""
+
+        identifiers = (
+            str(document_id)
+            for document_id in DocumentRequest.objects.filter(document_id__isnull=False)
+            .order_by("document_id")
+            .values_list("document_id", flat=True)
+            .iterator(chunk_size=batch_size)
+        )
+        limit = timezone.now() - grace_period
+
+        deleted = 0
+        identifier = next(identifiers, None)
+        for document_identifier, document_name in walk_documents(self.storage):
+            # Merge join: skip document requests identifiers lower than the
+            # document identifier
+            while identifier is not None and identifier < document_identifier:
+                identifier = next(identifiers, None)
+            if identifier == document_identifier:
+                continue
+
+            try:
+                if self.storage.get_modified_time(document_name) >= limit:
+                    continue
+            except NotImplementedError:
+                logger.warning(
+                    "Orphaned document %s kept: its modification time is unknown",
+                    document_name,
+                )
+                continue
+            # The document request may have been created since the walk started
+            if DocumentRequest.objects.filter(document_id=document_identifier).exists():
+                continue
+            self.delete_document(document_name)
+            deleted += 1
+        return deleted
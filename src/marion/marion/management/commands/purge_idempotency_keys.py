@@ -0,0 +1,15 @@
+"""Delete expired idempotency keys"""
+
+from django.core.management.base import BaseCommand
+
+from ...models import IdempotencyKey
+
+
+class Command(BaseCommand):
+    """Delete idempotency keys older than the IDEMPOTENCY_KEY_TTL setting"""
+
+    help = "Delete expired idempotency keys"
+
+    def handle(self, *args, **options):
+        deleted = IdempotencyKey.purge_expired()
+        self.stdout.write(f"Deleted {deleted} expired idempotency keys")
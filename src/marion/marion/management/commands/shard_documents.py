@@ -0,0 +1,100 @@
+"""Move generated documents to the sharded documents layout"""
+
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from ...exceptions import InvalidDocumentIssuer
+from ...models import DocumentRequest, DocumentRequestStatus
+from ...registry import get_issuer_class
+from ...storage import get_storage, move_document
+
+
+class Command(BaseCommand):
+    """Move generated documents to the layout set by DOCUMENTS_SHARD_DEPTH.
+
+    Documents are moved in parallel (using threads) from the layout they have
+    been generated with (the flat layout by default, see the --from-depth
+    option). The command can safely be interrupted and run again.
+
+    """
+
+    help = "Move generated documents to the sharded documents layout"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--from-depth",
+            type=int,
+            default=0,
+            help="Shard depth documents have been generated with (default: 0)",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=8,
+            help="Number of documents moved in parallel",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of document requests fetched from the database at once",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report documents that would be moved",
+        )
+
+    def handle(self, *args, **options):
+        storage = get_storage()
+        if options["dry_run"]:
+
+            def move(names):
+                return storage.exists(names[0])
+
+        else:
+
+            def move(names):
+                return move_document(storage, *names)
+
+        moved = missing = 0
+        moves = self.get_moves(options["from_depth"], options["batch_size"])
+        with ThreadPoolExecutor(max_workers=options["workers"]) as executor:
+            while True:
+                batch = list(itertools.islice(moves, options["batch_size"]))
+                if not batch:
+                    break
+                for result in executor.map(move, batch):
+                    if result:
+                        moved += 1
+                    else:
+                        missing += 1
+
+        self.stdout.write(
+            f"{'Would move' if options['dry_run'] else 'Moved'} {moved} documents "
+            f"({missing} not found)"
+        )
+
+    @staticmethod
+    def get_moves(from_depth, chunk_size):
+        """Yield (source, target) names of documents to move"""
+
+        document_requests = DocumentRequest.objects.filter(
+            status=DocumentRequestStatus.DONE, document_id__isnull=False
+        ).values_list("issuer", "document_id")
+        for issuer, document_id in document_requests.iterator(chunk_size=chunk_size):
+            try:
+                issuer_class = get_issuer_class(issuer)
+            except InvalidDocumentIssuer:
+                continue
+            if not issuer_class.has_default_document_location():
+                continue
+
+            source = issuer_class.get_default_document_name(
+                document_id, shard_depth=from_depth
+            )
+            target = issuer_class.get_default_document_name(document_id)
+            if source != target:
+                yield source, target
@@ -0,0 +1,143 @@
+"""Prometheus metrics for the marion application.
+
+Metrics are collected when the METRICS_ENABLED setting is True, provided that
+the optional prometheus_client package is installed (see the marion.E002
+system check). They are exported in the Prometheus text exposition format by
+the metrics view (see the marion.urls.metrics module).
+
+When documents are rendered by many processes (_e.g._ gunicorn workers or the
+process pool renderer), the PROMETHEUS_MULTIPROC_DIR environment variable
+should point to an empty directory shared by these processes before they
+start: prometheus_client's multiprocess mode is then used to aggregate metrics
+of all processes.
+
+"""
+
+import os
+import time
+from contextlib import contextmanager
+
+from . import defaults
+from .registry import get_issuer_class
+
+try:
+    import prometheus_client
+    from prometheus_client import multiprocess
+except ImportError:
+    prometheus_client = None
+
+RENDER_DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+SIZE_BUCKETS = (1e4, 5e4, 1e5, 2.5e5, 5e5, 1e6, 2.5e6, 5e6, 1e7, 2.5e7)
+
+if prometheus_client is not None:
+    DOCUMENT_REQUESTS = prometheus_client.Counter(
+        "marion_document_requests",
+        "Number of stored document requests per issuer and initial status",
+        ["issuer", "status"],
+    )
+    DOCUMENT_SIZE = prometheus_client.Histogram(
+        "marion_document_size_bytes",
+        "Size of created PDF documents (in bytes) per issuer",
+        ["issuer"],
+        buckets=SIZE_BUCKETS,
+    )
+    RENDERS = prometheus_client.Counter(
+        "marion_document_renders",
+        "Number of document renders per issuer and status",
+        ["issuer", "status"],
+    )
+    RENDERS_IN_PROGRESS = prometheus_client.Gauge(
+        "marion_document_renders_in_progress",
+        "Number of document renders in progress per issuer",
+        ["issuer"],
+        multiprocess_mode="livesum",
+    )
+    RENDER_DURATION = prometheus_client.Histogram(
+        "marion_document_render_seconds",
+        "Duration of successful document renders (in seconds) per issuer",
+        ["issuer"],
+        buckets=RENDER_DURATION_BUCKETS,
+    )
+    RENDER_PHASE_DURATION = prometheus_client.Histogram(
+        "marion_document_render_phase_seconds",
+        "Duration of document rendering phases (in seconds) per issuer",
+        ["issuer", "phase"],
+    )
+
+
+def is_enabled():
+    """Check whether metrics should be collected"""
+    return defaults.METRICS_ENABLED and prometheus_client is not None
+
+
+def get_issuer_label(issuer_class):
+    """Get the issuer label of an issuer class (its full path)"""
+    return f"{issuer_class.__module__}.{issuer_class.__qualname__}"
+
+
+@contextmanager
+def track_render(issuer_class):
+    """Count a document render and measure its duration"""
+
+    if not is_enabled():
+        yield
+        return
+
+    issuer = get_issuer_label(issuer_class)
+    in_progress = RENDERS_IN_PROGRESS.labels(issuer)
+    in_progress.inc()
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        RENDERS.labels(issuer, "failure").inc()
+        raise
+    else:
+        RENDER_DURATION.labels(issuer).observe(time.perf_counter() - start)
+        RENDERS.labels(issuer, "success").inc()
+    finally:
+        in_progress.dec()
+
+
+# pylint: disable=unused-argument
+def observe_document_created(sender, document, timings, size, **kwargs):
+    """Observe the created document size and rendering phases durations.
+
+    This receiver is connected to the document_created signal when the
+    application starts if metrics are enabled.
+
+    """
+
+    issuer = get_issuer_label(sender)
+    DOCUMENT_SIZE.labels(issuer).observe(size)
+    for phase, duration in timings.items():
+        RENDER_PHASE_DURATION.labels(issuer, phase).observe(duration)
+
+
+def count_document_requests(document_requests):
+    """Count stored document requests per issuer and status"""
+
+    if not is_enabled():
+        return
+
+    for document_request in document_requests:
+        issuer = get_issuer_label(get_issuer_class(document_request.issuer))
+        DOCUMENT_REQUESTS.labels(issuer, document_request.status).inc()
+
+
+def export():
+    """Export metrics in the Prometheus text exposition format.
+
+    Returns the (content, content_type) tuple of the response. In the
+    multiprocess mode, metrics of all processes are aggregated.
+
+    """
+
+    registry = prometheus_client.REGISTRY
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = prometheus_client.CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return (
+        prometheus_client.generate_latest(registry),
+        prometheus_client.CONTENT_TYPE_LATEST,
+    )
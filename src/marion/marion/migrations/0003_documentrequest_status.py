@@ -0,0 +1,59 @@
+# Generated by Django 4.2.7 on 2026-10-17 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("marion", "0002_alter_documentrequest_issuer"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="documentrequest",
+            name="error",
+            field=models.TextField(
+                blank=True,
+                editable=False,
+                help_text="Why the document rendering failed",
+                null=True,
+                verbose_name="Error",
+            ),
+        ),
+        # Existing document requests have been rendered synchronously
+        migrations.AddField(
+            model_name="documentrequest",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("pending", "Pending"),
+                    ("running", "Running"),
+                    ("done", "Done"),
+                    ("failed", "Failed"),
+                ],
+                default="done",
+                editable=False,
+                help_text="Document rendering status",
+                max_length=10,
+                verbose_name="Status",
+            ),
+            preserve_default=False,
+        ),
+        migrations.AlterField(
+            model_name="documentrequest",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("pending", "Pending"),
+                    ("running", "Running"),
+                    ("done", "Done"),
+                    ("failed", "Failed"),
+                ],
+                default="pending",
+                editable=False,
+                help_text="Document rendering status",
+                max_length=10,
+                verbose_name="Status",
+            ),
+        ),
+    ]
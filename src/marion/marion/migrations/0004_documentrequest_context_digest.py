@@ -0,0 +1,25 @@
+# Generated by Django 4.2.7 on 2026-10-17 10:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("marion", "0003_documentrequest_status"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="documentrequest",
+            name="context_digest",
+            field=models.CharField(
+                blank=True,
+                db_index=True,
+                editable=False,
+                help_text="SHA-256 digest of the issuer and validated context query",
+                max_length=64,
+                null=True,
+                verbose_name="Context digest",
+            ),
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 4.2.7 on 2026-10-17 11:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("marion", "0004_documentrequest_context_digest"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="IdempotencyKey",
+            fields=[
+                (
+                    "key",
+                    models.CharField(
+                        help_text="Idempotency key provided by the API client",
+                        max_length=255,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="Key",
+                    ),
+                ),
+                (
+                    "fingerprint",
+                    models.CharField(
+                        help_text="SHA-256 digest of the API call payload",
+                        max_length=64,
+                        verbose_name="Fingerprint",
+                    ),
+                ),
+                (
+                    "status_code",
+                    models.PositiveSmallIntegerField(
+                        blank=True,
+                        help_text="API call response status code (once completed)",
+                        null=True,
+                        verbose_name="Status code",
+                    ),
+                ),
+                (
+                    "response",
+                    models.JSONField(
+                        blank=True,
+                        help_text="API call response data (once completed)",
+                        null=True,
+                        verbose_name="Response",
+                    ),
+                ),
+                (
+                    "created_on",
+                    models.DateTimeField(
+                        auto_now_add=True,
+                        db_index=True,
+                        help_text="Date and time at which the key was claimed",
+                        verbose_name="Created on",
+                    ),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.7 on 2026-10-17 13:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("marion", "0005_idempotencykey"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="documentrequest",
+            index=models.Index(
+                fields=["created_on", "id"], name="marion_dr_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="documentrequest",
+            index=models.Index(
+                fields=["issuer", "created_on", "id"],
+                name="marion_dr_issuer_created_idx",
+            ),
+        ),
+    ]
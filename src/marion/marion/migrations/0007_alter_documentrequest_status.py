@@ -0,0 +1,30 @@
+# Generated by Django 4.2.7 on 2026-10-17 15:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("marion", "0006_documentrequest_indexes"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="documentrequest",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("pending", "Pending"),
+                    ("running", "Running"),
+                    ("done", "Done"),
+                    ("failed", "Failed"),
+                    ("lazy", "Lazy"),
+                ],
+                default="pending",
+                editable=False,
+                help_text="Document rendering status",
+                max_length=10,
+                verbose_name="Status",
+            ),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-17 18:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("marion", "0007_alter_documentrequest_status"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="documentrequest",
+            index=models.Index(
+                fields=["status", "created_on"], name="marion_dr_status_created_idx"
+            ),
+        ),
+    ]
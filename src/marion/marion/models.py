@@ -1,18 +1,25 @@
 """Models for the marion application"""
 
+import hashlib
 import json
+import time
 import uuid
+from datetime import timedelta
 
 from django.core.exceptions import FieldError
 from django.core.exceptions import ValidationError as DjangoValidationError
-from django.db import models
-from django.utils.module_loading import import_string
+from django.db import IntegrityError, models, transaction
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
+from pydantic import BaseModel
 from pydantic import ValidationError as PydanticValidationError
 
-from .exceptions import DocumentIssuerContextQueryValidationError, InvalidDocumentIssuer
+from . import defaults, metrics, registry
+from .exceptions import DocumentIssuerContextQueryValidationError
 from .fields import IssuerLazyChoiceField
+from .renderers import get_renderer
+from .storage import get_storage
 
 
 class PydanticModelField(models.JSONField):
@@ -21,6 +28,10 @@ class PydanticModelField(models.JSONField):
     This field is a pydantic model field but with model validation when the model
     is provided.
 
+    Field values can also be pydantic model instances: instances of the field
+    pydantic model have already been validated, they are only serialized (to
+    a JSON-compatible dict) before saving the Django model.
+
     """
 
     def __init__(self, *args, **kwargs):
@@ -36,13 +47,19 @@ class PydanticModelField(models.JSONField):
         if self.model.__module__ == "__fake__":
             return
 
+        # Field pydantic model instances have already been validated
+        if isinstance(value, pydantic_model):
+            return
+        if isinstance(value, BaseModel):
+            value = value.model_dump(mode="json")
+
         # Validate either raw (JSON string) data or a serialized dict (before
         # saving the Django model).
         try:
             if isinstance(value, str):
-                pydantic_model.parse_raw(value)
+                pydantic_model.model_validate_json(value)
             elif isinstance(value, dict):
-                pydantic_model(**value)
+                pydantic_model.model_validate(value)
         except PydanticValidationError as error:
             raise DjangoValidationError(error, code="invalid") from error
 
@@ -66,20 +83,47 @@ class PydanticModelField(models.JSONField):
     def validate(self, value, model_instance):
         """Add pydantic model validation to field validation"""
 
-        # Validate JSON value
-        super().validate(value, model_instance)
+        # Validate JSON value (pydantic model instances are JSON-serializable)
+        if not isinstance(value, BaseModel):
+            super().validate(value, model_instance)
 
         self._validate_pydantic_model(value, model_instance)
 
+    def get_prep_value(self, value):
+        """Serialize pydantic model instances"""
+
+        if isinstance(value, BaseModel):
+            value = value.model_dump(mode="json")
+        return super().get_prep_value(value)
+
     def pre_save(self, model_instance, add):
-        """Ensure pydantic model validation occurs before saving"""
+        """Ensure pydantic model validation occurs before saving.
+
+        Pydantic model instances are replaced by their serialized value, so that
+        the Django model instance holds the same value as when it is fetched
+        from the database.
+
+        """
 
         value = super().pre_save(model_instance, add)
         if value and not self.null:
             self._validate_pydantic_model(value, model_instance)
+        if isinstance(value, BaseModel):
+            value = value.model_dump(mode="json")
+            setattr(model_instance, self.attname, value)
         return value
 
 
+class DocumentRequestStatus(models.TextChoices):
+    """Document request rendering status"""
+
+    PENDING = "pending", _("Pending")
+    RUNNING = "running", _("Running")
+    DONE = "done", _("Done")
+    FAILED = "failed", _("Failed")
+    LAZY = "lazy", _("Lazy")
+
+
 class DocumentRequest(models.Model):
     """Document Requests are stored in models and linked to documents.
 
@@ -155,10 +199,48 @@ class DocumentRequest(models.Model):
         help_text=_("Context will be fetched from those parameters"),
     )
 
+    status = models.CharField(
+        verbose_name=_("Status"),
+        help_text=_("Document rendering status"),
+        max_length=10,
+        choices=DocumentRequestStatus.choices,
+        default=DocumentRequestStatus.PENDING,
+        editable=False,
+    )
+
+    context_digest = models.CharField(
+        verbose_name=_("Context digest"),
+        help_text=_("SHA-256 digest of the issuer and validated context query"),
+        max_length=64,
+        editable=False,
+        null=True,
+        blank=True,
+        db_index=True,
+    )
+
+    error = models.TextField(
+        verbose_name=_("Error"),
+        help_text=_("Why the document rendering failed"),
+        editable=False,
+        null=True,
+        blank=True,
+    )
+
     class Meta:
         """Options for the DocumentRequest model"""
 
         ordering = ["-created_on"]
+        indexes = [
+            models.Index(fields=["created_on", "id"], name="marion_dr_created_idx"),
+            models.Index(
+                fields=["issuer", "created_on", "id"],
+                name="marion_dr_issuer_created_idx",
+            ),
+            # Claimed pending and requeued running document requests
+            models.Index(
+                fields=["status", "created_on"], name="marion_dr_status_created_idx"
+            ),
+        ]
 
     def get_context_pydantic_model(self):
         """Get context pydantic model from the issuer class"""
@@ -170,50 +252,323 @@ class DocumentRequest(models.Model):
 
     # pylint: disable=signature-differs
     def save(self, *args, **kwargs):
-        """Generate the document along with the document request"""
+        """Generate the document along with the document request.
+
+        The document is only generated when the document request is created
+        (see the enqueue and defer methods to delay the document generation).
+
+        """
+
+        adding = self._state.adding
+        if adding:
+            self.generate_document()
+
+        super().save(*args, **kwargs)
+
+        if adding:
+            metrics.count_document_requests([self])
+
+    def generate_document(self):
+        """Generate the document using the active renderer"""
 
         document = self.get_issuer()
-        document.create()
+        get_renderer().render(document)
+        self.set_document(document)
+
+    def set_document(self, document):
+        """Update the document request given its generated document"""
 
         self.document_id = document.identifier
+        self.status = DocumentRequestStatus.DONE
+        self.error = None
 
-        # Prevent JSON encoding issues
-        #
-        # Pydantic knows how to JSON-serialize all fields, the standard JSON
-        # encoder does not. So we convert pydantic model data to a
-        # dumb-dict with simple types using this trick.
-        self.context = json.loads(document.context.model_dump_json())
-        self.context_query = json.loads(document.context_query.model_dump_json())
+        # Validated pydantic models are serialized by the PydanticModelField
+        # when the document request is saved (without validating them again)
+        self.context = document.context
+        self.context_query = document.context_query
+        self.context_digest = self.get_context_digest(document)
 
-        super().save(*args, **kwargs)
+    def set_pending(self):
+        """Switch the document request to pending with a validated context query"""
+
+        document = self.get_issuer()
+
+        self.status = DocumentRequestStatus.PENDING
+        self.context_query = document.context_query
+        self.context_digest = self.get_context_digest(document)
+
+    def enqueue(self):
+        """Save a pending document request without generating the document.
+
+        The context query is validated before saving the document request. The
+        document will be generated by a worker (see the
+        process_document_requests management command).
+
+        """
+
+        self.set_pending()
+        super().save()
+        metrics.count_document_requests([self])
+
+    def defer(self):
+        """Save a lazy document request without generating the document.
+
+        The context query is validated and the context is fetched (and
+        validated) before saving the document request. The document will be
+        generated from the stored context on first download (see the
+        find_or_render_document method).
+
+        """
+
+        self.set_deferred()
+        super().save()
+        metrics.count_document_requests([self])
+
+    def set_deferred(self):
+        """Switch the document request to lazy with a validated context"""
+
+        document = self.get_issuer()
+        document.load_context()
+        self.set_document(document)
+        self.status = DocumentRequestStatus.LAZY
+
+    def find_or_render_document(self, storage=None):
+        """Find the document name in the storage, rendering it if required.
+
+        The document of a lazy document request is rendered on first call, and
+        deleted documents are rendered again, from the stored issuer and
+        context. Concurrent calls render the document only once: the document
+        request is locked while rendering, and the document is looked up again
+        once the lock has been acquired.
+
+        """
+
+        if storage is None:
+            storage = get_storage()
+
+        document_name = self.find_document_name(storage)
+        if document_name is not None:
+            return document_name
+
+        with transaction.atomic():
+            document_request = DocumentRequest.objects.select_for_update().get(
+                pk=self.pk
+            )
+            document_name = document_request.find_document_name(storage)
+            if document_name is None:
+                document_request.render_document()
+                document_name = document_request.get_document_name()
+
+        self.status = document_request.status
+        self.error = document_request.error
+        return document_name
+
+    def render_document(self):
+        """Render the document again from the stored context"""
+
+        document = self.get_issuer_class(self.issuer)(
+            identifier=self.document_id, context_query=self.context_query
+        )
+        document.set_context(
+            self.context if self.context is not None else document.fetch_context()
+        )
+        get_renderer().render(document)
+
+        self.status = DocumentRequestStatus.DONE
+        self.error = None
+        self.save(update_fields=["status", "error", "updated_on"])
+
+    def get_context_digest(self, document=None):
+        """Get the document request digest given its issuer and context query.
+
+        The issuer full path and the validated context query are serialized as
+        canonical JSON (sorted keys, no whitespace) so that identical document
+        requests have the same digest, whether the issuer is referred to by its
+        class name or its path. Note that the fetched context cannot be used as
+        it contains the document identifier.
+
+        """
+
+        if document is None:
+            document = self.get_issuer()
+
+        canonical = json.dumps(
+            {
+                "issuer": registry.get_registry().get_path(self.issuer),
+                "context_query": document.context_query.model_dump(mode="json"),
+            },
+            sort_keys=True,
+            separators=(",", ":"),
+        )
+        return hashlib.sha256(canonical.encode()).hexdigest()
+
+    def find_duplicate(self):
+        """Find an existing document request identical to this one.
+
+        Failed document requests and document requests whose document file is
+        missing are ignored. Returns None if there is no duplicate.
+
+        """
+
+        duplicate = (
+            DocumentRequest.objects.filter(context_digest=self.get_context_digest())
+            .exclude(pk=self.pk)
+            .exclude(status=DocumentRequestStatus.FAILED)
+            .order_by("-created_on")
+            .first()
+        )
+        if duplicate is None:
+            return None
+        if (
+            duplicate.status == DocumentRequestStatus.DONE
+            and duplicate.find_document_name() is None
+        ):
+            return None
+        return duplicate
 
     @classmethod
-    def get_issuer_class(cls, issuer_class_name):
-        """Get issuer class given its class name (or its path)"""
-
-        # pylint: disable=no-member
-        issuer_class_paths = list(
-            filter(
-                lambda issuer_module_path: issuer_module_path.endswith(
-                    issuer_class_name
-                ),
-                # pylint: disable=no-member
-                (issuer for issuer, _ in cls.issuer.field.choices),
+    def bulk_generate(cls, document_requests):
+        """Generate documents of new document requests and store them.
+
+        Documents are rendered using the active renderer render_many method
+        (_i.e._ in parallel with the process pool renderer), and successful
+        document requests are inserted in a single query. Document requests
+        context query are expected to be valid.
+
+        Returns a list of (document_request, error) tuples in the document
+        requests order, error being None if the document has been generated.
+
+        """
+
+        document_requests = list(document_requests)
+        results = get_renderer().render_many(
+            document_request.get_issuer() for document_request in document_requests
+        )
+
+        outcomes = []
+        for document_request, (document, result) in zip(document_requests, results):
+            if isinstance(result, Exception):
+                outcomes.append((document_request, result))
+                continue
+            document_request.set_document(document)
+            outcomes.append((document_request, None))
+
+        metrics.count_document_requests(
+            cls.objects.bulk_create(
+                [
+                    document_request
+                    for document_request, error in outcomes
+                    if error is None
+                ]
             )
         )
-        matches = len(issuer_class_paths)
-        if matches == 0:
-            raise InvalidDocumentIssuer(
-                _(f"{issuer_class_name} is not an allowed issuer")
+        return outcomes
+
+    @classmethod
+    def bulk_defer(cls, document_requests):
+        """Store new lazy document requests in a single query.
+
+        Document requests context is fetched and validated, but documents are
+        not generated (see the defer method).
+
+        Returns a list of (document_request, error) tuples in the document
+        requests order, error being None if the context has been stored.
+
+        """
+
+        outcomes = []
+        for document_request in document_requests:
+            try:
+                document_request.set_deferred()
+            except Exception as error:  # pylint: disable=broad-except
+                outcomes.append((document_request, error))
+                continue
+            outcomes.append((document_request, None))
+
+        metrics.count_document_requests(
+            cls.objects.bulk_create(
+                [
+                    document_request
+                    for document_request, error in outcomes
+                    if error is None
+                ]
             )
-        if matches > 1:
-            raise InvalidDocumentIssuer(
-                _(
-                    f"Issuer class name should be unique, found {matches} for "
-                    f"{issuer_class_name}"
-                )
+        )
+        return outcomes
+
+    @classmethod
+    def bulk_enqueue(cls, document_requests):
+        """Store new pending document requests in a single query"""
+
+        document_requests = list(document_requests)
+        for document_request in document_requests:
+            document_request.set_pending()
+        document_requests = cls.objects.bulk_create(document_requests)
+        metrics.count_document_requests(document_requests)
+        return document_requests
+
+    @classmethod
+    def claim_pending(cls):
+        """Claim the oldest pending document request for rendering.
+
+        The claimed document request status is atomically switched to running
+        so that concurrent workers cannot claim the same document request.
+        Returns None if there is no pending document request left.
+
+        """
+
+        pending = cls.objects.filter(status=DocumentRequestStatus.PENDING)
+        while True:
+            pk = pending.order_by("created_on").values_list("pk", flat=True).first()
+            if pk is None:
+                return None
+            claimed = pending.filter(pk=pk).update(
+                status=DocumentRequestStatus.RUNNING, updated_on=timezone.now()
             )
-        return import_string(issuer_class_paths[0])
+            if claimed:
+                return cls.objects.get(pk=pk)
+
+    def heartbeat(self):
+        """Refresh the update date of the running document request.
+
+        Workers call it periodically while rendering the document so that the
+        document request is not requeued as stalled (see the requeue_stalled
+        method). Returns False if the document request is no longer running.
+
+        """
+
+        return bool(
+            DocumentRequest.objects.filter(
+                pk=self.pk, status=DocumentRequestStatus.RUNNING
+            ).update(updated_on=timezone.now())
+        )
+
+    @classmethod
+    def requeue_stalled(cls, timeout):
+        """Switch back running document requests to pending after a timeout.
+
+        Document requests may be left running if their worker has been killed
+        while rendering the document: workers refresh the update date of the
+        document request they render (see the heartbeat method), hence the
+        timeout should be longer than the heartbeat interval. Returns the
+        number of requeued document requests.
+
+        """
+
+        return cls.objects.filter(
+            status=DocumentRequestStatus.RUNNING,
+            updated_on__lt=timezone.now() - timedelta(seconds=timeout),
+        ).update(status=DocumentRequestStatus.PENDING, updated_on=timezone.now())
+
+    @classmethod
+    def get_issuer_class(cls, issuer_class_name):
+        """Get issuer class given its class name (or its path).
+
+        Issuer classes are looked up in the active issuers registry (see the
+        marion.registry module).
+
+        """
+        return registry.get_issuer_class(issuer_class_name)
 
     def get_issuer(self):
         """Get instanciated issuer class"""
@@ -230,16 +585,185 @@ class DocumentRequest(models.Model):
 
         This method is mostly a wrapper for the issuer's `get_document_url`
         method. If no host or schema is provided, an absolute URL is returned
-        (and not a fully qualified URL).
+        (and not a fully qualified URL). When the issuer uses the default
+        document location, the URL is computed from the document identifier
+        without instantiating the issuer. Note that it targets the configured
+        documents layout, even if the document has not been moved there yet
+        (see the find_document_name method and the shard_documents command).
 
         """
+
+        issuer_class = self.get_issuer_class(self.issuer)
+        if issuer_class.has_default_document_location():
+            return issuer_class.get_default_document_url(
+                self.document_id, host=host, schema=schema
+            )
         return self.get_issuer().get_document_url(host=host, schema=schema)
 
     def get_document_path(self):
         """Shortcut to get the document PATH.
 
         This method is mostly a wrapper for the issuer's `get_document_path`
-        method.
+        method. When the issuer uses the default document location, the path is
+        computed from the document identifier without instantiating the
+        issuer.
 
         """
+
+        issuer_class = self.get_issuer_class(self.issuer)
+        if issuer_class.has_default_document_location():
+            return issuer_class.get_default_document_path(self.document_id)
         return self.get_issuer().get_document_path()
+
+    def get_document_name(self):
+        """Shortcut to get the document name in the documents storage.
+
+        This method is mostly a wrapper for the issuer's `get_document_name`
+        method. When the issuer uses the default document location, the name is
+        computed from the document identifier without instantiating the
+        issuer.
+
+        """
+
+        issuer_class = self.get_issuer_class(self.issuer)
+        if issuer_class.has_default_document_location():
+            return issuer_class.get_default_document_name(self.document_id)
+        return self.get_issuer().get_document_name()
+
+    def find_document_name(self, storage=None):
+        """Find the generated document name in the documents storage.
+
+        Documents generated before sharding documents (see the
+        DOCUMENTS_SHARD_DEPTH setting) may still be stored at the root of the
+        storage, until they are moved by the shard_documents management
+        command. Returns None if the document cannot be found.
+
+        """
+
+        if storage is None:
+            storage = get_storage()
+
+        document_name = self.get_document_name()
+        if storage.exists(document_name):
+            return document_name
+
+        issuer_class = self.get_issuer_class(self.issuer)
+        if issuer_class.has_default_document_location():
+            flat_name = issuer_class.get_default_document_name(
+                self.document_id, shard_depth=0
+            )
+            if flat_name != document_name and storage.exists(flat_name):
+                return flat_name
+        return None
+
+
+class IdempotencyKey(models.Model):
+    """Idempotency keys of document requests creation API calls.
+
+    API clients may retry document requests creation with the same
+    Idempotency-Key header: the first API call claims the key and stores its
+    response once the document request has been created, so that it can be
+    replayed for subsequent calls. Keys expire after the IDEMPOTENCY_KEY_TTL
+    setting (in seconds).
+
+    """
+
+    key = models.CharField(
+        verbose_name=_("Key"),
+        help_text=_("Idempotency key provided by the API client"),
+        max_length=255,
+        primary_key=True,
+    )
+
+    fingerprint = models.CharField(
+        verbose_name=_("Fingerprint"),
+        help_text=_("SHA-256 digest of the API call payload"),
+        max_length=64,
+    )
+
+    status_code = models.PositiveSmallIntegerField(
+        verbose_name=_("Status code"),
+        help_text=_("API call response status code (once completed)"),
+        null=True,
+        blank=True,
+    )
+
+    response = models.JSONField(
+        verbose_name=_("Response"),
+        help_text=_("API call response data (once completed)"),
+        null=True,
+        blank=True,
+    )
+
+    created_on = models.DateTimeField(
+        verbose_name=_("Created on"),
+        help_text=_("Date and time at which the key was claimed"),
+        auto_now_add=True,
+        editable=False,
+        db_index=True,
+    )
+
+    @classmethod
+    def get_expiry_limit(cls):
+        """Keys claimed before this date and time have expired"""
+        return timezone.now() - timedelta(seconds=defaults.IDEMPOTENCY_KEY_TTL)
+
+    @classmethod
+    def claim(cls, key, fingerprint):
+        """Atomically claim an idempotency key.
+
+        Returns a (idempotency_key, claimed) tuple, claimed being False if the
+        key has already been claimed (and has not expired).
+
+        """
+
+        cls.objects.filter(key=key, created_on__lt=cls.get_expiry_limit()).delete()
+        while True:
+            try:
+                with transaction.atomic():
+                    return cls.objects.create(key=key, fingerprint=fingerprint), True
+            except IntegrityError:
+                existing = cls.objects.filter(key=key).first()
+                # The key may have been released in the meantime
+                if existing is not None:
+                    return existing, False
+
+    @classmethod
+    def purge_expired(cls):
+        """Delete expired idempotency keys"""
+        return cls.objects.filter(created_on__lt=cls.get_expiry_limit()).delete()[0]
+
+    @property
+    def completed(self):
+        """Whether the API call response has been stored"""
+        return self.status_code is not None
+
+    def complete(self, status_code, response):
+        """Store the API call response"""
+
+        self.status_code = status_code
+        self.response = response
+        self.save(update_fields=["status_code", "response"])
+
+    def release(self):
+        """Release the key so that the API call can be performed again"""
+        self.delete()
+
+    def wait(self, timeout, interval=0.1):
+        """Wait for the API call that claimed the key to complete.
+
+        Returns True if the API call has completed before the timeout, False
+        otherwise (or if the key has been released).
+
+        """
+
+        deadline = time.monotonic() + timeout
+        while not self.completed:
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(interval)
+            try:
+                self.refresh_from_db()
+            except IdempotencyKey.DoesNotExist:
+                return False
+        return True
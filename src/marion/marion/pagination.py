@@ -0,0 +1,26 @@
+"""Pagination classes for the marion application"""
+
+from rest_framework.pagination import CursorPagination
+
+from . import defaults
+
+
+class DocumentRequestCursorPagination(CursorPagination):
+    """Paginate document requests from the most recent to the oldest one.
+
+    Contrary to offset pagination, the cursor points to the creation date of
+    the last listed document request (ties being broken using an offset), so
+    that fetching a page does not scan previous pages whatever the page
+    position. The number of document requests per page can be set using the
+    `page_size` query parameter.
+
+    """
+
+    ordering = ("-created_on", "-id")
+    page_size_query_param = "page_size"
+
+    def __init__(self):
+        # Page sizes are read when the paginator is instantiated (for each
+        # request): paginate_queryset sets the page_size instance attribute
+        self.page_size = defaults.DOCUMENT_REQUESTS_PAGE_SIZE
+        self.max_page_size = defaults.DOCUMENT_REQUESTS_MAX_PAGE_SIZE
@@ -0,0 +1,119 @@
+"""Document issuers registry for the marion application.
+
+The registry maps active document issuers names to their (imported) class. It
+is built once when the application starts (see the DocumentsConfig.ready
+method) from the DOCUMENT_ISSUER_CHOICES_CLASS setting.
+
+"""
+
+import threading
+from collections import defaultdict
+from types import MappingProxyType
+
+from django.utils.module_loading import import_string
+from django.utils.translation import gettext_lazy as _
+
+from .exceptions import InvalidDocumentIssuer
+from .fields import DocumentIssuerChoices
+
+
+class IssuerRegistry:
+    """Immutable registry of document issuer classes.
+
+    Issuer classes can be looked up using their full path (_e.g._
+    marion.issuers.DummyDocument) or any dotted suffix of it (_e.g._
+    issuers.DummyDocument or DummyDocument) as long as it is not ambiguous.
+
+    Arguments:
+
+    - issuer_classes<dict>
+
+        Issuer classes indexed by their full path.
+
+    """
+
+    def __init__(self, issuer_classes):
+        self._classes = MappingProxyType(dict(issuer_classes))
+
+        names = defaultdict(list)
+        for path in self._classes:
+            parts = path.split(".")
+            for index in range(len(parts)):
+                names[".".join(parts[index:])].append(path)
+        self._names = MappingProxyType(
+            {name: tuple(paths) for name, paths in names.items()}
+        )
+
+    @classmethod
+    def from_choices(cls, choices):
+        """Build the registry from issuer choices, importing issuer classes"""
+        return cls({path: import_string(path) for path, _ in choices})
+
+    def __contains__(self, name):
+        return len(self._names.get(name, ())) == 1
+
+    def __iter__(self):
+        return iter(self._classes)
+
+    def __len__(self):
+        return len(self._classes)
+
+    @property
+    def ambiguous_names(self):
+        """Get issuer class names shared by many issuers (with their paths)"""
+
+        return {
+            name: paths
+            for name, paths in self._names.items()
+            if len(paths) > 1 and "." not in name
+        }
+
+    def get(self, name):
+        """Get an issuer class given its name (or its path)"""
+        return self._classes[self.get_path(name)]
+
+    def get_path(self, name):
+        """Get an issuer class full path given its name (or its path)"""
+
+        paths = self._names.get(name, ())
+        if not paths:
+            raise InvalidDocumentIssuer(_(f"{name} is not an allowed issuer"))
+        if len(paths) > 1:
+            raise InvalidDocumentIssuer(
+                _(
+                    f"Issuer class name should be unique, found {len(paths)} for "
+                    f"{name}"
+                )
+            )
+        return paths[0]
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def build_registry():
+    """Build the active issuers registry (from active issuer choices)"""
+
+    # pylint: disable=global-statement
+    global _registry
+
+    registry = IssuerRegistry.from_choices(DocumentIssuerChoices.choices)
+    with _registry_lock:
+        _registry = registry
+    return registry
+
+
+def get_registry():
+    """Get the active issuers registry (built on first use if required)"""
+
+    with _registry_lock:
+        registry = _registry
+    if registry is None:
+        registry = build_registry()
+    return registry
+
+
+def get_issuer_class(name):
+    """Get an active issuer class given its name (or its path)"""
+    return get_registry().get(name)
@@ -0,0 +1,331 @@
+"""Document renderers for the marion application.
+
+A renderer is responsible for running the `create` method of document issuers.
+The active renderer is configured using the RENDERER_CLASS setting.
+
+"""
+
+import itertools
+import logging
+import multiprocessing
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connections
+from django.utils.module_loading import import_string
+from django.utils.translation import gettext_lazy as _
+
+from weasyprint import DEFAULT_OPTIONS
+
+from . import defaults
+from .cache import get_font_config, preload_templates
+from .exceptions import DocumentIssuerRenderingTimeout
+from .registry import get_registry
+from .watchdog import memory_watchdog
+
+logger = logging.getLogger(__name__)
+
+
+def _capture(func, *args, **kwargs):
+    """Return the function result or the exception it raised"""
+
+    try:
+        return func(*args, **kwargs)
+    except Exception as error:  # pylint: disable=broad-except
+        return error
+
+
+class LocalRenderer:
+    """Render documents in the current process"""
+
+    # Documents are rendered one after the other (see the marion.W002 check)
+    parallel = False
+
+    # pylint: disable=no-self-use
+    def render(self, document, persist=True, pdf_options: DEFAULT_OPTIONS = None):
+        """Create the document (see the AbstractDocument.create method)"""
+
+        return document.create(persist=persist, pdf_options=pdf_options)
+
+    def render_many(self, documents, persist=True, pdf_options: DEFAULT_OPTIONS = None):
+        """Create documents one after the other.
+
+        Consecutive documents of the same issuer are created in batch (see the
+        AbstractDocument.create_many method). Yields (document, result) tuples
+        in the documents order, result being either the document creation
+        result or the exception raised while creating it.
+
+        """
+
+        for issuer_class, batch in itertools.groupby(documents, key=type):
+            yield from issuer_class.create_many(
+                batch, persist=persist, pdf_options=pdf_options
+            )
+
+    def start(self):
+        """Allocate renderer resources (before handling requests)"""
+
+    def close(self):
+        """Release renderer resources"""
+
+
+def _init_render_worker():
+    """Warm up render worker process rendering caches.
+
+    Render workers do not need the database (see the ProcessPoolRenderer
+    class): database connections that may have been inherited from the calling
+    process are closed so that workers never use them.
+
+    """
+
+    connections.close_all()
+    get_font_config()
+
+    # A failing worker initialization would make the pool respawn workers
+    # indefinitely: issuers templates will be compiled on first use instead.
+    try:
+        registry = get_registry()
+        preload_templates(registry.get(issuer) for issuer in registry)
+    except Exception:  # pylint: disable=broad-except
+        logger.exception("Render worker failed to preload issuers templates")
+
+
+# pylint: disable=too-many-arguments
+def _create_document(
+    issuer_path, identifier, document_path, context, persist, pdf_options
+):
+    """Create a document in a render worker process.
+
+    Returns the creation result, the rendering timings and the reason why the
+    memory watchdog flagged the worker process for recycling (if any).
+
+    """
+
+    document = import_string(issuer_path)(identifier=identifier)
+    document.document_path = document_path
+    document.set_context(context)
+    result = document.create(persist=persist, pdf_options=pdf_options)
+    return result, document.timings, memory_watchdog.recycle_reason
+
+
+class ProcessPoolRenderer:
+    """Render documents in a pool of worker processes.
+
+    As Weasyprint's PDF layout is CPU-bound, rendering documents in the
+    calling process (e.g. a gunicorn worker) blocks it until the document
+    has been rendered. This renderer delegates renderings to a pool of
+    pre-warmed worker processes.
+
+    The document context is fetched and validated in the calling process, so
+    that render workers do not need to access the database or external
+    services. The issuer class should be importable from its path. Note that
+    the document_created signal is sent from the worker process, rendering
+    timings being copied back to the calling process document.
+
+    Arguments:
+
+    - processes<int> = None
+
+        The number of worker processes (default: the RENDER_POOL_SIZE setting
+        or the number of CPUs if not set). Note that each calling process
+        (_e.g._ each gunicorn worker) has its own pool: the pool size should
+        be set so that all pools do not run more processes than CPUs.
+
+    - timeout<float> = None
+
+        The maximum time (in seconds) to wait for a document to be rendered
+        (default: the RENDER_POOL_TIMEOUT setting). When exceeded, a
+        DocumentIssuerRenderingTimeout exception is raised and the pool is
+        replaced by a fresh one, so that hanging worker processes do not
+        reduce the pool capacity: documents that were being rendered by the
+        replaced pool fail with the same exception.
+
+    - max_tasks_per_worker<int> = None
+
+        Worker processes are replaced by fresh ones once they have rendered
+        this number of documents (default: the
+        RENDER_POOL_MAX_TASKS_PER_WORKER setting or never if not set).
+
+    Memory watchdog limits (see the WORKER_MAX_RSS and WORKER_MAX_RENDERS
+    settings) apply to worker processes, as they render documents: once a
+    worker process has been flagged for recycling, the pool is gracefully
+    replaced by a fresh one (worker processes of the replaced pool exit once
+    their current rendering is done).
+
+    Worker processes should be started with the start method before the
+    calling process handles requests (_e.g._ in a gunicorn post_worker_init
+    hook, see the gunicorn configuration of the docker image): otherwise they
+    are started by the first rendering.
+
+    """
+
+    parallel = True
+
+    def __init__(self, processes=None, timeout=None, max_tasks_per_worker=None):
+        self.processes = processes or defaults.RENDER_POOL_SIZE
+        self.timeout = timeout or defaults.RENDER_POOL_TIMEOUT
+        self.max_tasks_per_worker = (
+            max_tasks_per_worker or defaults.RENDER_POOL_MAX_TASKS_PER_WORKER
+        )
+        self._pool = None
+        self._lock = threading.Lock()
+        self._terminated = weakref.WeakSet()
+
+    @property
+    def pool(self):
+        """Get the worker processes pool (started on first use)"""
+
+        with self._lock:
+            if self._pool is None:
+                # Worker processes are forked from a new thread: database
+                # connections of the calling thread (possibly in a transaction)
+                # are not inherited by workers
+                with ThreadPoolExecutor(max_workers=1) as executor:
+                    self._pool = executor.submit(self._create_pool).result()
+            return self._pool
+
+    def _create_pool(self):
+        """Fork worker processes"""
+
+        return multiprocessing.get_context("fork").Pool(
+            processes=self.processes,
+            initializer=_init_render_worker,
+            maxtasksperchild=self.max_tasks_per_worker,
+        )
+
+    def start(self):
+        """Start worker processes (if not started yet)"""
+
+        # Worker processes are started when the pool is first accessed
+        self.pool  # pylint: disable=pointless-statement
+
+    def render(self, document, persist=True, pdf_options: DEFAULT_OPTIONS = None):
+        """Create the document in a worker process.
+
+        The document context is fetched (if required) before delegating the
+        rendering to a worker process.
+
+        """
+
+        return self._wait(document, *self._submit(document, persist, pdf_options))
+
+    def render_many(self, documents, persist=True, pdf_options: DEFAULT_OPTIONS = None):
+        """Create documents in parallel in worker processes.
+
+        Documents contexts are fetched (if required) in the calling process
+        before submitting all documents to worker processes. Yields (document,
+        result) tuples in the documents order, result being either the document
+        creation result or the exception raised while creating it.
+
+        """
+
+        submitted = [
+            (document, _capture(self._submit, document, persist, pdf_options))
+            for document in documents
+        ]
+        for document, result in submitted:
+            if not isinstance(result, Exception):
+                result = _capture(self._wait, document, *result)
+            yield document, result
+
+    def _submit(self, document, persist, pdf_options):
+        """Submit the document creation to a worker process.
+
+        Returns the pool and the submitted document creation result.
+
+        """
+
+        if document.context is None:
+            document.load_context()
+
+        issuer_class = document.__class__
+        pool = self.pool
+        return pool, pool.apply_async(
+            _create_document,
+            (
+                f"{issuer_class.__module__}.{issuer_class.__qualname__}",
+                document.identifier,
+                document.get_document_path(),
+                document.context.model_dump_json(),
+                persist,
+                pdf_options,
+            ),
+        )
+
+    def _wait(self, document, pool, result):
+        """Wait for a submitted document creation result"""
+
+        # The pool may have been terminated after another rendering timed out
+        timeout = 0 if pool in self._terminated else self.timeout
+        try:
+            result, timings, recycle_reason = result.get(timeout=timeout)
+        except multiprocessing.TimeoutError as error:
+            self._replace(pool, "a rendering timed out", terminate=True)
+            raise DocumentIssuerRenderingTimeout(
+                _(f"Document {document.identifier} rendering timed out")
+            ) from error
+        if recycle_reason is not None:
+            self._replace(
+                pool, f"a render worker should be recycled ({recycle_reason})"
+            )
+        document.timings.update(timings)
+        return result
+
+    def _replace(self, pool, reason, terminate=False):
+        """Replace the pool by a fresh one (started on next use).
+
+        The replaced pool is either terminated, or closed so that its worker
+        processes exit once they are done with submitted renderings.
+
+        """
+
+        with self._lock:
+            if self._pool is not pool:
+                return
+            self._pool = None
+        logger.warning("Replacing the render pool: %s", reason)
+        if terminate:
+            self._terminated.add(pool)
+            pool.terminate()
+            pool.join()
+        else:
+            pool.close()
+            threading.Thread(target=pool.join, daemon=True).start()
+
+    def close(self):
+        """Stop worker processes"""
+
+        with self._lock:
+            if self._pool is not None:
+                self._pool.terminate()
+                self._pool.join()
+                self._pool = None
+
+
+_renderer = None
+_renderer_lock = threading.Lock()
+
+
+def get_renderer():
+    """Get the active renderer instance (see the RENDERER_CLASS setting)"""
+
+    # pylint: disable=global-statement
+    global _renderer
+
+    with _renderer_lock:
+        if _renderer is None:
+            _renderer = import_string(defaults.RENDERER_CLASS)()
+        return _renderer
+
+
+def reset_renderer():
+    """Close the active renderer so that a new one is instantiated next time"""
+
+    # pylint: disable=global-statement
+    global _renderer
+
+    with _renderer_lock:
+        if _renderer is not None:
+            _renderer.close()
+        _renderer = None
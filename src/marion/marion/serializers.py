@@ -1,8 +1,10 @@
 """Serializers for the marion application"""
 
+from django.urls import reverse
+
 from rest_framework import serializers
 
-from .models import DocumentRequest
+from .models import DocumentRequest, DocumentRequestStatus
 
 
 class DocumentRequestSerializer(serializers.HyperlinkedModelSerializer):
@@ -13,10 +15,27 @@ class DocumentRequestSerializer(serializers.HyperlinkedModelSerializer):
         fields = "__all__"
 
     document_url = serializers.SerializerMethodField()
+    download_url = serializers.SerializerMethodField()
 
     def get_document_url(self, instance):
-        """Add the document URL to the object"""
-
+        """Add the document URL to the object (if it has been generated)"""
+
+        # Lazy documents are only rendered when downloaded
+        if (
+            instance.document_id is None
+            or instance.status == DocumentRequestStatus.LAZY
+        ):
+            return None
         return self._context.get("request").build_absolute_uri(
             instance.get_document_url()
         )
+
+    def get_download_url(self, instance):
+        """Add the document download view URL to the object (if it has been
+        generated)"""
+
+        if instance.document_id is None:
+            return None
+        return self._context.get("request").build_absolute_uri(
+            reverse("documents-download", args=[instance.document_id])
+        )
@@ -0,0 +1,14 @@
+"""Signals for the marion application"""
+
+from django.dispatch import Signal
+
+# Sent once a document has been created (see the AbstractDocument.write_pdf
+# method) with the issuer class as sender and the following arguments:
+#
+# - document: the issuer instance
+# - timings: rendering phases durations in seconds, indexed by phase name
+#   (fetch_context, validate_context, templates, parse, layout and write_pdf)
+# - size: the PDF document size in bytes
+#
+# Signal.send returns immediately when there is no registered receiver.
+document_created = Signal()
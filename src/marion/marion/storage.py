@@ -0,0 +1,131 @@
+"""Generated documents storage for the marion application"""
+
+import heapq
+import itertools
+import os
+import posixpath
+import re
+import shutil
+from pathlib import Path
+
+from django.core.files.storage import FileSystemStorage, storages
+
+from . import defaults
+
+DOCUMENT_NAME_RE = re.compile(
+    r"^(?P<identifier>[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12})"
+    r"\.pdf$"
+)
+SHARD_NAME_RE = re.compile(r"^[0-9a-f]+$")
+
+
+def get_storage():
+    """Get the generated documents storage (see the DOCUMENTS_STORAGE setting).
+
+    If no storage alias is configured, documents are stored in the
+    DOCUMENTS_ROOT directory of the local file system.
+
+    """
+
+    if defaults.DOCUMENTS_STORAGE is not None:
+        return storages[defaults.DOCUMENTS_STORAGE]
+    return FileSystemStorage(location=defaults.DOCUMENTS_ROOT)
+
+
+def open_for_writing(storage, name):
+    """Open a document file in the storage for writing.
+
+    Contrary to the Storage.save method, the document is written to the storage
+    while it is being generated (instead of being copied once generated) and
+    an existing document with the same name is replaced.
+
+    """
+
+    if isinstance(storage, FileSystemStorage):
+        Path(storage.path(name)).parent.mkdir(parents=True, exist_ok=True)
+    return storage.open(name, "wb")
+
+
+def move_document(storage, source_name, target_name):
+    """Move a document file in the storage.
+
+    Documents are renamed in file system storages, else they are copied (in
+    chunks) before deleting the source file. Returns False if the source
+    document does not exist.
+
+    """
+
+    if isinstance(storage, FileSystemStorage):
+        target_path = Path(storage.path(target_name))
+        target_path.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            os.replace(storage.path(source_name), target_path)
+        except FileNotFoundError:
+            return False
+        return True
+
+    if not storage.exists(source_name):
+        return False
+    with storage.open(source_name, "rb") as source, open_for_writing(
+        storage, target_name
+    ) as target:
+        shutil.copyfileobj(source, target, defaults.DOWNLOAD_CHUNK_SIZE)
+    storage.delete(source_name)
+    return True
+
+
+def walk_documents(storage, shard_depth=None):
+    """Yield (identifier, name) tuples of documents stored in the storage.
+
+    Only documents stored where they are generated are yielded: at the root of
+    the storage (_i.e._ the flat layout, for documents generated before
+    sharding documents) and in the shard directories of the layout set by the
+    DOCUMENTS_SHARD_DEPTH (default: the shard_depth argument) and
+    DOCUMENTS_SHARD_WIDTH settings. Other files and directories (_e.g._ of
+    other applications sharing the storage) are ignored.
+
+    Documents are yielded sorted by identifier. Only one directory per shard
+    level is listed at a time, so that the memory usage depends on the size
+    of the largest directory (the whole storage root with the flat layout),
+    not on the number of documents.
+
+    """
+
+    if shard_depth is None:
+        shard_depth = defaults.DOCUMENTS_SHARD_DEPTH
+    yield from _walk_shard(storage, "", shard_depth, defaults.DOCUMENTS_SHARD_WIDTH)
+
+
+def _walk_shard(storage, path, shard_depth, shard_width):
+    """Yield sorted (identifier, name) tuples of documents of a shard directory
+    and its sub-directories (see walk_documents)"""
+
+    try:
+        directories, files = storage.listdir(path)
+    except FileNotFoundError:
+        return
+
+    level = path.count("/") + 1 if path else 0
+    prefix = path.replace("/", "")
+    documents = []
+    if level in (0, shard_depth):
+        documents = sorted(
+            (match["identifier"], posixpath.join(path, filename))
+            for match, filename in zip(map(DOCUMENT_NAME_RE.match, files), files)
+            if match is not None
+            and match["identifier"].replace("-", "").startswith(prefix)
+        )
+
+    sharded = ()
+    if level < shard_depth:
+        # Shard directories of a level hold distinct identifier prefixes of the
+        # same width, hence walking them one after the other yields sorted
+        # identifiers
+        sharded = itertools.chain.from_iterable(
+            _walk_shard(
+                storage, posixpath.join(path, directory), shard_depth, shard_width
+            )
+            for directory in sorted(directories)
+            if len(directory) == shard_width and SHARD_NAME_RE.match(directory)
+        )
+    yield from heapq.merge(documents, sharded)
@@ -1,19 +1,28 @@
 """Tests for the marion.issuers.base document"""
 
+import base64
+import os
 import uuid
 from datetime import datetime
 from io import BytesIO
 from pathlib import Path
 from unittest.mock import patch
 
+from django.core.files.storage import storages
 from django.template import Context, Template, engines
 from django.template.engine import Engine
 
 import pytest
 from pdfminer.high_level import extract_text as pdf_extract_text
+from pdfminer.pdfdocument import PDFDocument
+from pdfminer.pdfparser import PDFParser
+from PIL import Image
 from pydantic import BaseModel
+from weasyprint import HTML
 from weasyprint.document import Document, DocumentMetadata
 
+from marion import defaults
+from marion.cache import DataURIImageCache, get_font_config, get_template
 from marion.defaults import DOCUMENTS_ROOT
 from marion.exceptions import (
     DocumentIssuerContextQueryValidationError,
@@ -21,7 +30,9 @@ from marion.exceptions import (
     DocumentIssuerMissingContext,
     DocumentIssuerMissingContextQuery,
 )
+from marion.issuers import DummyDocument
 from marion.issuers.base import AbstractDocument
+from marion.signals import document_created
 
 
 def test_abstract_document_interface_with_missing_abstract_methods():
@@ -74,6 +85,7 @@ def test_abstract_document_init(monkeypatch):
     assert test_document.context is None
     assert test_document.css is None
     assert test_document.html is None
+    assert test_document.timings == {}
 
     # PDFFileMetadataMixin attributes
     assert test_document.created == freezed_now.isoformat()
@@ -123,6 +135,25 @@ def test_abstract_document_get_document_path():
     assert test_document.get_document_path() == Path(f"{DOCUMENTS_ROOT}/richie.pdf")
 
 
+def test_abstract_document_get_document_name():
+    """Test AbstractDocument get_document_name method"""
+
+    # pylint: disable=missing-class-docstring
+    class TestDocument(AbstractDocument):
+        def fetch_context(self, **context_query):
+            pass
+
+    test_document = TestDocument()
+    assert test_document.get_document_name() == f"{test_document.identifier}.pdf"
+
+    test_document.document_path = Path(f"{DOCUMENTS_ROOT}/ri/richie.pdf")
+    assert test_document.get_document_name() == "ri/richie.pdf"
+
+    # Documents located outside the documents root are named after their file
+    test_document.document_path = Path("/elsewhere/richie.pdf")
+    assert test_document.get_document_name() == "richie.pdf"
+
+
 def test_abstract_document_get_document_url():
     """Test AbstractDocument get_document_url method"""
 
@@ -143,6 +174,85 @@ def test_abstract_document_get_document_url():
     )
 
 
+def test_abstract_document_default_document_location():
+    """Test AbstractDocument default document location class methods"""
+
+    # pylint: disable=missing-class-docstring
+    class TestDocument(AbstractDocument):
+        def fetch_context(self, **context_query):
+            pass
+
+    identifier = uuid.uuid4()
+    assert TestDocument.has_default_document_location()
+    assert TestDocument.get_default_document_path(identifier) == Path(
+        f"{DOCUMENTS_ROOT}/{identifier}.pdf"
+    )
+    assert TestDocument.get_default_document_url(identifier) == (
+        f"/media/{identifier}.pdf"
+    )
+    assert TestDocument.get_default_document_url(
+        identifier, host="example.org", schema="http"
+    ) == (f"http://example.org/media/{identifier}.pdf")
+
+    # Instance methods should be consistent with class methods
+    test_document = TestDocument(identifier=str(identifier))
+    assert test_document.get_document_path() == (
+        TestDocument.get_default_document_path(identifier)
+    )
+    assert test_document.get_document_url() == (
+        TestDocument.get_default_document_url(identifier)
+    )
+
+    # pylint: disable=missing-class-docstring
+    class CustomPathDocument(TestDocument):
+        def get_document_path(self):
+            return DOCUMENTS_ROOT.joinpath("richie.pdf")
+
+    assert not CustomPathDocument.has_default_document_location()
+
+    # pylint: disable=missing-class-docstring
+    class CustomURLDocument(TestDocument):
+        def get_document_url(self, host=None, schema="https"):
+            return "https://example.org/richie.pdf"
+
+    assert not CustomURLDocument.has_default_document_location()
+
+    # pylint: disable=missing-class-docstring
+    class CustomNameDocument(TestDocument):
+        def get_document_name(self):
+            return "richie.pdf"
+
+    assert not CustomNameDocument.has_default_document_location()
+
+
+def test_abstract_document_get_default_document_name(monkeypatch):
+    """Test AbstractDocument get_default_document_name class method"""
+
+    identifier = "abcdef12-3456-7890-abcd-ef1234567890"
+    assert AbstractDocument.get_default_document_name(identifier) == (
+        f"{identifier}.pdf"
+    )
+
+    monkeypatch.setattr(defaults, "DOCUMENTS_SHARD_DEPTH", 2)
+    assert AbstractDocument.get_default_document_name(identifier) == (
+        f"ab/cd/{identifier}.pdf"
+    )
+    assert AbstractDocument.get_default_document_name(identifier, shard_depth=0) == (
+        f"{identifier}.pdf"
+    )
+    assert AbstractDocument.get_default_document_path(identifier) == Path(
+        f"{DOCUMENTS_ROOT}/ab/cd/{identifier}.pdf"
+    )
+    assert AbstractDocument.get_default_document_url(identifier) == (
+        f"/media/ab/cd/{identifier}.pdf"
+    )
+
+    monkeypatch.setattr(defaults, "DOCUMENTS_SHARD_WIDTH", 3)
+    assert AbstractDocument.get_default_document_name(identifier, shard_depth=3) == (
+        f"abc/def/123/{identifier}.pdf"
+    )
+
+
 def test_abstract_document_get_css(monkeypatch):
     """Test AbstractDocument get_css method"""
 
@@ -431,6 +541,80 @@ def test_abstract_document_create():
         )
 
 
+def test_abstract_document_create_outside_documents_root(tmp_path):
+    """Test AbstractDocument create method with a document path located outside
+    of the documents root"""
+
+    test_document = DummyDocument(context_query={"fullname": "Richie Cunningham"})
+    test_document.document_path = tmp_path / "x.pdf"
+    test_document_path = test_document.create()
+
+    # The document has been written to its path
+    assert test_document_path == tmp_path / "x.pdf"
+    assert test_document_path.exists()
+    assert test_document_path.read_bytes().startswith(b"%PDF")
+    assert not DOCUMENTS_ROOT.joinpath("x.pdf").exists()
+
+
+def test_abstract_document_create_with_storage(monkeypatch, settings):
+    """Test AbstractDocument create method with a configured documents storage"""
+
+    settings.STORAGES = {
+        **settings.STORAGES,
+        "documents": {"BACKEND": "django.core.files.storage.InMemoryStorage"},
+    }
+    monkeypatch.setattr(defaults, "DOCUMENTS_STORAGE", "documents")
+
+    test_document = DummyDocument(context_query={"fullname": "Richie Cunningham"})
+    test_document_path = test_document.create()
+
+    # The document has been written to the storage (not the file system)
+    assert not test_document_path.exists()
+    assert test_document.get_document_name() == f"{test_document.identifier}.pdf"
+    with storages["documents"].open(test_document.get_document_name()) as pdf:
+        assert "Richie Cunningham" in pdf_extract_text(pdf)
+
+
+def test_abstract_document_create_timings():
+    """Test AbstractDocument create method rendering phases timings"""
+
+    received = []
+
+    def receiver(sender, document, timings, size, **kwargs):
+        received.append((sender, document, dict(timings), size))
+
+    document_created.connect(receiver, sender=DummyDocument)
+    try:
+        test_document = DummyDocument(context_query={"fullname": "Richie Cunningham"})
+        pdf = test_document.create(persist=False)
+    finally:
+        document_created.disconnect(receiver, sender=DummyDocument)
+
+    phases = {
+        "fetch_context",
+        "validate_context",
+        "templates",
+        "parse",
+        "layout",
+        "write_pdf",
+    }
+    assert set(test_document.timings) == phases
+    assert all(duration >= 0 for duration in test_document.timings.values())
+    assert received == [(DummyDocument, test_document, test_document.timings, len(pdf))]
+
+    # The context has already been fetched: its phases are not timed again
+    other_document = DummyDocument(context_query={"fullname": "Marion Ross"})
+    other_document.set_context(test_document.context.model_dump())
+    other_document.create(persist=False)
+    assert set(other_document.timings) == phases - {
+        "fetch_context",
+        "validate_context",
+    }
+
+    # Receivers are disconnected
+    assert len(received) == 1
+
+
 def test_abstract_document_create_without_persist():
     """Test AbstractDocument create method with persist=False"""
 
@@ -599,3 +783,199 @@ def test_abstract_document_jinja_template_engine(settings):
         test_document.get_html().render({"fullname": "Richie Cunningham"})
         == "<body>My name is Richie Cunningham (status: ninja)</body>"
     )
+
+
+def test_abstract_document_create_shares_font_configuration():
+    """Test that the AbstractDocument create method uses the cached font
+    configuration.
+    """
+
+    # pylint: disable=missing-class-docstring
+    class ContextModel(BaseModel):
+        pass
+
+    # pylint: disable=missing-class-docstring
+    class ContextQueryModel(BaseModel):
+        pass
+
+    class TestDocument(AbstractDocument):
+        context_model = ContextModel
+        context_query_model = ContextQueryModel
+
+        def get_html(self):
+            return Template("<body>An empty document</body>")
+
+        def get_css(self):
+            return Template("")
+
+        def fetch_context(self):
+            return {}
+
+    with patch("marion.issuers.base.HTML.render") as mocked_render:
+        TestDocument().create(persist=False)
+        TestDocument().create(persist=False)
+
+    assert mocked_render.call_count == 2
+    first_font_config = mocked_render.call_args_list[0][1]["font_config"]
+    second_font_config = mocked_render.call_args_list[1][1]["font_config"]
+    assert first_font_config is second_font_config
+    assert first_font_config is get_font_config()
+
+
+def test_abstract_document_create_many():
+    """Test AbstractDocument create_many class method"""
+
+    context_queries = [
+        {"fullname": "Richie Cunningham"},
+        {"fullname": ""},
+        DummyDocument(
+            identifier="0a1c3ccf-c67d-4071-ab1f-3b27628db9b1",
+            context_query={"fullname": "Marion Ross"},
+        ),
+    ]
+
+    with patch(
+        "marion.issuers.base.get_template", wraps=get_template
+    ) as mocked_get_template, patch(
+        "marion.issuers.base.HTML.render", wraps=HTML.render, autospec=True
+    ) as mocked_render:
+        documents = DummyDocument.create_many(iter(context_queries[1:]), persist=False)
+
+        # Documents are created lazily
+        mocked_get_template.assert_not_called()
+
+        document, result = next(documents)
+        assert document is None
+        assert isinstance(result, DocumentIssuerContextQueryValidationError)
+        document, result = next(documents)
+        assert document is context_queries[2]
+        assert "Marion Ross" in pdf_extract_text(BytesIO(result))
+        assert next(documents, None) is None
+
+        results = list(DummyDocument.create_many(context_queries[:1]))
+
+    # Issuer templates are fetched once per batch
+    assert mocked_get_template.call_count == 4
+
+    # Font configuration and images cache are shared across the batch
+    assert mocked_render.call_count == 2
+    assert mocked_render.call_args_list[0][1]["font_config"] is get_font_config()
+    assert mocked_render.call_args_list[1][1]["font_config"] is get_font_config()
+
+    document, document_path = results[0]
+    assert document.context.fullname == "Richie Cunningham"
+    assert document_path == document.get_document_path()
+    assert document_path.exists()
+
+
+def test_abstract_document_create_many_shares_images_cache():
+    """Test that the AbstractDocument create_many class method shares the
+    images cache across the batch"""
+
+    with patch("marion.issuers.base.HTML.render") as mocked_render:
+        list(
+            DummyDocument.create_many(
+                [{"fullname": "Richie Cunningham"}, {"fullname": "Marion Ross"}],
+                persist=False,
+            )
+        )
+
+    assert mocked_render.call_count == 2
+    first_cache = mocked_render.call_args_list[0][1]["cache"]
+    assert isinstance(first_cache, DataURIImageCache)
+    assert mocked_render.call_args_list[1][1]["cache"] is first_cache
+
+
+def test_abstract_document_create_merged(tmp_path):
+    """Test AbstractDocument create_merged class method"""
+
+    # pylint: disable=missing-class-docstring
+    class ContextModel(BaseModel):
+        fullname: str
+
+    # pylint: disable=missing-class-docstring
+    class ContextQueryModel(BaseModel):
+        fullname: str
+
+    # pylint: disable=missing-class-docstring
+    class TestDocument(AbstractDocument):
+        context_model = ContextModel
+        context_query_model = ContextQueryModel
+
+        def get_html(self):
+            return Template(
+                "<body><h1>Certificate</h1><p>My name is {{ fullname }}</p></body>"
+            )
+
+        def get_css(self):
+            return Template("h1 {break-before: page}")
+
+        def fetch_context(self):
+            return self.context_query.model_dump()
+
+        def get_bookmark_label(self):
+            return self.context.fullname
+
+    context_queries = [{"fullname": "Richie Cunningham"}, {"fullname": "Marion Ross"}]
+
+    pdf = TestDocument.create_merged(context_queries)
+    text = pdf_extract_text(BytesIO(pdf))
+    assert text.index("Richie Cunningham") < text.index("Marion Ross")
+
+    # Each document has its own top-level bookmark
+    outlines = PDFDocument(PDFParser(BytesIO(pdf))).get_outlines()
+    assert [(level, title) for level, title, *_ in outlines] == [
+        (1, "Richie Cunningham"),
+        (2, "Certificate"),
+        (1, "Marion Ross"),
+        (2, "Certificate"),
+    ]
+
+    target = tmp_path / "merged.pdf"
+    assert TestDocument.create_merged(context_queries, target=target) is None
+    assert target.read_bytes().startswith(b"%PDF")
+
+    with pytest.raises(
+        ValueError,
+        match="At least one document is required to create a merged PDF",
+    ):
+        TestDocument.create_merged([])
+
+
+def test_abstract_document_create_merged_embeds_shared_images_once():
+    """Test that images shared by merged documents are only embedded once"""
+
+    png = BytesIO()
+    Image.frombytes("L", (128, 128), os.urandom(128 * 128)).save(png, format="PNG")
+    logo = f"data:image/png;base64,{base64.b64encode(png.getvalue()).decode()}"
+
+    # pylint: disable=missing-class-docstring
+    class ContextModel(BaseModel):
+        fullname: str
+
+    # pylint: disable=missing-class-docstring
+    class ContextQueryModel(BaseModel):
+        fullname: str
+
+    # pylint: disable=missing-class-docstring
+    class TestDocument(AbstractDocument):
+        context_model = ContextModel
+        context_query_model = ContextQueryModel
+
+        def get_html(self):
+            return Template(f'<body><img src="{logo}"><p>{{{{ fullname }}}}</p></body>')
+
+        def get_css(self):
+            return Template("")
+
+        def fetch_context(self):
+            return self.context_query.model_dump()
+
+    context_queries = [{"fullname": f"Student {index}"} for index in range(5)]
+
+    merged_size = len(TestDocument.create_merged(context_queries))
+    documents_size = sum(
+        len(result)
+        for _, result in TestDocument.create_many(context_queries, persist=False)
+    )
+    assert merged_size < documents_size / 3
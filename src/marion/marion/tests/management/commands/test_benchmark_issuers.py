@@ -0,0 +1,50 @@
+"""Tests for the benchmark_issuers management command"""
+
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import CommandError, call_command
+
+import pytest
+
+from marion import benchmarks
+from marion.issuers import DummyDocument
+
+
+def test_benchmark_issuers_command_soak_without_rss(monkeypatch):
+    """Test the --soak option when the resident set size cannot be read"""
+
+    monkeypatch.setattr(benchmarks, "get_rss", lambda: None)
+
+    with pytest.raises(CommandError, match="/proc/self/statm is required"):
+        call_command("benchmark_issuers", soak=10)
+
+
+def test_benchmark_issuers_command_soak_max_growth(monkeypatch):
+    """Test the --soak-max-growth option"""
+
+    rss = iter(range(0, 100 * 1024**2, 1024**2))
+    monkeypatch.setattr(benchmarks, "get_rss", lambda: next(rss))
+    monkeypatch.setattr(benchmarks, "time_renders", lambda *args, **kwargs: [0.1])
+    monkeypatch.setattr(benchmarks, "time_batch_renders", lambda *args, **kwargs: [0.1])
+    monkeypatch.setattr(benchmarks, "get_output_size", lambda *args: 1024)
+    options = {
+        "issuer": ["marion.issuers.DummyDocument"],
+        "iterations": 1,
+        "batch_size": 1,
+        "soak": 4,
+        "soak_interval": 1,
+        "stdout": StringIO(),
+    }
+
+    # The resident set size grows by 1MiB per render
+    with patch.object(DummyDocument, "create"):
+        call_command("benchmark_issuers", soak_max_growth=5, **options)
+        with pytest.raises(
+            CommandError,
+            match=(
+                "Resident set size grew by more than 2.0MiB while rendering "
+                "documents of: marion.issuers.DummyDocument"
+            ),
+        ):
+            call_command("benchmark_issuers", soak_max_growth=2, **options)
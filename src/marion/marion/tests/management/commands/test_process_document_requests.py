@@ -0,0 +1,143 @@
+"""Tests for the process_document_requests management command"""
+
+import time
+from io import StringIO
+
+from django.core.management import call_command
+
+import pytest
+
+from marion import factories, issuers, models
+from marion.management.commands import process_document_requests
+from marion.signals import document_created
+from marion.watchdog import MemoryWatchdog
+
+
+def enqueue(**context_query):
+    """Store a pending document request for the dummy issuer"""
+
+    document_request = factories.DocumentRequestFactory.build(
+        issuer="marion.issuers.DummyDocument", context_query=context_query
+    )
+    document_request.enqueue()
+    return document_request
+
+
+@pytest.mark.django_db
+def test_process_document_requests_command(monkeypatch):
+    """Test the process_document_requests command"""
+
+    first_document_request = enqueue(fullname="Richie Cunningham")
+    second_document_request = enqueue(fullname="Fonzie")
+
+    # The context cannot be fetched for the second document request
+    fetch_context = issuers.DummyDocument.fetch_context
+
+    def mock_fetch_context(self, *args, **kwargs):
+        """Fail to fetch the context for Fonzie"""
+        if self.context_query.fullname == "Fonzie":
+            raise ConnectionError("Service unavailable")
+        return fetch_context(self, *args, **kwargs)
+
+    monkeypatch.setattr(issuers.DummyDocument, "fetch_context", mock_fetch_context)
+
+    output = StringIO()
+    call_command("process_document_requests", once=True, stdout=output)
+    assert output.getvalue().splitlines() == [
+        f"{first_document_request.pk} done",
+        f"{second_document_request.pk} failed",
+    ]
+
+    first_document_request.refresh_from_db()
+    assert first_document_request.status == models.DocumentRequestStatus.DONE
+    assert first_document_request.error is None
+    assert first_document_request.context.get("fullname") == "Richie Cunningham"
+    assert first_document_request.get_issuer().get_document_path().exists()
+
+    second_document_request.refresh_from_db()
+    assert second_document_request.status == models.DocumentRequestStatus.FAILED
+    assert second_document_request.error == "Service unavailable"
+    assert second_document_request.document_id is None
+
+
+@pytest.mark.django_db
+def test_process_document_requests_command_requeue_after():
+    """Test the process_document_requests command --requeue-after option"""
+
+    document_request = enqueue(fullname="Richie Cunningham")
+    models.DocumentRequest.claim_pending()
+
+    # Running document requests are left untouched by default
+    call_command("process_document_requests", once=True, stdout=StringIO())
+    document_request.refresh_from_db()
+    assert document_request.status == models.DocumentRequestStatus.RUNNING
+
+    call_command(
+        "process_document_requests", once=True, requeue_after=-1, stdout=StringIO()
+    )
+    document_request.refresh_from_db()
+    assert document_request.status == models.DocumentRequestStatus.DONE
+
+
+@pytest.mark.django_db
+def test_process_document_requests_command_heartbeat(monkeypatch):
+    """Test that rendered document requests update date is refreshed"""
+
+    document_request = enqueue(fullname="Richie Cunningham")
+
+    heartbeats = []
+
+    def mock_heartbeat(self):
+        """Record heartbeats"""
+        heartbeats.append(self.pk)
+        return True
+
+    generate_document = models.DocumentRequest.generate_document
+
+    def slow_generate_document(self, *args, **kwargs):
+        """Render the document slowly"""
+        time.sleep(0.2)
+        return generate_document(self, *args, **kwargs)
+
+    monkeypatch.setattr(models.DocumentRequest, "heartbeat", mock_heartbeat)
+    monkeypatch.setattr(
+        models.DocumentRequest, "generate_document", slow_generate_document
+    )
+
+    call_command(
+        "process_document_requests", once=True, heartbeat=0.01, stdout=StringIO()
+    )
+    assert heartbeats
+    assert set(heartbeats) == {document_request.pk}
+
+    # Heartbeats stop once the document has been rendered
+    count = len(heartbeats)
+    time.sleep(0.05)
+    assert len(heartbeats) == count
+
+
+@pytest.mark.django_db
+def test_process_document_requests_command_memory_watchdog(monkeypatch):
+    """Test that the command exits once the memory watchdog asks to"""
+
+    first_document_request = enqueue(fullname="Richie Cunningham")
+    enqueue(fullname="Fonzie")
+
+    memory_watchdog = MemoryWatchdog(max_renders=1)
+    monkeypatch.setattr(process_document_requests, "memory_watchdog", memory_watchdog)
+
+    document_created.connect(memory_watchdog.document_created)
+    try:
+        output = StringIO()
+        call_command("process_document_requests", once=True, stdout=output)
+    finally:
+        document_created.disconnect(memory_watchdog.document_created)
+
+    # The second document request is left pending for a fresh worker
+    assert output.getvalue().splitlines() == [f"{first_document_request.pk} done"]
+    assert (
+        models.DocumentRequest.objects.filter(
+            status=models.DocumentRequestStatus.PENDING
+        ).count()
+        == 1
+    )
@@ -0,0 +1,179 @@
+"""Tests for the purge_documents management command"""
+
+import os
+import time
+import uuid
+from datetime import timedelta
+from io import StringIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import InMemoryStorage, Storage
+from django.core.management import call_command
+from django.utils import timezone
+
+import pytest
+
+from marion import defaults, factories, models
+from marion import storage as storage_module
+from marion.management.commands import purge_documents
+
+
+def create_orphan(root, name, age):
+    """Create an orphaned document file modified age seconds ago"""
+
+    path = root.joinpath(name)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b"%PDF-1.7")
+    modified = time.time() - age
+    os.utime(path, (modified, modified))
+    return path
+
+
+@pytest.mark.django_db
+def test_purge_documents_command(monkeypatch, tmp_path):
+    """Test the purge_documents command"""
+
+    monkeypatch.setattr(defaults, "DOCUMENTS_ROOT", tmp_path)
+    monkeypatch.setattr(defaults, "DOCUMENTS_SHARD_DEPTH", 1)
+    monkeypatch.setattr(
+        defaults, "DOCUMENTS_RETENTION", {"marion.issuers.DummyDocument": 30}
+    )
+
+    expired, active = [
+        factories.DocumentRequestFactory(
+            issuer="marion.issuers.DummyDocument",
+            context_query={"fullname": fullname},
+        )
+        for fullname in ("Richie Cunningham", "Marion Cunningham")
+    ]
+    models.DocumentRequest.objects.filter(pk=expired.pk).update(
+        created_on=timezone.now() - timedelta(days=31)
+    )
+    expired_path = expired.get_document_path()
+    expired_size = expired_path.stat().st_size
+
+    flat_orphan = create_orphan(tmp_path, f"{uuid.uuid4()}.pdf", 7200)
+    identifier = str(uuid.uuid4())
+    sharded_orphan = create_orphan(tmp_path, f"{identifier[:2]}/{identifier}.pdf", 7200)
+    recent_orphan = create_orphan(tmp_path, f"{uuid.uuid4()}.pdf", 0)
+    other_file = create_orphan(tmp_path, "richie.pdf", 7200)
+    # Files of other applications are ignored, even if they look like documents
+    other_files = [
+        create_orphan(tmp_path, f"{directory}/{uuid.uuid4()}.pdf", 7200)
+        for directory in ("cafe", "2024", "ff/ff", "zz")
+    ]
+    # Documents are only looked for in the shard of their identifier
+    misplaced = f"{'00' if identifier[:2] != '00' else 'ff'}{uuid.uuid4().hex[2:]}"
+    misplaced = str(uuid.UUID(misplaced))
+    other_files.append(
+        create_orphan(tmp_path, f"{identifier[:2]}/{misplaced}.pdf", 7200)
+    )
+
+    output = StringIO()
+    call_command("purge_documents", "--dry-run", stdout=output)
+    assert output.getvalue() == (
+        "Would delete 1 expired document requests and 2 orphaned documents "
+        f"({expired_size + 16} bytes reclaimed)\n"
+    )
+    assert models.DocumentRequest.objects.count() == 2
+    assert expired_path.exists()
+    assert flat_orphan.exists()
+
+    output = StringIO()
+    call_command("purge_documents", "--batch-size", "1", stdout=output)
+    assert output.getvalue() == (
+        "Deleted 1 expired document requests and 2 orphaned documents "
+        f"({expired_size + 16} bytes reclaimed)\n"
+    )
+    assert list(models.DocumentRequest.objects.all()) == [active]
+    assert not expired_path.exists()
+    assert active.get_document_path().exists()
+    assert not flat_orphan.exists()
+    assert not sharded_orphan.exists()
+    assert recent_orphan.exists()
+    assert other_file.exists()
+    assert all(path.exists() for path in other_files)
+
+    # Recent orphans are deleted without grace period
+    output = StringIO()
+    call_command("purge_documents", "--grace-period", "0", stdout=output)
+    assert output.getvalue() == (
+        "Deleted 0 expired document requests and 1 orphaned documents "
+        "(8 bytes reclaimed)\n"
+    )
+    assert not recent_orphan.exists()
+    assert active.get_document_path().exists()
+    assert all(path.exists() for path in other_files)
+
+
+@pytest.mark.django_db
+def test_purge_documents_command_concurrent_creation(monkeypatch, tmp_path):
+    """Test that the purge_documents command does not delete documents whose
+    document request has been created while walking the documents storage"""
+
+    monkeypatch.setattr(defaults, "DOCUMENTS_ROOT", tmp_path)
+
+    identifier = uuid.uuid4()
+    document = create_orphan(tmp_path, f"{identifier}.pdf", 7200)
+
+    def walk_documents(storage):
+        """Create the document request while walking documents"""
+        for document_identifier, document_name in storage_module.walk_documents(
+            storage
+        ):
+            if document_identifier == str(identifier):
+                document_request = factories.DocumentRequestFactory(
+                    issuer="marion.issuers.DummyDocument",
+                    context_query={"fullname": "Richie Cunningham"},
+                )
+                models.DocumentRequest.objects.filter(pk=document_request.pk).update(
+                    document_id=identifier
+                )
+            yield document_identifier, document_name
+
+    monkeypatch.setattr(purge_documents, "walk_documents", walk_documents)
+
+    output = StringIO()
+    call_command("purge_documents", stdout=output)
+    assert output.getvalue() == (
+        "Deleted 0 expired document requests and 0 orphaned documents "
+        "(0 bytes reclaimed)\n"
+    )
+    assert document.exists()
+
+
+@pytest.mark.django_db
+def test_purge_documents_command_without_modified_time(monkeypatch):
+    """Test the purge_documents command with storages that do not support
+    files modification time"""
+
+    # pylint: disable=missing-class-docstring
+    class NoModifiedTimeStorage(InMemoryStorage):
+        get_modified_time = Storage.get_modified_time
+
+    # pylint: disable=missing-class-docstring
+    class UnsupportedModifiedTimeStorage(InMemoryStorage):
+        def get_modified_time(self, name):
+            raise NotImplementedError
+
+    for storage_class, warned in (
+        (NoModifiedTimeStorage, True),
+        (UnsupportedModifiedTimeStorage, False),
+    ):
+        storage = storage_class()
+        orphan = f"{uuid.uuid4()}.pdf"
+        storage.save(orphan, ContentFile(b"%PDF-1.7"))
+        monkeypatch.setattr(purge_documents, "get_storage", lambda: storage)
+
+        output, errors = StringIO(), StringIO()
+        call_command(
+            "purge_documents", "--grace-period", "0", stdout=output, stderr=errors
+        )
+        assert ("does not support files modification time" in errors.getvalue()) is (
+            warned
+        )
+        assert output.getvalue() == (
+            "Deleted 0 expired document requests and 0 orphaned documents "
+            "(0 bytes reclaimed)\n"
+        )
+        assert storage.exists(orphan)
@@ -0,0 +1,29 @@
+"""Tests for the purge_idempotency_keys management command"""
+
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.utils import timezone
+
+import pytest
+
+from marion import defaults, models
+
+
+@pytest.mark.django_db
+def test_purge_idempotency_keys_command():
+    """Test the purge_idempotency_keys command"""
+
+    models.IdempotencyKey.claim("expired", "fingerprint")
+    models.IdempotencyKey.objects.filter(key="expired").update(
+        created_on=timezone.now() - timedelta(seconds=defaults.IDEMPOTENCY_KEY_TTL + 1)
+    )
+    models.IdempotencyKey.claim("active", "fingerprint")
+
+    output = StringIO()
+    call_command("purge_idempotency_keys", stdout=output)
+    assert output.getvalue() == "Deleted 1 expired idempotency keys\n"
+    assert list(models.IdempotencyKey.objects.values_list("key", flat=True)) == [
+        "active"
+    ]
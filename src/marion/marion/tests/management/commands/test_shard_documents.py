@@ -0,0 +1,57 @@
+"""Tests for the shard_documents management command"""
+
+from io import StringIO
+
+from django.core.management import call_command
+
+import pytest
+
+from marion import defaults, factories
+
+
+@pytest.mark.django_db
+def test_shard_documents_command(monkeypatch, tmp_path):
+    """Test the shard_documents command"""
+
+    monkeypatch.setattr(defaults, "DOCUMENTS_ROOT", tmp_path)
+    document_requests = [
+        factories.DocumentRequestFactory(
+            issuer="marion.issuers.DummyDocument",
+            context_query={"fullname": fullname},
+        )
+        for fullname in ("Richie Cunningham", "Marion Cunningham")
+    ]
+    assert len(list(tmp_path.glob("*.pdf"))) == 2
+
+    # Nothing to do with the flat layout
+    output = StringIO()
+    call_command("shard_documents", stdout=output)
+    assert output.getvalue() == "Moved 0 documents (0 not found)\n"
+
+    monkeypatch.setattr(defaults, "DOCUMENTS_SHARD_DEPTH", 2)
+    output = StringIO()
+    call_command("shard_documents", "--dry-run", stdout=output)
+    assert output.getvalue() == "Would move 2 documents (0 not found)\n"
+    assert len(list(tmp_path.glob("*.pdf"))) == 2
+
+    output = StringIO()
+    call_command("shard_documents", "--workers", "2", stdout=output)
+    assert output.getvalue() == "Moved 2 documents (0 not found)\n"
+    assert len(list(tmp_path.glob("*.pdf"))) == 0
+    for document_request in document_requests:
+        document_name = document_request.get_document_name()
+        assert tmp_path.joinpath(document_name).exists()
+        assert document_request.find_document_name() == document_name
+
+    # Documents that have already been moved are not found
+    output = StringIO()
+    call_command("shard_documents", stdout=output)
+    assert output.getvalue() == "Moved 0 documents (2 not found)\n"
+
+    # Change the shard depth
+    monkeypatch.setattr(defaults, "DOCUMENTS_SHARD_DEPTH", 1)
+    output = StringIO()
+    call_command("shard_documents", "--from-depth", "2", stdout=output)
+    assert output.getvalue() == "Moved 2 documents (0 not found)\n"
+    for document_request in document_requests:
+        assert tmp_path.joinpath(document_request.get_document_name()).exists()
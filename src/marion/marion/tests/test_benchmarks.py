@@ -0,0 +1,53 @@
+"""Tests for the marion.benchmarks module"""
+
+import pytest
+
+from marion import benchmarks
+from marion.issuers import DummyDocument
+
+
+def test_summarize():
+    """Test the summarize function"""
+
+    durations = [index / 1000 for index in range(100, 0, -1)]
+    summary = benchmarks.summarize(durations)
+    assert summary["min"] == pytest.approx(1)
+    assert summary["max"] == pytest.approx(100)
+    assert summary["mean"] == pytest.approx(50.5)
+    assert summary["p50"] == pytest.approx(50)
+    assert summary["p95"] == pytest.approx(95)
+    assert summary["docs_per_second"] == pytest.approx(100 / sum(durations))
+
+    # Batch durations
+    summary = benchmarks.summarize([0.5, 0.5], documents=10)
+    assert summary["p50"] == pytest.approx(500)
+    assert summary["docs_per_second"] == pytest.approx(20)
+
+    assert benchmarks.summarize([0.1])["p95"] == pytest.approx(100)
+
+
+def test_time_batch_renders():
+    """Test the time_batch_renders function"""
+
+    context_query = benchmarks.SAMPLES["marion.issuers.DummyDocument"]
+    durations = benchmarks.time_batch_renders(
+        DummyDocument, context_query, batch_size=2, iterations=2, cold=True
+    )
+    assert len(durations) == 2
+    assert all(duration > 0 for duration in durations)
+
+    assert benchmarks.get_output_size(DummyDocument, context_query) > 0
+    assert benchmarks.get_peak_rss() > 0
+
+
+def test_soak_renders(monkeypatch):
+    """Test the soak_renders function"""
+
+    rss = iter(range(100, 200, 10))
+    monkeypatch.setattr(benchmarks, "get_rss", lambda: next(rss))
+    context_query = benchmarks.SAMPLES["marion.issuers.DummyDocument"]
+
+    samples = benchmarks.soak_renders(
+        DummyDocument, context_query, renders=5, interval=2
+    )
+    assert samples == [(0, 100), (2, 110), (4, 120), (5, 130)]
@@ -0,0 +1,316 @@
+"""Tests for the marion.cache module"""
+
+import base64
+import hashlib
+import os
+import threading
+from io import BytesIO
+from unittest.mock import patch
+
+from django.template.engine import Engine
+
+from PIL import Image
+from weasyprint import CSS, HTML
+from weasyprint.images import RasterImage
+from weasyprint.text.fonts import FontConfiguration
+
+from marion import cache, defaults, issuers
+
+
+def test_font_configuration_cache_get():
+    """Test the FontConfigurationCache get method"""
+
+    font_configurations = cache.FontConfigurationCache()
+
+    font_config = font_configurations.get()
+    assert isinstance(font_config, FontConfiguration)
+    assert font_configurations.get() is font_config
+
+
+def test_font_configuration_cache_clear():
+    """Test the FontConfigurationCache clear method"""
+
+    font_configurations = cache.FontConfigurationCache()
+
+    font_config = font_configurations.get()
+    assert font_configurations.generation == 0
+
+    font_configurations.clear()
+    assert font_configurations.generation == 1
+    assert font_configurations.get() is not font_config
+
+
+def test_font_configuration_cache_per_thread():
+    """Test that font configurations are not shared between threads"""
+
+    font_configurations = cache.FontConfigurationCache()
+    font_config = font_configurations.get()
+
+    thread_font_configs = []
+    thread = threading.Thread(
+        target=lambda: thread_font_configs.append(font_configurations.get())
+    )
+    thread.start()
+    thread.join()
+
+    assert len(thread_font_configs) == 1
+    assert thread_font_configs[0] is not font_config
+    assert font_configurations.get() is font_config
+
+
+def test_get_font_config(monkeypatch):
+    """Test the get_font_config function"""
+
+    font_config = cache.get_font_config()
+    assert cache.get_font_config() is font_config
+
+    cache.clear_font_config()
+    assert cache.get_font_config() is not font_config
+
+    # Disable the cache
+    monkeypatch.setattr(defaults, "FONT_CONFIGURATION_CACHE", False)
+    font_config = cache.get_font_config()
+    assert cache.get_font_config() is not font_config
+
+
+def test_lru_cache():
+    """Test the LRUCache class"""
+
+    lru_cache = cache.LRUCache(maxsize=2)
+    assert lru_cache.get("foo") is None
+    assert lru_cache.get("foo", "default") == "default"
+    assert lru_cache.stats == {"hits": 0, "misses": 2, "size": 0, "maxsize": 2}
+
+    lru_cache.set("foo", 1)
+    lru_cache.set("bar", 2)
+    assert lru_cache.get("foo") == 1
+    assert lru_cache.stats == {"hits": 1, "misses": 2, "size": 2, "maxsize": 2}
+
+    # The least recently used entry (bar) should be evicted
+    lru_cache.set("baz", 3)
+    assert "foo" in lru_cache
+    assert "bar" not in lru_cache
+    assert "baz" in lru_cache
+    assert len(lru_cache) == 2
+
+    lru_cache.clear()
+    assert len(lru_cache) == 0
+    assert lru_cache.stats == {"hits": 0, "misses": 0, "size": 0, "maxsize": 2}
+
+
+def test_get_stylesheet(monkeypatch):
+    """Test the get_stylesheet function"""
+
+    # pylint: disable=missing-class-docstring
+    class TestIssuer:
+        pass
+
+    # pylint: disable=missing-class-docstring
+    class OtherTestIssuer:
+        pass
+
+    cache.stylesheets.clear()
+    font_config = cache.get_font_config()
+
+    stylesheet = cache.get_stylesheet(TestIssuer, "body {color: red}", font_config)
+    assert isinstance(stylesheet, CSS)
+    assert cache.stylesheets.stats["misses"] == 1
+
+    # Stylesheet should be cached
+    assert (
+        cache.get_stylesheet(TestIssuer, "body {color: red}", font_config) is stylesheet
+    )
+    assert cache.stylesheets.stats["hits"] == 1
+
+    # Cache key depends on the issuer, the CSS string and the font configuration
+    assert (
+        cache.get_stylesheet(OtherTestIssuer, "body {color: red}", font_config)
+        is not stylesheet
+    )
+    assert (
+        cache.get_stylesheet(TestIssuer, "body {color: blue}", font_config)
+        is not stylesheet
+    )
+    assert (
+        cache.get_stylesheet(TestIssuer, "body {color: red}", FontConfiguration())
+        is not stylesheet
+    )
+    assert cache.stylesheets.stats["misses"] == 4
+
+    # Invalidating font configurations should invalidate stylesheets
+    cache.clear_font_config()
+    assert len(cache.stylesheets) == 0
+
+    # Disable the cache
+    monkeypatch.setattr(defaults, "CSS_CACHE_SIZE", 0)
+    font_config = cache.get_font_config()
+    stylesheet = cache.get_stylesheet(TestIssuer, "body {color: red}", font_config)
+    assert (
+        cache.get_stylesheet(TestIssuer, "body {color: red}", font_config)
+        is not stylesheet
+    )
+    assert len(cache.stylesheets) == 0
+
+
+def test_template_cache_get(tmp_path):
+    """Test the TemplateCache get method"""
+
+    template_path = tmp_path / "test.html"
+    template_path.write_text("<p>{{ foo }}</p>")
+    engine = Engine(
+        dirs=[tmp_path], loaders=["django.template.loaders.filesystem.Loader"]
+    )
+
+    # pylint: disable=missing-class-docstring
+    class TestIssuer:
+        pass
+
+    # pylint: disable=missing-class-docstring
+    class OtherTestIssuer:
+        pass
+
+    templates = cache.TemplateCache()
+    template = templates.get(TestIssuer, engine, "test.html")
+    assert templates.get(TestIssuer, engine, "test.html") is template
+    assert templates.get(OtherTestIssuer, engine, "test.html") is not template
+    assert len(templates) == 2
+
+    # Modify the template source file
+    template_path.write_text("<h1>{{ foo }}</h1>")
+    mtime = os.stat(template_path).st_mtime
+    os.utime(template_path, (mtime + 1, mtime + 1))
+
+    # Cached template should be returned unless the modification time is checked
+    assert templates.get(TestIssuer, engine, "test.html") is template
+    modified_template = templates.get(TestIssuer, engine, "test.html", check_mtime=True)
+    assert modified_template is not template
+    assert modified_template.source == "<h1>{{ foo }}</h1>"
+    assert (
+        templates.get(TestIssuer, engine, "test.html", check_mtime=True)
+        is modified_template
+    )
+
+    templates.clear()
+    assert len(templates) == 0
+
+
+def test_get_template(monkeypatch, settings, tmp_path):
+    """Test the get_template function"""
+
+    template_path = tmp_path / "test.html"
+    template_path.write_text("<p>{{ foo }}</p>")
+    engine = Engine(
+        dirs=[tmp_path], loaders=["django.template.loaders.filesystem.Loader"]
+    )
+
+    # pylint: disable=missing-class-docstring
+    class TestIssuer:
+        pass
+
+    settings.DEBUG = False
+    template = cache.get_template(TestIssuer, engine, "test.html")
+    assert cache.get_template(TestIssuer, engine, "test.html") is template
+
+    # Templates are not checked for modifications in production
+    template_path.write_text("<h1>{{ foo }}</h1>")
+    mtime = os.stat(template_path).st_mtime
+    os.utime(template_path, (mtime + 1, mtime + 1))
+    assert cache.get_template(TestIssuer, engine, "test.html") is template
+
+    # ... but they are in debug mode
+    settings.DEBUG = True
+    assert cache.get_template(TestIssuer, engine, "test.html") is not template
+
+    # Disable the cache
+    monkeypatch.setattr(defaults, "TEMPLATE_CACHE", False)
+    template = cache.get_template(TestIssuer, engine, "test.html")
+    assert cache.get_template(TestIssuer, engine, "test.html") is not template
+
+
+def test_preload_templates(monkeypatch):
+    """Test the preload_templates function"""
+
+    monkeypatch.setattr(cache, "templates", cache.TemplateCache())
+    cache.preload_templates([issuers.DummyDocument])
+
+    assert len(cache.templates) == 2
+
+
+def test_lru_cache_with_weigh_function():
+    """Test the LRUCache class with a weigh function"""
+
+    lru_cache = cache.LRUCache(maxsize=10, weigh=len)
+
+    lru_cache.set("foo", b"12345")
+    lru_cache.set("bar", b"1234")
+    assert lru_cache.size == 9
+    assert len(lru_cache) == 2
+
+    # Values heavier than the cache maximum size are ignored
+    lru_cache.set("baz", b"12345678901")
+    assert "baz" not in lru_cache
+    assert lru_cache.size == 9
+
+    # Replacing a value updates the cache size
+    lru_cache.set("bar", b"12")
+    assert lru_cache.size == 7
+
+    # Least recently used values are evicted until the new value fits
+    lru_cache.set("baz", b"123456")
+    assert "foo" not in lru_cache
+    assert "bar" in lru_cache
+    assert "baz" in lru_cache
+    assert lru_cache.size == 8
+
+
+def test_data_uri_image_cache(monkeypatch):
+    """Test the DataURIImageCache class"""
+
+    monkeypatch.setattr(cache, "images", cache.LRUCache(maxsize=2))
+
+    png = BytesIO()
+    Image.new("RGB", (2, 2), "red").save(png, format="PNG")
+    data_uri = f"data:image/png;base64,{base64.b64encode(png.getvalue()).decode()}"
+    digest = hashlib.sha256(data_uri.encode()).hexdigest()
+    html = HTML(string=f'<img src="{data_uri}">')
+
+    # Decoded data URI images are shared using the data URI digest
+    image_cache = cache.DataURIImageCache()
+    html.render(cache=image_cache)
+    image = cache.images.get(digest)
+    assert isinstance(image, RasterImage)
+    assert image_cache[data_uri] is image
+
+    image_cache = cache.DataURIImageCache()
+    assert data_uri in image_cache
+    assert image_cache[data_uri] is image
+
+    # Cached images should not be decoded again
+    with patch("weasyprint.images.Image.open") as mocked_open:
+        document = html.render(cache=cache.DataURIImageCache())
+        mocked_open.assert_not_called()
+    assert document.write_pdf().startswith(b"%PDF")
+
+    # Images fetched from other URLs are not shared
+    image_cache = cache.DataURIImageCache()
+    image_cache["https://example.com/image.png"] = image
+    assert "https://example.com/image.png" in image_cache
+    assert "https://example.com/image.png" not in cache.DataURIImageCache()
+    assert len(cache.images) == 1
+
+    # Failed images are not shared
+    image_cache = cache.DataURIImageCache()
+    image_cache["data:image/png;base64,bad"] = None
+    assert "data:image/png;base64,bad" not in cache.DataURIImageCache()
+    assert len(cache.images) == 1
+
+
+def test_get_image_cache(monkeypatch):
+    """Test the get_image_cache function"""
+
+    assert isinstance(cache.get_image_cache(), cache.DataURIImageCache)
+    assert cache.get_image_cache() is not cache.get_image_cache()
+
+    # Disable the cache
+    monkeypatch.setattr(defaults, "IMAGE_CACHE_SIZE", 0)
+    assert cache.get_image_cache() is None
@@ -0,0 +1,80 @@
+"""Tests for the marion application system checks"""
+
+from types import SimpleNamespace
+
+from marion import checks, defaults, metrics, registry
+from marion.issuers import DummyDocument
+
+
+def test_check_issuers_registry(monkeypatch):
+    """Test the check_issuers_registry system check"""
+
+    assert checks.check_issuers_registry(None) == []
+
+    monkeypatch.setattr(
+        registry,
+        "_registry",
+        registry.IssuerRegistry(
+            {
+                "marion.issuers.DummyDocument": DummyDocument,
+                "howard.issuers.DummyDocument": DummyDocument,
+            }
+        ),
+    )
+    errors = checks.check_issuers_registry(None)
+    assert len(errors) == 1
+    assert errors[0].id == "marion.W001"
+    assert errors[0].msg == (
+        "Document issuer class name DummyDocument is ambiguous: "
+        "marion.issuers.DummyDocument, howard.issuers.DummyDocument"
+    )
+
+
+def test_check_issuers_registry_import_error(monkeypatch):
+    """Test the check_issuers_registry system check with an invalid issuer"""
+
+    monkeypatch.setattr(registry, "_registry", None)
+    monkeypatch.setattr(
+        registry,
+        "DocumentIssuerChoices",
+        SimpleNamespace(choices=[("marion.issuers.Fonzy", "Fonzy")]),
+    )
+
+    errors = checks.check_issuers_registry(None)
+    assert len(errors) == 1
+    assert errors[0].id == "marion.E001"
+
+
+def test_check_metrics(monkeypatch):
+    """Test the check_metrics system check"""
+
+    monkeypatch.setattr(defaults, "METRICS_ENABLED", False)
+    monkeypatch.setattr(metrics, "prometheus_client", None)
+    assert checks.check_metrics(None) == []
+
+    monkeypatch.setattr(defaults, "METRICS_ENABLED", True)
+    errors = checks.check_metrics(None)
+    assert len(errors) == 1
+    assert errors[0].id == "marion.E002"
+
+
+def test_check_bulk_rendering(monkeypatch):
+    """Test the check_bulk_rendering system check"""
+
+    assert checks.check_bulk_rendering(None) == []
+
+    monkeypatch.setattr(defaults, "BULK_MAX_ITEMS", 500)
+    errors = checks.check_bulk_rendering(None)
+    assert len(errors) == 1
+    assert errors[0].id == "marion.W002"
+
+    # Documents are rendered in parallel by the process pool renderer
+    monkeypatch.setattr(
+        defaults, "RENDERER_CLASS", "marion.renderers.ProcessPoolRenderer"
+    )
+    assert checks.check_bulk_rendering(None) == []
+
+    # Documents are not rendered by the API in other request modes
+    monkeypatch.setattr(defaults, "RENDERER_CLASS", "marion.renderers.LocalRenderer")
+    monkeypatch.setattr(defaults, "DOCUMENT_REQUEST_MODE", "async")
+    assert checks.check_bulk_rendering(None) == []
@@ -0,0 +1,150 @@
+"""Tests for the marion.metrics module"""
+
+import pytest
+
+from marion import defaults, metrics, models
+from marion.issuers import DummyDocument
+from marion.signals import document_created
+
+prometheus_client = pytest.importorskip("prometheus_client")
+
+ISSUER = "marion.issuers.dummy.DummyDocument"
+
+
+def get_value(name, **labels):
+    """Get a metric sample value from the default registry (0 if missing)"""
+
+    value = prometheus_client.REGISTRY.get_sample_value(name, labels)
+    return value or 0
+
+
+def test_get_issuer_label():
+    """Test the get_issuer_label function"""
+
+    assert metrics.get_issuer_label(DummyDocument) == ISSUER
+
+
+def test_track_render(monkeypatch):
+    """Test the track_render context manager"""
+
+    monkeypatch.setattr(defaults, "METRICS_ENABLED", True)
+    successes = get_value(
+        "marion_document_renders_total", issuer=ISSUER, status="success"
+    )
+    failures = get_value(
+        "marion_document_renders_total", issuer=ISSUER, status="failure"
+    )
+    observed = get_value("marion_document_render_seconds_count", issuer=ISSUER)
+
+    with metrics.track_render(DummyDocument):
+        assert get_value("marion_document_renders_in_progress", issuer=ISSUER) == 1
+    assert get_value("marion_document_renders_in_progress", issuer=ISSUER) == 0
+    assert (
+        get_value("marion_document_renders_total", issuer=ISSUER, status="success")
+        == successes + 1
+    )
+    assert (
+        get_value("marion_document_render_seconds_count", issuer=ISSUER) == observed + 1
+    )
+
+    # Failed renders are counted, but their duration is not observed
+    with pytest.raises(ValueError):
+        with metrics.track_render(DummyDocument):
+            raise ValueError("Rendering failed")
+    assert get_value("marion_document_renders_in_progress", issuer=ISSUER) == 0
+    assert (
+        get_value("marion_document_renders_total", issuer=ISSUER, status="failure")
+        == failures + 1
+    )
+    assert (
+        get_value("marion_document_render_seconds_count", issuer=ISSUER) == observed + 1
+    )
+
+
+def test_track_render_disabled(monkeypatch):
+    """Test the track_render context manager when metrics are disabled"""
+
+    monkeypatch.setattr(defaults, "METRICS_ENABLED", False)
+    successes = get_value(
+        "marion_document_renders_total", issuer=ISSUER, status="success"
+    )
+
+    with metrics.track_render(DummyDocument):
+        pass
+    assert (
+        get_value("marion_document_renders_total", issuer=ISSUER, status="success")
+        == successes
+    )
+
+
+def test_observe_document_created(monkeypatch):
+    """Test the observe_document_created signal receiver"""
+
+    monkeypatch.setattr(defaults, "METRICS_ENABLED", True)
+    sizes = get_value("marion_document_size_bytes_sum", issuer=ISSUER)
+    layouts = get_value(
+        "marion_document_render_phase_seconds_count", issuer=ISSUER, phase="layout"
+    )
+
+    document_created.connect(metrics.observe_document_created, sender=DummyDocument)
+    try:
+        pdf = DummyDocument(context_query={"fullname": "Richie Cunningham"}).create(
+            persist=False
+        )
+    finally:
+        document_created.disconnect(
+            metrics.observe_document_created, sender=DummyDocument
+        )
+
+    assert get_value("marion_document_size_bytes_sum", issuer=ISSUER) == sizes + len(
+        pdf
+    )
+    assert (
+        get_value(
+            "marion_document_render_phase_seconds_count",
+            issuer=ISSUER,
+            phase="layout",
+        )
+        == layouts + 1
+    )
+
+
+@pytest.mark.django_db
+def test_count_document_requests(monkeypatch):
+    """Test that stored document requests are counted per issuer and status"""
+
+    monkeypatch.setattr(defaults, "METRICS_ENABLED", True)
+    done = get_value("marion_document_requests_total", issuer=ISSUER, status="done")
+    pending = get_value(
+        "marion_document_requests_total", issuer=ISSUER, status="pending"
+    )
+
+    document_request = models.DocumentRequest.objects.create(
+        issuer="marion.issuers.DummyDocument",
+        context_query={"fullname": "Richie Cunningham"},
+    )
+    # Updated document requests are not counted again
+    document_request.save()
+    models.DocumentRequest(
+        issuer="marion.issuers.DummyDocument",
+        context_query={"fullname": "Richie Cunningham"},
+    ).enqueue()
+
+    # Issuers are labelled with their class path
+    assert (
+        get_value("marion_document_requests_total", issuer=ISSUER, status="done")
+        == done + 1
+    )
+    assert (
+        get_value("marion_document_requests_total", issuer=ISSUER, status="pending")
+        == pending + 1
+    )
+
+
+def test_export():
+    """Test the export function"""
+
+    content, content_type = metrics.export()
+
+    assert content_type == prometheus_client.CONTENT_TYPE_LATEST
+    assert b"# TYPE marion_document_render_seconds histogram" in content
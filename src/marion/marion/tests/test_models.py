@@ -1,13 +1,19 @@
 """Tests for the marion application models"""
 
+import uuid
+from datetime import timedelta
+from unittest.mock import patch
+
 from django.core.exceptions import FieldError as DjangoFieldError
 from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import connection
 from django.db import models as django_models
+from django.utils import timezone
 
 import pytest
 from pydantic import BaseModel, ConfigDict
 
-from marion import exceptions, factories, issuers, models
+from marion import defaults, exceptions, factories, issuers, models, registry, renderers
 
 
 def test_pydantic_model_field_validation():
@@ -78,6 +84,40 @@ def test_pydantic_model_field_validation():
         instance.full_clean()
 
 
+def test_pydantic_model_field_model_instances():
+    """Test PydanticModelField values that are pydantic model instances"""
+    # pylint: disable=missing-class-docstring
+
+    class PydanticModelA(BaseModel):
+        fullname: str
+
+    class PydanticModelB(BaseModel):
+        amount: int
+
+    class TestModelE(django_models.Model):
+        data = models.PydanticModelField(pydantic_model=PydanticModelA)
+
+    field = TestModelE._meta.get_field("data")
+
+    # Field pydantic model instances are not validated again
+    instance = TestModelE(data=PydanticModelA(fullname="Richie"))
+    with patch.object(
+        PydanticModelA, "model_validate", side_effect=AssertionError
+    ), patch.object(PydanticModelA, "model_validate_json", side_effect=AssertionError):
+        instance.full_clean()
+        assert field.pre_save(instance, add=True) == {"fullname": "Richie"}
+    assert instance.data == {"fullname": "Richie"}
+
+    assert field.get_prep_value(PydanticModelA(fullname="Richie")) == (
+        field.get_prep_value({"fullname": "Richie"})
+    )
+
+    # Other pydantic model instances are validated
+    with pytest.raises(DjangoValidationError, match="Field required"):
+        instance = TestModelE(data=PydanticModelB(amount=2))
+        instance.full_clean()
+
+
 @pytest.mark.django_db
 def test_document_request_default_ordering():
     """Test the `DocumentRequest` default ordering"""
@@ -160,19 +200,20 @@ def test_document_request_save(monkeypatch):
 def test_document_request_get_issuer_class(monkeypatch):
     """Test the `DocumentRequest.get_issuer_class()` method"""
 
-    # pylint: disable=no-member
     monkeypatch.setattr(
-        models.DocumentRequest.issuer.field,
-        "choices",
-        [
-            ("marion.issuers.Arnold", "Arnold"),
-            ("marion.issuers.DummyDocument", "Dummy"),
-            ("marion.issuers.Marsha", "Marsha"),
-            ("marion.issuers.Richie", "Richie"),
-            ("howard.documents.issuers.Richie", "Richou"),
-            ("issuers.Richie", "Richinou"),
-            ("Richie", "Riccardo"),
-        ],
+        registry,
+        "_registry",
+        registry.IssuerRegistry(
+            {
+                "marion.issuers.Arnold": object,
+                "marion.issuers.DummyDocument": issuers.DummyDocument,
+                "marion.issuers.Marsha": object,
+                "marion.issuers.Richie": object,
+                "howard.documents.issuers.Richie": object,
+                "issuers.Richie": object,
+                "Richie": object,
+            }
+        ),
     )
 
     with pytest.raises(
@@ -225,3 +266,560 @@ def test_document_request_get_document_url():
         document_request.get_document_url(host="www.happy-days.com", schema="http")
         == f"http://www.happy-days.com/media/{document_request.document_id}.pdf"
     )
+
+
+@pytest.mark.django_db
+def test_document_request_save_validates_once():
+    """Test that the `DocumentRequest.save()` method validates the context and
+    the context query only once"""
+
+    context_model = issuers.DummyDocument.context_model
+    context_query_model = issuers.DummyDocument.context_query_model
+    with patch.object(
+        context_model, "model_validate", wraps=context_model.model_validate
+    ) as context_validate, patch.object(
+        context_query_model, "model_validate", wraps=context_query_model.model_validate
+    ) as context_query_validate:
+        document_request = factories.DocumentRequestFactory(
+            issuer="marion.issuers.DummyDocument",
+            context_query={"fullname": "Richie Cunningham"},
+        )
+
+    assert context_validate.call_count == 1
+    assert context_query_validate.call_count == 1
+
+    # Saved values are JSON-compatible dicts
+    assert document_request.context_query == {"fullname": "Richie Cunningham"}
+    assert document_request.context == {
+        "fullname": "Richie Cunningham",
+        "identifier": str(document_request.document_id),
+    }
+    document_request.refresh_from_db()
+    assert document_request.context == {
+        "fullname": "Richie Cunningham",
+        "identifier": str(document_request.document_id),
+    }
+
+
+@pytest.mark.django_db
+def test_document_request_document_location_without_issuer(monkeypatch):
+    """Test that the document location is computed without instantiating the
+    issuer when it uses the default document location"""
+
+    document_request = factories.DocumentRequestFactory(
+        issuer="marion.issuers.DummyDocument",
+        context_query={"fullname": "Richie Cunningham"},
+    )
+
+    def get_issuer():
+        raise AssertionError("The issuer should not be instantiated")
+
+    monkeypatch.setattr(document_request, "get_issuer", get_issuer)
+    assert document_request.get_document_path() == defaults.DOCUMENTS_ROOT.joinpath(
+        f"{document_request.document_id}.pdf"
+    )
+    assert (
+        document_request.get_document_url()
+        == f"/media/{document_request.document_id}.pdf"
+    )
+
+    # Issuers overriding the document location are instantiated
+    monkeypatch.undo()
+    monkeypatch.setattr(
+        issuers.DummyDocument,
+        "get_document_path",
+        lambda self: defaults.DOCUMENTS_ROOT.joinpath("richie.pdf"),
+    )
+    assert document_request.get_document_path() == defaults.DOCUMENTS_ROOT.joinpath(
+        "richie.pdf"
+    )
+    assert document_request.get_document_url() == "/media/richie.pdf"
+
+
+@pytest.mark.django_db
+def test_document_request_save_with_process_pool_renderer(monkeypatch):
+    """Test the `DocumentRequest.save()` method with the process pool renderer"""
+
+    monkeypatch.setattr(
+        defaults, "RENDERER_CLASS", "marion.renderers.ProcessPoolRenderer"
+    )
+    renderers.reset_renderer()
+
+    try:
+        document_request = factories.DocumentRequestFactory(
+            issuer="marion.issuers.DummyDocument",
+            context_query={"fullname": "Richie Cunningham"},
+        )
+    finally:
+        renderers.reset_renderer()
+
+    assert document_request.context.get("fullname") == "Richie Cunningham"
+    assert document_request.context.get("identifier") == str(
+        document_request.document_id
+    )
+    assert document_request.get_issuer().get_document_path().exists()
+
+
+@pytest.mark.django_db
+def test_document_request_save_status():
+    """Test the `DocumentRequest.save()` method with document request status"""
+
+    document_request = factories.DocumentRequestFactory(
+        issuer="marion.issuers.DummyDocument",
+        context_query={"fullname": "Richie Cunningham"},
+    )
+    assert document_request.status == models.DocumentRequestStatus.DONE
+    assert document_request.error is None
+
+    # Updating a document request should not generate the document again
+    document_id = document_request.document_id
+    document_request.get_issuer().get_document_path().unlink()
+    document_request.save()
+    assert document_request.document_id == document_id
+    assert not document_request.get_issuer().get_document_path().exists()
+
+
+@pytest.mark.django_db
+def test_document_request_enqueue():
+    """Test the `DocumentRequest.enqueue()` method"""
+
+    document_request = factories.DocumentRequestFactory.build(
+        issuer="marion.issuers.DummyDocument",
+        context_query={"fullname": "Richie Cunningham"},
+    )
+    document_request.enqueue()
+
+    document_request.refresh_from_db()
+    assert document_request.status == models.DocumentRequestStatus.PENDING
+    assert document_request.context_query == {"fullname": "Richie Cunningham"}
+    assert document_request.context is None
+    assert document_request.document_id is None
+
+    # The context query should be validated
+    document_request = factories.DocumentRequestFactory.build(
+        issuer="marion.issuers.DummyDocument",
+        context_query={"fullname": ""},
+    )
+    with pytest.raises(
+        DjangoValidationError,
+        match="String should have at least 2 characters",
+    ):
+        document_request.enqueue()
+    assert models.DocumentRequest.objects.count() == 1
+
+
+@pytest.mark.django_db
+def test_document_request_claim_pending():
+    """Test the `DocumentRequest.claim_pending()` method"""
+
+    assert models.DocumentRequest.claim_pending() is None
+
+    first_document_request = factories.DocumentRequestFactory.build(
+        issuer="marion.issuers.DummyDocument",
+        context_query={"fullname": "Richie Cunningham"},
+    )
+    first_document_request.enqueue()
+    second_document_request = factories.DocumentRequestFactory.build(
+        issuer="marion.issuers.DummyDocument",
+        context_query={"fullname": "Fonzie"},
+    )
+    second_document_request.enqueue()
+
+    # Oldest pending document requests are claimed first
+    claimed = models.DocumentRequest.claim_pending()
+    assert claimed == first_document_request
+    assert claimed.status == models.DocumentRequestStatus.RUNNING
+    claimed = models.DocumentRequest.claim_pending()
+    assert claimed == second_document_request
+    assert claimed.status == models.DocumentRequestStatus.RUNNING
+    assert models.DocumentRequest.claim_pending() is None
+
+
+@pytest.mark.django_db
+def test_document_request_requeue_stalled():
+    """Test the `DocumentRequest.requeue_stalled()` method"""
+
+    document_request = factories.DocumentRequestFactory.build(
+        issuer="marion.issuers.DummyDocument",
+        context_query={"fullname": "Richie Cunningham"},
+    )
+    document_request.enqueue()
+    models.DocumentRequest.claim_pending()
+
+    assert models.DocumentRequest.requeue_stalled(timeout=60) == 0
+    assert models.DocumentRequest.requeue_stalled(timeout=-1) == 1
+
+    document_request.refresh_from_db()
+    assert document_request.status == models.DocumentRequestStatus.PENDING
+
+
+@pytest.mark.django_db
+def test_document_request_heartbeat():
+    """Test the `DocumentRequest.heartbeat()` method"""
+
+    document_request = factories.DocumentRequestFactory.build(
+        issuer="marion.issuers.DummyDocument",
+        context_query={"fullname": "Richie Cunningham"},
+    )
+    document_request.enqueue()
+    claimed = models.DocumentRequest.claim_pending()
+    models.DocumentRequest.objects.filter(pk=claimed.pk).update(
+        updated_on=timezone.now() - timedelta(seconds=120)
+    )
+
+    # Running document requests are not requeued once refreshed
+    assert claimed.heartbeat() is True
+    assert models.DocumentRequest.requeue_stalled(timeout=60) == 0
+
+    models.DocumentRequest.requeue_stalled(timeout=-1)
+    assert claimed.heartbeat() is False
+
+
+@pytest.mark.django_db
+def test_document_request_bulk_generate(monkeypatch):
+    """Test the `DocumentRequest.bulk_generate()` method"""
+
+    fetch_context = issuers.DummyDocument.fetch_context
+
+    def mock_fetch_context(self):
+        """Fail to fetch the context for Fonzie"""
+        if self.context_query.fullname == "Fonzie":
+            raise exceptions.DocumentIssuerContextValidationError("Unknown student")
+        return fetch_context(self)
+
+    monkeypatch.setattr(issuers.DummyDocument, "fetch_context", mock_fetch_context)
+
+    document_requests = [
+        factories.DocumentRequestFactory.build(
+            issuer="marion.issuers.DummyDocument",
+            context_query={"fullname": fullname},
+        )
+        for fullname in ("Richie Cunningham", "Fonzie", "Marion Ross")
+    ]
+    outcomes = models.DocumentRequest.bulk_generate(document_requests)
+
+    assert [document_request for document_request, _ in outcomes] == document_requests
+    assert outcomes[0][1] is None
+    assert isinstance(outcomes[1][1], exceptions.DocumentIssuerContextValidationError)
+    assert outcomes[2][1] is None
+
+    # Only successful document requests are stored
+    assert models.DocumentRequest.objects.count() == 2
+    for document_request in (document_requests[0], document_requests[2]):
+        document_request.refresh_from_db()
+        assert document_request.status == models.DocumentRequestStatus.DONE
+        assert document_request.context.get("identifier") == str(
+            document_request.document_id
+        )
+        assert document_request.get_issuer().get_document_path().exists()
+
+
+@pytest.mark.django_db
+def test_document_request_defer(monkeypatch, tmp_path):
+    """Test the `DocumentRequest.defer()` method"""
+
+    monkeypatch.setattr(defaults, "DOCUMENTS_ROOT", tmp_path)
+    document_request = factories.DocumentRequestFactory.build(
+        issuer="marion.issuers.DummyDocument",
+        context_query={"fullname": "Richie Cunningham"},
+    )
+    document_request.defer()
+
+    # The context is stored but the document is not generated
+    document_request.refresh_from_db()
+    assert document_request.status == models.DocumentRequestStatus.LAZY
+    assert document_request.context == {
+        "fullname": "Richie Cunningham",
+        "identifier": str(document_request.document_id),
+    }
+    assert document_request.find_document_name() is None
+    assert not list(tmp_path.glob("*.pdf"))
+
+
+@pytest.mark.django_db
+def test_document_request_find_or_render_document(monkeypatch, tmp_path):
+    """Test the `DocumentRequest.find_or_render_document()` method"""
+
+    monkeypatch.setattr(defaults, "DOCUMENTS_ROOT", tmp_path)
+    document_request = factories.DocumentRequestFactory.build(
+        issuer="marion.issuers.DummyDocument",
+        context_query={"fullname": "Richie Cunningham"},
+    )
+    document_request.defer()
+    document_name = f"{document_request.document_id}.pdf"
+    renderer = renderers.get_renderer()
+
+    # The document is rendered from the stored context on first call
+    with patch.object(
+        issuers.DummyDocument, "fetch_context", side_effect=AssertionError
+    ), patch.object(renderer, "render", wraps=renderer.render) as render:
+        assert document_request.find_or_render_document() == document_name
+        assert render.call_count == 1
+        assert document_request.status == models.DocumentRequestStatus.DONE
+        assert tmp_path.joinpath(document_name).exists()
+
+        # ... and only once
+        assert document_request.find_or_render_document() == document_name
+        assert render.call_count == 1
+
+        # Deleted documents are rendered again
+        tmp_path.joinpath(document_name).unlink()
+        assert document_request.find_or_render_document() == document_name
+        assert render.call_count == 2
+        assert tmp_path.joinpath(document_name).exists()
+
+    document_request.refresh_from_db()
+    assert document_request.status == models.DocumentRequestStatus.DONE
+
+
+@pytest.mark.django_db
+def test_document_request_find_or_render_document_single_flight(monkeypatch, tmp_path):
+    """Test that the document is not rendered again once the document request
+    lock has been acquired, if it has been rendered in the meantime"""
+
+    monkeypatch.setattr(defaults, "DOCUMENTS_ROOT", tmp_path)
+    document_request = factories.DocumentRequestFactory.build(
+        issuer="marion.issuers.DummyDocument",
+        context_query={"fullname": "Richie Cunningham"},
+    )
+    document_request.defer()
+    document_name = f"{document_request.document_id}.pdf"
+
+    # Simulate a concurrent rendering while waiting for the lock
+    def find_document_name(storage=None):
+        models.DocumentRequest.objects.get(pk=document_request.pk).render_document()
+        return None
+
+    monkeypatch.setattr(document_request, "find_document_name", find_document_name)
+    renderer = renderers.get_renderer()
+    with patch.object(renderer, "render", wraps=renderer.render) as render:
+        assert document_request.find_or_render_document() == document_name
+        assert render.call_count == 1
+    assert document_request.status == models.DocumentRequestStatus.DONE
+
+
+@pytest.mark.django_db
+def test_document_request_bulk_enqueue():
+    """Test the `DocumentRequest.bulk_enqueue()` method"""
+
+    document_requests = models.DocumentRequest.bulk_enqueue(
+        factories.DocumentRequestFactory.build(
+            issuer="marion.issuers.DummyDocument",
+            context_query={"fullname": fullname},
+        )
+        for fullname in ("Richie Cunningham", "Marion Ross")
+    )
+
+    assert len(document_requests) == 2
+    assert (
+        models.DocumentRequest.objects.filter(
+            status=models.DocumentRequestStatus.PENDING, document_id__isnull=True
+        ).count()
+        == 2
+    )
+
+
+@pytest.mark.django_db
+def test_document_request_get_context_digest():
+    """Test the `DocumentRequest.get_context_digest()` method"""
+
+    document_request = factories.DocumentRequestFactory(
+        issuer="marion.issuers.DummyDocument",
+        context_query={"fullname": "Richie Cunningham"},
+    )
+    assert len(document_request.context_digest) == 64
+    assert document_request.context_digest == document_request.get_context_digest()
+
+    # The digest only depends on the issuer and the validated context query
+    other_document_request = factories.DocumentRequestFactory.build(
+        issuer="marion.issuers.DummyDocument",
+        context_query='{"fullname":  "Richie Cunningham"}',
+    )
+    assert (
+        other_document_request.get_context_digest() == document_request.context_digest
+    )
+    # Issuers can be referred to by their class name
+    other_document_request.issuer = "DummyDocument"
+    assert (
+        other_document_request.get_context_digest() == document_request.context_digest
+    )
+    other_document_request.context_query = {"fullname": "Marion Ross"}
+    assert (
+        other_document_request.get_context_digest() != document_request.context_digest
+    )
+
+    # Pending document requests digest is also stored
+    other_document_request.enqueue()
+    assert other_document_request.context_digest is not None
+
+
+@pytest.mark.django_db
+def test_document_request_find_duplicate(monkeypatch):
+    """Test the `DocumentRequest.find_duplicate()` method"""
+
+    document_request = factories.DocumentRequestFactory.build(
+        issuer="marion.issuers.DummyDocument",
+        context_query={"fullname": "Richie Cunningham"},
+    )
+    assert document_request.find_duplicate() is None
+
+    existing = factories.DocumentRequestFactory(
+        issuer="marion.issuers.DummyDocument",
+        context_query={"fullname": "Richie Cunningham"},
+    )
+    assert document_request.find_duplicate() == existing
+    assert existing.find_duplicate() is None
+
+    # Documents that have not been moved to the shards layout yet are found
+    monkeypatch.setattr(defaults, "DOCUMENTS_SHARD_DEPTH", 1)
+    assert document_request.find_duplicate() == existing
+    monkeypatch.setattr(defaults, "DOCUMENTS_SHARD_DEPTH", 0)
+
+    # Documents whose file is missing are ignored
+    existing.get_document_path().unlink()
+    assert document_request.find_duplicate() is None
+
+    # Failed document requests are ignored, pending ones are not
+    pending = factories.DocumentRequestFactory.build(
+        issuer="marion.issuers.DummyDocument",
+        context_query={"fullname": "Richie Cunningham"},
+    )
+    pending.enqueue()
+    assert document_request.find_duplicate() == pending
+
+    models.DocumentRequest.objects.filter(pk=pending.pk).update(
+        status=models.DocumentRequestStatus.FAILED
+    )
+    assert document_request.find_duplicate() is None
+
+
+@pytest.mark.django_db
+def test_idempotency_key_claim():
+    """Test the `IdempotencyKey.claim()` method"""
+
+    idempotency_key, claimed = models.IdempotencyKey.claim("foo", "fingerprint")
+    assert claimed is True
+    assert idempotency_key.completed is False
+
+    existing, claimed = models.IdempotencyKey.claim("foo", "other")
+    assert claimed is False
+    assert existing == idempotency_key
+    assert existing.fingerprint == "fingerprint"
+
+    # Released keys can be claimed again
+    idempotency_key.release()
+    _, claimed = models.IdempotencyKey.claim("foo", "other")
+    assert claimed is True
+
+    # So do expired keys
+    models.IdempotencyKey.objects.filter(key="foo").update(
+        created_on=timezone.now() - timedelta(seconds=defaults.IDEMPOTENCY_KEY_TTL + 1)
+    )
+    idempotency_key, claimed = models.IdempotencyKey.claim("foo", "fingerprint")
+    assert claimed is True
+    assert idempotency_key.fingerprint == "fingerprint"
+
+
+@pytest.mark.django_db
+def test_idempotency_key_complete_and_wait():
+    """Test the `IdempotencyKey.complete()` and `IdempotencyKey.wait()` methods"""
+
+    idempotency_key, _ = models.IdempotencyKey.claim("foo", "fingerprint")
+    existing, _ = models.IdempotencyKey.claim("foo", "fingerprint")
+    assert existing.wait(timeout=0.01, interval=0.001) is False
+
+    idempotency_key.complete(201, {"id": "bar"})
+    assert existing.wait(timeout=0.01, interval=0.001) is True
+    assert existing.status_code == 201
+    assert existing.response == {"id": "bar"}
+
+    # Released keys are not waited for
+    other, _ = models.IdempotencyKey.claim("baz", "fingerprint")
+    existing, _ = models.IdempotencyKey.claim("baz", "fingerprint")
+    other.release()
+    assert existing.wait(timeout=1, interval=0.001) is False
+
+
+@pytest.mark.django_db
+def test_document_request_indexes_query_plan(monkeypatch):
+    """Test that listing document requests uses composite indexes on a large
+    table"""
+
+    if connection.vendor != "postgresql":
+        pytest.skip("Query plans are checked with PostgreSQL only")
+
+    issuer_paths = [f"marion.issuers.dummy{index}.DummyDocument" for index in range(10)]
+    monkeypatch.setattr(
+        registry,
+        "_registry",
+        registry.IssuerRegistry(
+            {issuer_path: issuers.DummyDocument for issuer_path in issuer_paths}
+        ),
+    )
+
+    document_requests = []
+    for index in range(20000):
+        document_id = uuid.uuid4()
+        document_requests.append(
+            models.DocumentRequest(
+                issuer=issuer_paths[index % len(issuer_paths)],
+                context_query={"fullname": "Richie Cunningham"},
+                context={
+                    "fullname": "Richie Cunningham",
+                    "identifier": str(document_id),
+                },
+                document_id=document_id,
+                status=models.DocumentRequestStatus.DONE,
+            )
+        )
+    models.DocumentRequest.objects.bulk_create(document_requests, batch_size=1000)
+    with connection.cursor() as cursor:
+        cursor.execute(f"ANALYZE {models.DocumentRequest._meta.db_table}")
+
+    now = timezone.now()
+
+    # Cursor pagination with the issuer and created_on filters
+    plan = (
+        models.DocumentRequest.objects.filter(
+            issuer=issuer_paths[0],
+            created_on__gte=now - timedelta(days=1),
+            created_on__lt=now,
+        )
+        .order_by("-created_on", "-id")[:100]
+        .explain()
+    )
+    assert "marion_dr_issuer_created_idx" in plan
+
+    # Cursor pagination without filters
+    plan = (
+        models.DocumentRequest.objects.filter(created_on__lt=now)
+        .order_by("-created_on", "-id")[:100]
+        .explain()
+    )
+    assert "marion_dr_created_idx" in plan
+
+
+@pytest.mark.django_db
+def test_document_request_find_document_name(monkeypatch, tmp_path):
+    """Test the `DocumentRequest.find_document_name()` method"""
+
+    monkeypatch.setattr(defaults, "DOCUMENTS_ROOT", tmp_path)
+    document_request = factories.DocumentRequestFactory(
+        issuer="marion.issuers.DummyDocument",
+        context_query={"fullname": "Richie Cunningham"},
+    )
+    flat_name = f"{document_request.document_id}.pdf"
+    assert document_request.find_document_name() == flat_name
+
+    # Documents generated before sharding documents are still found
+    monkeypatch.setattr(defaults, "DOCUMENTS_SHARD_DEPTH", 2)
+    sharded_name = document_request.get_document_name()
+    assert sharded_name == f"{flat_name[:2]}/{flat_name[2:4]}/{flat_name}"
+    assert document_request.find_document_name() == flat_name
+
+    tmp_path.joinpath(sharded_name).parent.mkdir(parents=True)
+    tmp_path.joinpath(flat_name).rename(tmp_path.joinpath(sharded_name))
+    assert document_request.find_document_name() == sharded_name
+
+    tmp_path.joinpath(sharded_name).unlink()
+    assert document_request.find_document_name() is None
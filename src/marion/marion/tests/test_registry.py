@@ -0,0 +1,90 @@
+"""Tests for the marion.registry module"""
+
+import pytest
+
+from marion import registry
+from marion.exceptions import InvalidDocumentIssuer
+from marion.issuers import DummyDocument
+
+
+# pylint: disable=missing-class-docstring
+class Richie:
+    pass
+
+
+# pylint: disable=missing-class-docstring
+class OtherRichie:
+    pass
+
+
+def test_issuer_registry():
+    """Test the IssuerRegistry class"""
+
+    issuers = registry.IssuerRegistry(
+        {
+            "marion.issuers.DummyDocument": DummyDocument,
+            "marion.issuers.Richie": Richie,
+            "howard.issuers.Richie": OtherRichie,
+        }
+    )
+
+    assert len(issuers) == 3
+    assert list(issuers) == [
+        "marion.issuers.DummyDocument",
+        "marion.issuers.Richie",
+        "howard.issuers.Richie",
+    ]
+
+    # Issuers can be looked up by any dotted suffix of their path
+    for name in ("marion.issuers.DummyDocument", "issuers.DummyDocument"):
+        assert name in issuers
+        assert issuers.get(name) is DummyDocument
+        assert issuers.get_path(name) == "marion.issuers.DummyDocument"
+    assert issuers.get("DummyDocument") is DummyDocument
+    assert issuers.get("marion.issuers.Richie") is Richie
+    assert issuers.get("howard.issuers.Richie") is OtherRichie
+
+    # ... but partial names are not allowed
+    assert "Document" not in issuers
+    with pytest.raises(
+        InvalidDocumentIssuer, match="Document is not an allowed issuer"
+    ):
+        issuers.get("Document")
+
+    # Ambiguous names
+    assert "Richie" not in issuers
+    assert issuers.ambiguous_names == {
+        "Richie": ("marion.issuers.Richie", "howard.issuers.Richie")
+    }
+    with pytest.raises(
+        InvalidDocumentIssuer,
+        match="Issuer class name should be unique, found 2 for issuers.Richie",
+    ):
+        issuers.get("issuers.Richie")
+
+
+def test_issuer_registry_from_choices():
+    """Test the IssuerRegistry from_choices class method"""
+
+    issuers = registry.IssuerRegistry.from_choices(
+        [("marion.issuers.DummyDocument", "Dummy")]
+    )
+    assert issuers.get("DummyDocument") is DummyDocument
+
+    with pytest.raises(ImportError):
+        registry.IssuerRegistry.from_choices([("marion.issuers.Fonzy", "Fonzy")])
+
+
+def test_get_registry(monkeypatch):
+    """Test the get_registry function"""
+
+    # The registry is built when the application is ready
+    active_registry = registry.get_registry()
+    assert registry.get_registry() is active_registry
+    assert list(active_registry) == ["marion.issuers.DummyDocument"]
+    assert registry.get_issuer_class("DummyDocument") is DummyDocument
+
+    # ... or on first use
+    monkeypatch.setattr(registry, "_registry", None)
+    assert registry.get_registry() is not active_registry
+    assert registry.get_registry() is registry.get_registry()
@@ -0,0 +1,251 @@
+"""Tests for the marion.renderers module"""
+
+from io import BytesIO
+from unittest.mock import patch
+
+from django.db import transaction
+
+import pytest
+from pdfminer.high_level import extract_text as pdf_extract_text
+
+from marion import defaults, models, renderers
+from marion.exceptions import (
+    DocumentIssuerContextValidationError,
+    DocumentIssuerRenderingTimeout,
+)
+from marion.issuers import DummyDocument
+from marion.signals import document_created
+from marion.watchdog import MemoryWatchdog
+
+
+def test_local_renderer_render():
+    """Test the LocalRenderer render method"""
+
+    document = DummyDocument(context_query={"fullname": "Richie Cunningham"})
+
+    with patch.object(DummyDocument, "create", return_value=b"%PDF") as mocked_create:
+        assert (
+            renderers.LocalRenderer().render(
+                document, persist=False, pdf_options={"jpeg_quality": 50}
+            )
+            == b"%PDF"
+        )
+    mocked_create.assert_called_once_with(
+        persist=False, pdf_options={"jpeg_quality": 50}
+    )
+
+
+def test_local_renderer_render_many(monkeypatch):
+    """Test the LocalRenderer render_many method"""
+
+    fetch_context = DummyDocument.fetch_context
+
+    def mock_fetch_context(self):
+        """Fail to fetch the context for Fonzie"""
+        if self.context_query.fullname == "Fonzie":
+            raise DocumentIssuerContextValidationError("Unknown student")
+        return fetch_context(self)
+
+    monkeypatch.setattr(DummyDocument, "fetch_context", mock_fetch_context)
+    documents = [
+        DummyDocument(context_query={"fullname": fullname})
+        for fullname in ("Richie Cunningham", "Fonzie", "Marion Ross")
+    ]
+
+    with patch.object(
+        DummyDocument, "create_many", wraps=DummyDocument.create_many
+    ) as mocked_create_many:
+        results = list(renderers.LocalRenderer().render_many(documents, persist=False))
+
+    # Documents of the same issuer are created in batch
+    mocked_create_many.assert_called_once()
+    assert [document for document, _ in results] == documents
+    assert "Richie Cunningham" in pdf_extract_text(BytesIO(results[0][1]))
+    assert isinstance(results[1][1], DocumentIssuerContextValidationError)
+    assert "Marion Ross" in pdf_extract_text(BytesIO(results[2][1]))
+
+
+def test_process_pool_renderer_init(monkeypatch):
+    """Test the ProcessPoolRenderer default options"""
+
+    renderer = renderers.ProcessPoolRenderer()
+    assert renderer.processes is None
+    assert renderer.timeout is None
+    assert renderer.max_tasks_per_worker is None
+
+    monkeypatch.setattr(defaults, "RENDER_POOL_SIZE", 2)
+    monkeypatch.setattr(defaults, "RENDER_POOL_TIMEOUT", 30)
+    monkeypatch.setattr(defaults, "RENDER_POOL_MAX_TASKS_PER_WORKER", 100)
+
+    renderer = renderers.ProcessPoolRenderer()
+    assert renderer.processes == 2
+    assert renderer.timeout == 30
+    assert renderer.max_tasks_per_worker == 100
+
+    renderer = renderers.ProcessPoolRenderer(
+        processes=4, timeout=10, max_tasks_per_worker=1
+    )
+    assert renderer.processes == 4
+    assert renderer.timeout == 10
+    assert renderer.max_tasks_per_worker == 1
+
+
+def test_process_pool_renderer_render():
+    """Test the ProcessPoolRenderer render method"""
+
+    renderer = renderers.ProcessPoolRenderer(processes=1, max_tasks_per_worker=1)
+
+    try:
+        document = DummyDocument(context_query={"fullname": "Richie Cunningham"})
+        pdf = renderer.render(document, persist=False)
+
+        other_document = DummyDocument(context_query={"fullname": "Marion Ross"})
+        other_document_path = renderer.render(other_document)
+    finally:
+        renderer.close()
+
+    # The document context should have been fetched in the calling process
+    assert document.context.fullname == "Richie Cunningham"
+    assert str(document.context.identifier) == document.identifier
+    assert "Richie Cunningham" in pdf_extract_text(BytesIO(pdf))
+
+    # Rendering timings should have been copied from the worker process
+    assert set(document.timings) == {
+        "fetch_context",
+        "validate_context",
+        "templates",
+        "parse",
+        "layout",
+        "write_pdf",
+    }
+
+    assert other_document_path == other_document.get_document_path()
+    with other_document_path.open("rb") as other_document_file:
+        assert "Marion Ross" in pdf_extract_text(other_document_file)
+
+
+@pytest.mark.django_db
+def test_process_pool_renderer_start():
+    """Test the ProcessPoolRenderer start method"""
+
+    renderer = renderers.ProcessPoolRenderer(processes=1)
+    assert renderer._pool is None  # pylint: disable=protected-access
+
+    # Start worker processes while the calling thread uses the database
+    with transaction.atomic():
+        assert models.DocumentRequest.objects.count() == 0
+        try:
+            renderer.start()
+            pool = renderer._pool  # pylint: disable=protected-access
+            assert pool is not None
+            renderer.start()
+            assert renderer._pool is pool  # pylint: disable=protected-access
+
+            document = DummyDocument(context_query={"fullname": "Richie Cunningham"})
+            assert renderer.render(document, persist=False).startswith(b"%PDF")
+        finally:
+            renderer.close()
+
+        # The calling thread database connection is still usable
+        assert models.DocumentRequest.objects.count() == 0
+
+
+def test_process_pool_renderer_render_many(monkeypatch):
+    """Test the ProcessPoolRenderer render_many method"""
+
+    fetch_context = DummyDocument.fetch_context
+
+    def mock_fetch_context(self):
+        """Fail to fetch the context for Fonzie"""
+        if self.context_query.fullname == "Fonzie":
+            raise DocumentIssuerContextValidationError("Unknown student")
+        return fetch_context(self)
+
+    monkeypatch.setattr(DummyDocument, "fetch_context", mock_fetch_context)
+    renderer = renderers.ProcessPoolRenderer(processes=2)
+    documents = [
+        DummyDocument(context_query={"fullname": fullname})
+        for fullname in ("Richie Cunningham", "Fonzie", "Marion Ross")
+    ]
+
+    try:
+        results = list(renderer.render_many(documents, persist=False))
+    finally:
+        renderer.close()
+
+    assert [document for document, _ in results] == documents
+    assert "Richie Cunningham" in pdf_extract_text(BytesIO(results[0][1]))
+    assert isinstance(results[1][1], DocumentIssuerContextValidationError)
+    assert "Marion Ross" in pdf_extract_text(BytesIO(results[2][1]))
+
+
+def test_process_pool_renderer_render_timeout():
+    """Test the ProcessPoolRenderer render method when rendering times out"""
+
+    renderer = renderers.ProcessPoolRenderer(processes=1, timeout=0.001)
+    document = DummyDocument(context_query={"fullname": "Richie Cunningham"})
+
+    try:
+        with pytest.raises(
+            DocumentIssuerRenderingTimeout,
+            match=f"Document {document.identifier} rendering timed out",
+        ):
+            renderer.render(document, persist=False)
+
+        # The pool has been replaced by a fresh one
+        assert renderer._pool is None  # pylint: disable=protected-access
+        renderer.timeout = None
+        assert "Richie Cunningham" in pdf_extract_text(
+            BytesIO(renderer.render(document, persist=False))
+        )
+    finally:
+        renderer.close()
+
+
+def test_process_pool_renderer_memory_watchdog(monkeypatch):
+    """Test that the ProcessPoolRenderer replaces its pool once a worker process
+    is flagged for recycling by the memory watchdog"""
+
+    memory_watchdog = MemoryWatchdog(max_renders=1)
+    monkeypatch.setattr(renderers, "memory_watchdog", memory_watchdog)
+    document_created.connect(memory_watchdog.document_created)
+
+    renderer = renderers.ProcessPoolRenderer(processes=1)
+    try:
+        renderer.start()
+        document = DummyDocument(context_query={"fullname": "Richie Cunningham"})
+        assert renderer.render(document, persist=False).startswith(b"%PDF")
+        # The flagged worker process pool has been replaced
+        assert renderer._pool is None  # pylint: disable=protected-access
+
+        assert renderer.render(document, persist=False).startswith(b"%PDF")
+        assert renderer._pool is None  # pylint: disable=protected-access
+    finally:
+        document_created.disconnect(memory_watchdog.document_created)
+        renderer.close()
+
+    # Renderings in the calling process are not counted
+    assert memory_watchdog.renders == 0
+
+
+def test_get_renderer(monkeypatch):
+    """Test the get_renderer function"""
+
+    renderers.reset_renderer()
+    renderer = renderers.get_renderer()
+    assert isinstance(renderer, renderers.LocalRenderer)
+    assert renderers.get_renderer() is renderer
+
+    monkeypatch.setattr(
+        defaults, "RENDERER_CLASS", "marion.renderers.ProcessPoolRenderer"
+    )
+    assert renderers.get_renderer() is renderer
+    renderers.reset_renderer()
+    renderer = renderers.get_renderer()
+    assert isinstance(renderer, renderers.ProcessPoolRenderer)
+
+    with patch.object(renderer, "close") as mocked_close:
+        renderers.reset_renderer()
+        mocked_close.assert_called_once()
+    assert renderers.get_renderer() is not renderer
+    renderers.reset_renderer()
@@ -28,3 +28,29 @@ def test_document_request_serializer_document_url_field():
         serialized_document_request.data.get("document_url")
         == f"http://testserver/media/{document_request.document_id}.pdf"
     )
+    assert serialized_document_request.data.get("download_url") == (
+        f"http://testserver/api/documents/downloads/{document_request.document_id}/"
+    )
+
+
+@pytest.mark.django_db
+def test_document_request_serializer_document_url_field_pending():
+    """Test the document request serializer document_url field when the
+    document has not been generated yet"""
+
+    document_request = factories.DocumentRequestFactory.build(
+        issuer="marion.issuers.DummyDocument",
+        context_query={"fullname": "Richie Cunningham"},
+    )
+    document_request.enqueue()
+
+    factory = APIRequestFactory()
+    request = factory.get(reverse("documentrequest-list"))
+
+    serialized_document_request = serializers.DocumentRequestSerializer(
+        document_request, context={"request": request}
+    )
+
+    assert serialized_document_request.data.get("document_url") is None
+    assert serialized_document_request.data.get("download_url") is None
+    assert serialized_document_request.data.get("status") == "pending"
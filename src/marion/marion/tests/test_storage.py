@@ -0,0 +1,123 @@
+"""Tests for the marion.storage module"""
+
+import uuid
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, InMemoryStorage
+
+from marion import defaults, storage
+
+
+def test_get_storage(monkeypatch, settings, tmp_path):
+    """Test the get_storage function"""
+
+    # Documents are stored in the DOCUMENTS_ROOT directory by default
+    monkeypatch.setattr(defaults, "DOCUMENTS_ROOT", tmp_path)
+    documents_storage = storage.get_storage()
+    assert isinstance(documents_storage, FileSystemStorage)
+    assert documents_storage.location == str(tmp_path)
+    assert documents_storage.url("richie.pdf") == "/media/richie.pdf"
+
+    # Use a configured storage
+    settings.STORAGES = {
+        **settings.STORAGES,
+        "documents": {"BACKEND": "django.core.files.storage.InMemoryStorage"},
+    }
+    monkeypatch.setattr(defaults, "DOCUMENTS_STORAGE", "documents")
+    documents_storage = storage.get_storage()
+    assert isinstance(documents_storage, InMemoryStorage)
+    assert storage.get_storage() is documents_storage
+
+
+def test_open_for_writing(tmp_path):
+    """Test the open_for_writing function"""
+
+    # Missing directories are created in file system storages
+    file_system_storage = FileSystemStorage(location=tmp_path)
+    with storage.open_for_writing(file_system_storage, "foo/richie.pdf") as target:
+        target.write(b"%PDF-")
+        target.write(b"1.7")
+    assert tmp_path.joinpath("foo/richie.pdf").read_bytes() == b"%PDF-1.7"
+
+    # Existing documents are replaced
+    with storage.open_for_writing(file_system_storage, "foo/richie.pdf") as target:
+        target.write(b"%PDF")
+    assert file_system_storage.listdir("foo") == ([], ["richie.pdf"])
+    assert tmp_path.joinpath("foo/richie.pdf").read_bytes() == b"%PDF"
+
+    # Other storages (even if they implement the path method)
+    memory_location = tmp_path / "memory"
+    memory_storage = InMemoryStorage(location=memory_location)
+    with storage.open_for_writing(memory_storage, "foo/richie.pdf") as target:
+        target.write(b"%PDF-1.7")
+    with memory_storage.open("foo/richie.pdf", "rb") as document_file:
+        assert document_file.read() == b"%PDF-1.7"
+    assert not memory_location.exists()
+
+
+def test_move_document_file_system_storage(tmp_path):
+    """Test the move_document function with a file system storage"""
+
+    # Documents are renamed
+    file_system_storage = FileSystemStorage(location=tmp_path)
+    file_system_storage.save("richie.pdf", ContentFile(b"%PDF-1.7"))
+    assert storage.move_document(file_system_storage, "richie.pdf", "ri/richie.pdf")
+    assert not tmp_path.joinpath("richie.pdf").exists()
+    assert tmp_path.joinpath("ri/richie.pdf").read_bytes() == b"%PDF-1.7"
+    assert not storage.move_document(file_system_storage, "richie.pdf", "ri/r.pdf")
+
+
+def test_move_document_in_memory_storage(tmp_path):
+    """Test the move_document function with an in-memory storage"""
+
+    # Documents are copied then deleted, even though the storage implements
+    # the path method
+    memory_storage = InMemoryStorage(location=tmp_path)
+    memory_storage.save("richie.pdf", ContentFile(b"%PDF-1.7"))
+    assert storage.move_document(memory_storage, "richie.pdf", "ri/richie.pdf")
+    assert not memory_storage.exists("richie.pdf")
+    with memory_storage.open("ri/richie.pdf", "rb") as document_file:
+        assert document_file.read() == b"%PDF-1.7"
+    assert not storage.move_document(memory_storage, "richie.pdf", "ri/richie.pdf")
+
+    # Nothing has been written to the file system
+    assert not list(tmp_path.iterdir())
+
+
+def test_walk_documents():
+    """Test the walk_documents function"""
+
+    memory_storage = InMemoryStorage()
+    identifiers = sorted(str(uuid.uuid4()) for _ in range(20))
+    names = {}
+    for index, identifier in enumerate(identifiers):
+        # Mix flat and sharded layouts
+        names[identifier] = (
+            f"{identifier}.pdf"
+            if index % 2
+            else f"{identifier[:2]}/{identifier[2:4]}/{identifier}.pdf"
+        )
+        memory_storage.save(names[identifier], ContentFile(b"%PDF-1.7"))
+
+    # Other files are ignored
+    memory_storage.save("richie.pdf", ContentFile(b"%PDF-1.7"))
+    memory_storage.save("foo/bar.pdf", ContentFile(b"%PDF-1.7"))
+    # Documents outside of the configured shards layout are ignored
+    identifier = identifiers[0]
+    for name in (
+        f"cafe/{identifier}.pdf",
+        f"{identifier[:2]}/{identifier}.pdf",
+        f"{identifier[:2]}/{identifier[2:4]}/{identifier[4:6]}/{identifier}.pdf",
+        f"{identifier[:2]}/{'00' if identifier[2:4] != '00' else 'ff'}/"
+        f"{identifier}.pdf",
+    ):
+        memory_storage.save(name, ContentFile(b"%PDF-1.7"))
+
+    assert list(storage.walk_documents(memory_storage, shard_depth=2)) == [
+        (identifier, names[identifier]) for identifier in identifiers
+    ]
+    # Only flat documents are walked without sharding
+    assert list(storage.walk_documents(memory_storage, shard_depth=0)) == [
+        (identifier, names[identifier]) for identifier in identifiers[1::2]
+    ]
+    assert not list(storage.walk_documents(InMemoryStorage(location="/missing")))
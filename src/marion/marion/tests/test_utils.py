@@ -2,6 +2,7 @@
 
 import re
 from pathlib import Path
+from unittest.mock import patch
 
 from django.conf import settings
 from django.contrib.staticfiles.management.commands import collectstatic
@@ -9,7 +10,9 @@ from django.templatetags.static import StaticNode
 from django.test import override_settings
 
 import marion
-from marion.utils import static_file_fetcher
+from marion import utils
+from marion.cache import LRUCache
+from marion.utils import preload_static_files, static_file_fetcher
 
 
 # pylint: disable=invalid-name
@@ -90,3 +93,85 @@ def test_static_file_fetcher_with_hashed_statics(fs):
         b"This is content.",
     ]
     file_.close()
+
+
+# pylint: disable=invalid-name
+def test_static_file_fetcher_cache(fs, monkeypatch):
+    """Test weasyprint custom static file fetcher cache."""
+
+    monkeypatch.setattr(utils, "static_files_cache", LRUCache(maxsize=20, weigh=len))
+
+    fs.create_file(f"{settings.STATIC_ROOT}/marion/cached.txt", contents="Cached!")
+    url = f"file://{settings.STATIC_URL}marion/cached.txt"
+
+    data = static_file_fetcher(url)
+    assert data.get("mime_type") == "text/plain"
+    assert data.get("file_obj").read() == b"Cached!"
+    assert utils.static_files_cache.stats == {
+        "hits": 0,
+        "misses": 1,
+        "size": 7,
+        "maxsize": 20,
+    }
+
+    # Cached static files should be served from memory
+    with patch.object(utils.static_storage, "open") as mocked_open:
+        data = static_file_fetcher(url)
+        mocked_open.assert_not_called()
+    assert data.get("filename") == "cached.txt"
+    assert data.get("mime_type") == "text/plain"
+    assert data.get("file_obj").read() == b"Cached!"
+    assert utils.static_files_cache.stats["hits"] == 1
+
+    # Static files larger than the cache are not cached
+    fs.create_file(f"{settings.STATIC_ROOT}/marion/large.txt", contents="L" * 21)
+    data = static_file_fetcher(f"file://{settings.STATIC_URL}marion/large.txt")
+    assert data.get("file_obj").read() == b"L" * 21
+    assert "marion/large.txt" not in utils.static_files_cache
+
+    # Least recently used static files are evicted
+    fs.create_file(f"{settings.STATIC_ROOT}/marion/other.txt", contents="O" * 15)
+    static_file_fetcher(f"file://{settings.STATIC_URL}marion/other.txt")
+    assert "marion/other.txt" in utils.static_files_cache
+    assert "marion/cached.txt" not in utils.static_files_cache
+    assert utils.static_files_cache.size == 15
+
+
+# pylint: disable=invalid-name
+@override_settings(DEBUG=True)
+def test_static_file_fetcher_cache_debug(fs, monkeypatch):
+    """Test that the static file fetcher cache is bypassed in debug mode."""
+
+    monkeypatch.setattr(utils, "static_files_cache", LRUCache(maxsize=20, weigh=len))
+
+    static_file = fs.create_file(
+        f"{settings.STATIC_ROOT}/marion/cached.txt", contents="Cached!"
+    )
+    url = f"file://{settings.STATIC_URL}marion/cached.txt"
+    assert static_file_fetcher(url).get("file_obj").read() == b"Cached!"
+    assert len(utils.static_files_cache) == 0
+
+    # Modified static files are fetched again
+    static_file.set_contents("Modified!")
+    assert static_file_fetcher(url).get("file_obj").read() == b"Modified!"
+
+
+# pylint: disable=invalid-name
+def test_preload_static_files(fs, monkeypatch):
+    """Test the preload_static_files utility."""
+
+    monkeypatch.setattr(utils, "static_files_cache", LRUCache(maxsize=30, weigh=len))
+
+    fs.create_file(f"{settings.STATIC_ROOT}/marion/a.txt", contents="A" * 10)
+    fs.create_file(f"{settings.STATIC_ROOT}/marion/sub/b.txt", contents="B" * 20)
+    fs.create_file(f"{settings.STATIC_ROOT}/marion/sub/c.txt", contents="C" * 25)
+    fs.create_file(f"{settings.STATIC_ROOT}/howard/d.txt", contents="D")
+
+    preload_static_files(["marion", "unknown"])
+
+    assert utils.static_files_cache.get("marion/a.txt") == b"A" * 10
+    assert utils.static_files_cache.get("marion/sub/b.txt") == b"B" * 20
+    # Files that do not fit in the cache are ignored
+    assert "marion/sub/c.txt" not in utils.static_files_cache
+    # Only requested directories are preloaded
+    assert "howard/d.txt" not in utils.static_files_cache
@@ -2,17 +2,21 @@
 
 import json
 import tempfile
+import uuid
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
 
+from django.core.files.storage import storages
 from django.urls import reverse
 
 import pytest
 from pytest_django import asserts as django_assertions
 from rest_framework import exceptions as drf_exceptions
 from rest_framework import status
+from rest_framework.permissions import IsAuthenticated
 from rest_framework.test import APIClient
 
-from marion import defaults, models
+from marion import defaults, factories, models, views
 from marion.issuers import DummyDocument
 
 client = APIClient()
@@ -24,6 +28,27 @@ def count_documents(root):
     return len(list(root.glob("*.pdf")))
 
 
+def create_document_requests(count, issuer="marion.issuers.DummyDocument"):
+    """Create document requests (without generating their document)"""
+
+    document_requests = []
+    for _ in range(count):
+        document_id = uuid.uuid4()
+        document_requests.append(
+            models.DocumentRequest(
+                issuer=issuer,
+                context_query={"fullname": "Richie Cunningham"},
+                context={
+                    "fullname": "Richie Cunningham",
+                    "identifier": str(document_id),
+                },
+                document_id=document_id,
+                status=models.DocumentRequestStatus.DONE,
+            )
+        )
+    return models.DocumentRequest.objects.bulk_create(document_requests)
+
+
 @pytest.mark.django_db
 def test_document_request_viewset_post(monkeypatch):
     """Test the DocumentRequestViewSet create view"""
@@ -220,6 +245,391 @@ def test_document_request_viewset_post_context_pydantic_model_validation(
     assert count_documents(defaults.DOCUMENTS_ROOT) == 0
 
 
+@pytest.mark.django_db
+def test_document_request_viewset_post_async_mode(monkeypatch):
+    """Test the DocumentRequestViewSet create view in the asynchronous request
+    mode"""
+
+    monkeypatch.setattr(defaults, "DOCUMENTS_ROOT", Path(tempfile.mkdtemp()))
+    monkeypatch.setattr(defaults, "DOCUMENT_REQUEST_MODE", "async")
+
+    url = reverse("documentrequest-list")
+
+    # The context query is validated before storing the document request
+    data = {
+        "issuer": "marion.issuers.DummyDocument",
+        "context_query": json.dumps({"fullname": ""}),
+    }
+    response = client.post(url, data, format="json")
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert "String should have at least 2 characters" in response.data.get("error")
+    assert models.DocumentRequest.objects.count() == 0
+
+    # The document is not generated
+    data = {
+        "issuer": "marion.issuers.DummyDocument",
+        "context_query": json.dumps({"fullname": "Richie Cunningham"}),
+    }
+    response = client.post(url, data, format="json")
+    assert response.status_code == status.HTTP_202_ACCEPTED
+    assert response.data.get("status") == "pending"
+    assert response.data.get("document_id") is None
+    assert response.data.get("document_url") is None
+    assert models.DocumentRequest.objects.count() == 1
+    assert count_documents(defaults.DOCUMENTS_ROOT) == 0
+
+    document_request = models.DocumentRequest.objects.get()
+    assert document_request.status == models.DocumentRequestStatus.PENDING
+    assert document_request.context_query == {"fullname": "Richie Cunningham"}
+
+
+@pytest.mark.django_db
+def test_document_request_viewset_post_lazy_mode(monkeypatch):
+    """Test the DocumentRequestViewSet create view in the lazy request mode"""
+
+    monkeypatch.setattr(defaults, "DOCUMENTS_ROOT", Path(tempfile.mkdtemp()))
+    monkeypatch.setattr(defaults, "DOCUMENT_REQUEST_MODE", "lazy")
+
+    data = {
+        "issuer": "marion.issuers.DummyDocument",
+        "context_query": json.dumps({"fullname": "Richie Cunningham"}),
+    }
+    response = client.post(reverse("documentrequest-list"), data, format="json")
+    assert response.status_code == status.HTTP_201_CREATED
+    assert response.data.get("status") == "lazy"
+    assert response.data.get("document_id") is not None
+    assert response.data.get("document_url") is None
+    assert response.data.get("download_url") is not None
+    assert count_documents(defaults.DOCUMENTS_ROOT) == 0
+
+    # The document is rendered on first download
+    response = client.get(response.data.get("download_url"))
+    assert response.status_code == status.HTTP_200_OK
+    assert b"".join(response.streaming_content).startswith(b"%PDF")
+    assert count_documents(defaults.DOCUMENTS_ROOT) == 1
+    document_request = models.DocumentRequest.objects.get()
+    assert document_request.status == models.DocumentRequestStatus.DONE
+
+    # Deleted documents are rendered again
+    document_request.get_document_path().unlink()
+    url = reverse("documents-download", args=[document_request.document_id])
+    assert client.get(url).status_code == status.HTTP_200_OK
+    assert count_documents(defaults.DOCUMENTS_ROOT) == 1
+
+
+@pytest.mark.django_db
+def test_document_request_viewset_bulk(monkeypatch):
+    """Test the DocumentRequestViewSet bulk view"""
+
+    monkeypatch.setattr(defaults, "DOCUMENTS_ROOT", Path(tempfile.mkdtemp()))
+
+    url = reverse("documentrequest-bulk")
+
+    # A list of document requests is expected
+    response = client.post(
+        url, {"issuer": "marion.issuers.DummyDocument"}, format="json"
+    )
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert response.data.get("error") == "Expected a list of document requests"
+
+    monkeypatch.setattr(defaults, "BULK_MAX_ITEMS", 1)
+    response = client.post(url, [{}, {}], format="json")
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert response.data.get("error") == "Too many document requests (maximum: 1)"
+    monkeypatch.setattr(defaults, "BULK_MAX_ITEMS", 10)
+
+    # Successful requests
+    data = [
+        {
+            "issuer": "marion.issuers.DummyDocument",
+            "context_query": json.dumps({"fullname": fullname}),
+        }
+        for fullname in ("Richie Cunningham", "Marion Ross")
+    ]
+    response = client.post(url, data, format="json")
+    assert response.status_code == status.HTTP_201_CREATED
+    results = response.data.get("results")
+    assert [result.get("status") for result in results] == [201, 201]
+    assert results[0]["data"]["context"]["fullname"] == "Richie Cunningham"
+    assert results[1]["data"]["context"]["fullname"] == "Marion Ross"
+    assert models.DocumentRequest.objects.count() == 2
+    assert count_documents(defaults.DOCUMENTS_ROOT) == 2
+
+    # Partial failures
+    data = [
+        {"issuer": "marion.issuers.DummyDocument"},
+        {
+            "issuer": "marion.issuers.DummyDocument",
+            "context_query": json.dumps({"fullname": ""}),
+        },
+        {
+            "issuer": "marion.issuers.DummyDocument",
+            "context_query": json.dumps({"fullname": "Potsie Weber"}),
+        },
+    ]
+    response = client.post(url, data, format="json")
+    assert response.status_code == status.HTTP_207_MULTI_STATUS
+    results = response.data.get("results")
+    assert [result.get("status") for result in results] == [400, 400, 201]
+    assert results[0]["errors"]["context_query"][0].code == "required"
+    assert "String should have at least 2 characters" in results[1]["error"]
+    assert results[2]["data"]["context"]["fullname"] == "Potsie Weber"
+    assert models.DocumentRequest.objects.count() == 3
+    assert count_documents(defaults.DOCUMENTS_ROOT) == 3
+
+    # Rendering failures
+    def mock_fetch_context(*args, **kwargs):
+        """A mock that fails to fetch the context"""
+        raise ConnectionError("Service unavailable")
+
+    monkeypatch.setattr(DummyDocument, "fetch_context", mock_fetch_context)
+    response = client.post(url, data[2:], format="json")
+    assert response.status_code == status.HTTP_207_MULTI_STATUS
+    assert response.data.get("results") == [
+        {"status": 500, "error": "Document rendering failed"}
+    ]
+    assert models.DocumentRequest.objects.count() == 3
+
+
+@pytest.mark.django_db
+def test_document_request_viewset_bulk_async_mode(monkeypatch):
+    """Test the DocumentRequestViewSet bulk view in the asynchronous request
+    mode"""
+
+    monkeypatch.setattr(defaults, "DOCUMENTS_ROOT", Path(tempfile.mkdtemp()))
+    monkeypatch.setattr(defaults, "DOCUMENT_REQUEST_MODE", "async")
+
+    data = [
+        {
+            "issuer": "marion.issuers.DummyDocument",
+            "context_query": json.dumps({"fullname": fullname}),
+        }
+        for fullname in ("Richie Cunningham", "Marion Ross")
+    ]
+    response = client.post(reverse("documentrequest-bulk"), data, format="json")
+    assert response.status_code == status.HTTP_202_ACCEPTED
+    results = response.data.get("results")
+    assert [result["data"]["status"] for result in results] == ["pending"] * 2
+    assert models.DocumentRequest.objects.filter(status="pending").count() == 2
+    assert count_documents(defaults.DOCUMENTS_ROOT) == 0
+
+
+@pytest.mark.django_db
+def test_document_request_viewset_bulk_lazy_mode(monkeypatch):
+    """Test the DocumentRequestViewSet bulk view in the lazy request mode"""
+
+    monkeypatch.setattr(defaults, "DOCUMENTS_ROOT", Path(tempfile.mkdtemp()))
+    monkeypatch.setattr(defaults, "DOCUMENT_REQUEST_MODE", "lazy")
+
+    data = [
+        {
+            "issuer": "marion.issuers.DummyDocument",
+            "context_query": json.dumps({"fullname": fullname}),
+        }
+        for fullname in ("Richie Cunningham", "Marion Ross")
+    ]
+    response = client.post(reverse("documentrequest-bulk"), data, format="json")
+    assert response.status_code == status.HTTP_201_CREATED
+    results = response.data.get("results")
+    assert [result["data"]["status"] for result in results] == ["lazy"] * 2
+    assert models.DocumentRequest.objects.filter(status="lazy").count() == 2
+    assert count_documents(defaults.DOCUMENTS_ROOT) == 0
+
+
+@pytest.mark.django_db
+def test_document_request_viewset_post_deduplicate(monkeypatch):
+    """Test the DocumentRequestViewSet create and bulk views with documents
+    deduplication"""
+
+    monkeypatch.setattr(defaults, "DOCUMENTS_ROOT", Path(tempfile.mkdtemp()))
+
+    url = reverse("documentrequest-list")
+    data = {
+        "issuer": "marion.issuers.DummyDocument",
+        "context_query": json.dumps({"fullname": "Richie Cunningham"}),
+    }
+
+    # Deduplication is not active by default
+    assert client.post(url, data, format="json").status_code == 201
+    assert client.post(url, data, format="json").status_code == 201
+    assert count_documents(defaults.DOCUMENTS_ROOT) == 2
+
+    monkeypatch.setattr(defaults, "DEDUPLICATE_DOCUMENTS", True)
+    response = client.post(url, data, format="json")
+    assert response.status_code == status.HTTP_200_OK
+    assert response.data["id"] == str(models.DocumentRequest.objects.first().id)
+    assert models.DocumentRequest.objects.count() == 2
+    assert count_documents(defaults.DOCUMENTS_ROOT) == 2
+
+    response = client.post(
+        reverse("documentrequest-bulk"),
+        [data, {**data, "context_query": json.dumps({"fullname": "Marion Ross"})}],
+        format="json",
+    )
+    assert response.status_code == status.HTTP_201_CREATED
+    assert [result["status"] for result in response.data["results"]] == [200, 201]
+    assert models.DocumentRequest.objects.count() == 3
+    assert count_documents(defaults.DOCUMENTS_ROOT) == 3
+
+
+@pytest.mark.django_db
+def test_document_request_viewset_bulk_deduplicate_payload(monkeypatch):
+    """Test the DocumentRequestViewSet bulk view with identical document
+    requests in the payload and documents deduplication"""
+
+    monkeypatch.setattr(defaults, "DOCUMENTS_ROOT", Path(tempfile.mkdtemp()))
+    monkeypatch.setattr(defaults, "DEDUPLICATE_DOCUMENTS", True)
+
+    richie, marion = [
+        {
+            "issuer": "marion.issuers.DummyDocument",
+            "context_query": json.dumps({"fullname": fullname}),
+        }
+        for fullname in ("Richie Cunningham", "Marion Ross")
+    ]
+    response = client.post(
+        reverse("documentrequest-bulk"), [richie, marion, richie], format="json"
+    )
+    assert response.status_code == status.HTTP_201_CREATED
+    results = response.data["results"]
+    assert [result["status"] for result in results] == [201, 201, 200]
+    assert results[2]["data"]["id"] == results[0]["data"]["id"]
+    assert models.DocumentRequest.objects.count() == 2
+    assert count_documents(defaults.DOCUMENTS_ROOT) == 2
+
+    # Duplicates share the first document request failure
+    def mock_fetch_context(*args, **kwargs):
+        """A mock that fails to fetch the context"""
+        raise ConnectionError("Service unavailable")
+
+    monkeypatch.setattr(DummyDocument, "fetch_context", mock_fetch_context)
+    potsie = {
+        "issuer": "marion.issuers.DummyDocument",
+        "context_query": json.dumps({"fullname": "Potsie Weber"}),
+    }
+    response = client.post(
+        reverse("documentrequest-bulk"), [potsie, potsie], format="json"
+    )
+    assert response.status_code == status.HTTP_207_MULTI_STATUS
+    assert (
+        response.data["results"]
+        == [{"status": 500, "error": "Document rendering failed"}] * 2
+    )
+    assert models.DocumentRequest.objects.count() == 2
+
+
+@pytest.mark.django_db
+def test_document_request_viewset_post_idempotency_key(monkeypatch):
+    """Test the DocumentRequestViewSet create view with an Idempotency-Key
+    header"""
+
+    monkeypatch.setattr(defaults, "DOCUMENTS_ROOT", Path(tempfile.mkdtemp()))
+
+    url = reverse("documentrequest-list")
+    data = {
+        "issuer": "marion.issuers.DummyDocument",
+        "context_query": json.dumps({"fullname": "Richie Cunningham"}),
+    }
+
+    response = client.post(url, data, format="json", HTTP_IDEMPOTENCY_KEY="foo")
+    assert response.status_code == status.HTTP_201_CREATED
+    assert "Idempotent-Replayed" not in response
+
+    # Retries return the stored response
+    replayed = client.post(url, data, format="json", HTTP_IDEMPOTENCY_KEY="foo")
+    assert replayed.status_code == status.HTTP_201_CREATED
+    assert replayed["Idempotent-Replayed"] == "true"
+    assert replayed.data == response.data
+    assert models.DocumentRequest.objects.count() == 1
+    assert count_documents(defaults.DOCUMENTS_ROOT) == 1
+
+    # The key cannot be used for another request
+    response = client.post(
+        url,
+        {**data, "context_query": json.dumps({"fullname": "Marion Ross"})},
+        format="json",
+        HTTP_IDEMPOTENCY_KEY="foo",
+    )
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+    assert models.DocumentRequest.objects.count() == 1
+
+    # Other keys
+    response = client.post(url, data, format="json", HTTP_IDEMPOTENCY_KEY="bar")
+    assert response.status_code == status.HTTP_201_CREATED
+    assert models.DocumentRequest.objects.count() == 2
+
+    response = client.post(url, data, format="json", HTTP_IDEMPOTENCY_KEY="f" * 256)
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert response.data.get("error") == "Invalid Idempotency-Key header"
+
+
+@pytest.mark.django_db
+def test_document_request_viewset_post_idempotency_key_in_progress(monkeypatch):
+    """Test the DocumentRequestViewSet create view with an Idempotency-Key
+    header claimed by a request in progress"""
+
+    monkeypatch.setattr(defaults, "DOCUMENTS_ROOT", Path(tempfile.mkdtemp()))
+    monkeypatch.setattr(defaults, "IDEMPOTENCY_KEY_WAIT_TIMEOUT", 0)
+
+    url = reverse("documentrequest-list")
+    data = {
+        "issuer": "marion.issuers.DummyDocument",
+        "context_query": json.dumps({"fullname": "Richie Cunningham"}),
+    }
+
+    # Simulate a request in progress with the same payload
+    client.post(url, data, format="json", HTTP_IDEMPOTENCY_KEY="foo")
+    models.IdempotencyKey.objects.filter(key="foo").update(status_code=None)
+
+    response = client.post(url, data, format="json", HTTP_IDEMPOTENCY_KEY="foo")
+    assert response.status_code == status.HTTP_409_CONFLICT
+    assert response["Retry-After"] == "1"
+    assert models.DocumentRequest.objects.count() == 1
+
+
+@pytest.mark.django_db
+def test_document_request_viewset_post_idempotency_key_errors(monkeypatch):
+    """Test that the Idempotency-Key is released when the request fails"""
+
+    monkeypatch.setattr(defaults, "DOCUMENTS_ROOT", Path(tempfile.mkdtemp()))
+
+    url = reverse("documentrequest-list")
+    response = client.post(
+        url,
+        {"issuer": "marion.issuers.DummyDocument"},
+        format="json",
+        HTTP_IDEMPOTENCY_KEY="foo",
+    )
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert models.IdempotencyKey.objects.count() == 0
+
+    # Errors returned by the view are stored
+    data = {
+        "issuer": "marion.issuers.DummyDocument",
+        "context_query": json.dumps({"fullname": ""}),
+    }
+    response = client.post(url, data, format="json", HTTP_IDEMPOTENCY_KEY="foo")
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert models.IdempotencyKey.objects.get(key="foo").status_code == 400
+
+
+def test_document_metrics_view(monkeypatch):
+    """Test the document_metrics view"""
+
+    url = reverse("documents-metrics")
+
+    # Metrics are disabled by default
+    response = client.get(url)
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    prometheus_client = pytest.importorskip("prometheus_client")
+    monkeypatch.setattr(defaults, "METRICS_ENABLED", True)
+    response = client.get(url)
+    assert response.status_code == status.HTTP_200_OK
+    assert response["Content-Type"] == prometheus_client.CONTENT_TYPE_LATEST
+    assert b"marion_document_renders_in_progress" in response.content
+
+
 def test_document_template_debug_view_is_only_active_in_debug_mode(settings):
     """Test if the document_template_debug view is active when not in debug mode"""
 
@@ -251,3 +661,326 @@ def test_document_template_debug_view(settings):
     assert response.status_code == 200
     # pylint: disable=no-member
     django_assertions.assertContains(response, "<h1>Dummy document</h1>")
+
+
+@pytest.fixture(name="document_request")
+def fixture_document_request(monkeypatch):
+    """A document request with a generated document"""
+
+    monkeypatch.setattr(defaults, "DOCUMENTS_ROOT", Path(tempfile.mkdtemp()))
+    return factories.DocumentRequestFactory(
+        issuer="marion.issuers.DummyDocument",
+        context_query={"fullname": "Richie Cunningham"},
+    )
+
+
+@pytest.mark.django_db
+def test_document_download_view(document_request):
+    """Test the document_download view"""
+
+    url = reverse("documents-download", args=[document_request.document_id])
+    content = document_request.get_document_path().read_bytes()
+
+    response = client.get(url)
+    assert response.status_code == status.HTTP_200_OK
+    assert response["Content-Type"] == "application/pdf"
+    assert response["Content-Length"] == str(len(content))
+    assert response["Accept-Ranges"] == "bytes"
+    assert (
+        response["Content-Disposition"]
+        == f'inline; filename="{document_request.document_id}.pdf"'
+    )
+    assert b"".join(response.streaming_content) == content
+
+    # The Accept header is ignored
+    response = client.get(url, HTTP_ACCEPT="application/pdf")
+    assert response.status_code == status.HTTP_200_OK
+    assert response["Content-Type"] == "application/pdf"
+    assert b"".join(response.streaming_content) == content
+
+    # Only safe methods are allowed
+    assert client.post(url).status_code == status.HTTP_405_METHOD_NOT_ALLOWED
+
+    # Unknown documents
+    response = client.get(
+        reverse("documents-download", args=["0a1c3ccf-c67d-4071-ab1f-3b27628db9b1"]),
+        HTTP_ACCEPT="application/pdf",
+    )
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+    assert response["Content-Type"] == "application/json"
+
+    # Missing document files
+    document_request.get_document_path().unlink()
+    assert client.get(url).status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.django_db
+def test_document_download_view_permissions(monkeypatch):
+    """Test that the API permission classes apply to the document_download view"""
+
+    monkeypatch.setattr(defaults, "DOCUMENT_REQUEST_MODE", "lazy")
+    document_request = models.DocumentRequest(
+        issuer="marion.issuers.DummyDocument",
+        context_query={"fullname": "Richie Cunningham"},
+    )
+    document_request.defer()
+    url = reverse("documents-download", args=[document_request.document_id])
+
+    monkeypatch.setattr(
+        views.document_download.cls, "permission_classes", [IsAuthenticated]
+    )
+    response = client.get(url)
+    assert response.status_code == status.HTTP_403_FORBIDDEN
+
+    # The lazy document has not been rendered
+    assert not document_request.get_document_path().exists()
+    document_request.refresh_from_db()
+    assert document_request.status == models.DocumentRequestStatus.LAZY
+
+
+@pytest.mark.django_db
+def test_document_download_view_etag(document_request):
+    """Test the document_download view with conditional requests"""
+
+    url = reverse("documents-download", args=[document_request.document_id])
+
+    etag = client.get(url)["ETag"]
+    assert etag.startswith(f'"{document_request.document_id}-')
+
+    response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+    assert response["ETag"] == etag
+    assert response.content == b""
+
+    response = client.get(url, HTTP_IF_NONE_MATCH='"foo", *')
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+    response = client.get(url, HTTP_IF_NONE_MATCH='"foo"')
+    assert response.status_code == status.HTTP_200_OK
+
+    # Entity tags are compared using the weak comparison function
+    response = client.get(url, HTTP_IF_NONE_MATCH=f'"foo", W/{etag}')
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+
+@pytest.mark.django_db
+def test_document_download_view_range(document_request):
+    """Test the document_download view with range requests"""
+
+    url = reverse("documents-download", args=[document_request.document_id])
+    content = document_request.get_document_path().read_bytes()
+    size = len(content)
+
+    response = client.get(url, HTTP_RANGE="bytes=0-99")
+    assert response.status_code == status.HTTP_206_PARTIAL_CONTENT
+    assert response["Content-Length"] == "100"
+    assert response["Content-Range"] == f"bytes 0-99/{size}"
+    assert b"".join(response.streaming_content) == content[:100]
+
+    response = client.get(url, HTTP_RANGE="bytes=100-")
+    assert response.status_code == status.HTTP_206_PARTIAL_CONTENT
+    assert response["Content-Range"] == f"bytes 100-{size - 1}/{size}"
+    assert b"".join(response.streaming_content) == content[100:]
+
+    response = client.get(url, HTTP_RANGE="bytes=-10")
+    assert response.status_code == status.HTTP_206_PARTIAL_CONTENT
+    assert b"".join(response.streaming_content) == content[-10:]
+
+    response = client.get(url, HTTP_RANGE=f"bytes=10-{size + 100}")
+    assert response.status_code == status.HTTP_206_PARTIAL_CONTENT
+    assert b"".join(response.streaming_content) == content[10:]
+
+    # Unsatisfiable ranges
+    response = client.get(url, HTTP_RANGE=f"bytes={size}-")
+    assert response.status_code == status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE
+    assert response["Content-Range"] == f"bytes */{size}"
+
+    # Unsupported ranges are ignored
+    for range_header in ("bytes=0-9,20-29", "bytes=9-0", "items=0-9", "bytes=-"):
+        response = client.get(url, HTTP_RANGE=range_header)
+        assert response.status_code == status.HTTP_200_OK
+        assert b"".join(response.streaming_content) == content
+
+    # The whole document is sent if it has been modified
+    etag = client.get(url)["ETag"]
+    response = client.get(url, HTTP_RANGE="bytes=0-99", HTTP_IF_RANGE=etag)
+    assert response.status_code == status.HTTP_206_PARTIAL_CONTENT
+    response = client.get(url, HTTP_RANGE="bytes=0-99", HTTP_IF_RANGE='"foo"')
+    assert response.status_code == status.HTTP_200_OK
+
+
+@pytest.mark.django_db
+def test_document_download_view_sendfile(monkeypatch, document_request):
+    """Test the document_download view when delegating to the front proxy"""
+
+    url = reverse("documents-download", args=[document_request.document_id])
+    document_path = document_request.get_document_path()
+
+    monkeypatch.setattr(defaults, "DOWNLOAD_SENDFILE_HEADER", "X-Sendfile")
+    response = client.get(url)
+    assert response.status_code == status.HTTP_200_OK
+    assert response["X-Sendfile"] == str(document_path)
+    assert response["Content-Type"] == "application/pdf"
+    assert "ETag" in response
+    assert response.content == b""
+
+    monkeypatch.setattr(defaults, "DOWNLOAD_SENDFILE_HEADER", "X-Accel-Redirect")
+    monkeypatch.setattr(defaults, "DOWNLOAD_SENDFILE_URL_PREFIX", "/protected/")
+    response = client.get(url)
+    assert response["X-Accel-Redirect"] == f"/protected/{document_path.name}"
+
+
+@pytest.mark.django_db
+def test_document_request_viewset_list(monkeypatch):
+    """Test the DocumentRequestViewSet list view cursor pagination"""
+
+    monkeypatch.setattr(defaults, "DOCUMENT_REQUESTS_PAGE_SIZE", 2)
+    document_requests = create_document_requests(5)
+    expected = [
+        str(document_request.id)
+        for document_request in sorted(
+            document_requests,
+            key=lambda document_request: (
+                document_request.created_on,
+                document_request.id,
+            ),
+            reverse=True,
+        )
+    ]
+
+    url = reverse("documentrequest-list")
+    listed = []
+    pages = 0
+    while url is not None:
+        response = client.get(url)
+        assert response.status_code == status.HTTP_200_OK
+        assert len(response.data["results"]) <= 2
+        listed += [result["id"] for result in response.data["results"]]
+        url = response.data["next"]
+        pages += 1
+    assert pages == 3
+    assert listed == expected
+
+    # The page size can be set up to the DOCUMENT_REQUESTS_MAX_PAGE_SIZE setting
+    monkeypatch.setattr(defaults, "DOCUMENT_REQUESTS_MAX_PAGE_SIZE", 4)
+    url = reverse("documentrequest-list")
+    response = client.get(url, {"page_size": 3})
+    assert [result["id"] for result in response.data["results"]] == expected[:3]
+    response = client.get(url, {"page_size": 1000})
+    assert len(response.data["results"]) == 4
+    response = client.get(url, {"page_size": "foo"})
+    assert len(response.data["results"]) == 2
+
+
+@pytest.mark.django_db
+def test_document_request_viewset_list_filters():
+    """Test the DocumentRequestViewSet list view filters"""
+
+    document_requests = create_document_requests(3)
+    now = datetime.now(timezone.utc)
+    for days, document_request in enumerate(document_requests):
+        models.DocumentRequest.objects.filter(pk=document_request.pk).update(
+            created_on=now - timedelta(days=days)
+        )
+
+    def list_ids(**params):
+        response = client.get(reverse("documentrequest-list"), params)
+        assert response.status_code == status.HTTP_200_OK
+        return {result["id"] for result in response.data["results"]}
+
+    all_ids = {str(document_request.id) for document_request in document_requests}
+    assert list_ids(issuer="marion.issuers.DummyDocument") == all_ids
+    assert list_ids(issuer="DummyDocument") == all_ids
+    assert list_ids(issuer="marion.issuers.DumberDocument") == set()
+
+    yesterday = (now - timedelta(days=1)).isoformat()
+    assert list_ids(created_after=yesterday) == {
+        str(document_requests[0].id),
+        str(document_requests[1].id),
+    }
+    assert list_ids(created_before=yesterday) == {str(document_requests[2].id)}
+    assert list_ids(
+        created_after=(now - timedelta(days=2)).isoformat(),
+        created_before=(now - timedelta(hours=1)).isoformat(),
+    ) == {str(document_requests[1].id), str(document_requests[2].id)}
+
+    # Naive dates and times are considered in the current time zone
+    assert len(list_ids(created_after="2000-01-01T00:00:00")) == 3
+
+    response = client.get(reverse("documentrequest-list"), {"created_after": "foo"})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert "created_after" in response.data
+
+
+@pytest.fixture(name="memory_storage")
+def fixture_memory_storage(monkeypatch, settings):
+    """Store generated documents in an in-memory storage"""
+
+    settings.STORAGES = {
+        **settings.STORAGES,
+        "documents": {"BACKEND": "django.core.files.storage.InMemoryStorage"},
+    }
+    monkeypatch.setattr(defaults, "DOCUMENTS_STORAGE", "documents")
+    return storages["documents"]
+
+
+@pytest.mark.django_db
+def test_document_request_viewset_post_with_storage(monkeypatch, memory_storage):
+    """Test the DocumentRequestViewSet create view with a configured documents
+    storage"""
+
+    monkeypatch.setattr(defaults, "DOCUMENTS_ROOT", Path(tempfile.mkdtemp()))
+
+    data = {
+        "issuer": "marion.issuers.DummyDocument",
+        "context_query": json.dumps({"fullname": "Richie Cunningham"}),
+    }
+    response = client.post(reverse("documentrequest-list"), data, format="json")
+    assert response.status_code == status.HTTP_201_CREATED
+
+    # The document has been written to the storage (not the file system)
+    document_name = f"{response.data['document_id']}.pdf"
+    assert memory_storage.exists(document_name)
+    assert count_documents(defaults.DOCUMENTS_ROOT) == 0
+    assert response.data["document_url"] == f"http://testserver/media/{document_name}"
+
+
+@pytest.mark.django_db
+def test_document_download_view_with_storage(monkeypatch, memory_storage):
+    """Test the document_download view with a configured documents storage"""
+
+    document_request = factories.DocumentRequestFactory(
+        issuer="marion.issuers.DummyDocument",
+        context_query={"fullname": "Richie Cunningham"},
+    )
+    with memory_storage.open(document_request.get_document_name(), "rb") as pdf:
+        content = pdf.read()
+    assert content.startswith(b"%PDF")
+
+    url = reverse("documents-download", args=[document_request.document_id])
+    response = client.get(url)
+    assert response.status_code == status.HTTP_200_OK
+    assert response["Content-Length"] == str(len(content))
+    assert b"".join(response.streaming_content) == content
+
+    etag = response["ETag"]
+    assert client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == (
+        status.HTTP_304_NOT_MODIFIED
+    )
+
+    response = client.get(url, HTTP_RANGE="bytes=0-99")
+    assert response.status_code == status.HTTP_206_PARTIAL_CONTENT
+    assert b"".join(response.streaming_content) == content[:100]
+
+    # Documents cannot be sent by the front proxy without an URL prefix
+    monkeypatch.setattr(defaults, "DOWNLOAD_SENDFILE_HEADER", "X-Sendfile")
+    response = client.get(url)
+    assert "X-Sendfile" not in response
+    assert b"".join(response.streaming_content) == content
+
+    monkeypatch.setattr(defaults, "DOWNLOAD_SENDFILE_URL_PREFIX", "/protected/")
+    response = client.get(url)
+    assert response["X-Sendfile"] == (f"/protected/{document_request.document_id}.pdf")
+
+    memory_storage.delete(document_request.get_document_name())
+    assert client.get(url).status_code == status.HTTP_404_NOT_FOUND
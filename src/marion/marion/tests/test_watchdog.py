@@ -0,0 +1,92 @@
+"""Tests for the marion.watchdog module"""
+
+import os
+from unittest.mock import mock_open, patch
+
+from marion import watchdog
+from marion.issuers import DummyDocument
+from marion.signals import document_created
+
+
+def test_get_rss():
+    """Test the get_rss function"""
+
+    with patch("builtins.open", mock_open(read_data="1000 250 100 1 0 300 0\n")):
+        assert watchdog.get_rss() == 250 * watchdog.PAGE_SIZE
+
+    with patch("builtins.open", side_effect=FileNotFoundError):
+        assert watchdog.get_rss() is None
+
+    if os.path.exists("/proc/self/statm"):
+        assert watchdog.get_rss() > 0
+
+
+def test_memory_watchdog_max_rss(monkeypatch):
+    """Test the MemoryWatchdog class with a resident set size limit"""
+
+    rss = 100
+    monkeypatch.setattr(watchdog, "get_rss", lambda: rss)
+    memory_watchdog = watchdog.MemoryWatchdog(max_rss=200)
+    assert memory_watchdog.enabled
+
+    assert memory_watchdog.check() is None
+    assert memory_watchdog.renders == 1
+
+    rss = 300
+    assert memory_watchdog.check() == (
+        "resident set size (300 bytes) exceeds 200 bytes"
+    )
+
+    # The process stays flagged for recycling
+    rss = 100
+    assert memory_watchdog.recycle_reason is not None
+    assert memory_watchdog.check() is not None
+    assert memory_watchdog.renders == 3
+
+    memory_watchdog.reset()
+    assert memory_watchdog.renders == 0
+    assert memory_watchdog.recycle_reason is None
+
+    # The resident set size cannot be read
+    rss = None
+    assert memory_watchdog.check() is None
+
+
+def test_memory_watchdog_max_renders(monkeypatch):
+    """Test the MemoryWatchdog class with a rendered documents limit"""
+
+    monkeypatch.setattr(watchdog, "get_rss", lambda: 0)
+    memory_watchdog = watchdog.MemoryWatchdog(max_renders=2)
+
+    assert memory_watchdog.check() is None
+    assert memory_watchdog.check() == "2 documents rendered"
+
+
+def test_memory_watchdog_disabled():
+    """Test the MemoryWatchdog class without limits"""
+
+    memory_watchdog = watchdog.MemoryWatchdog()
+    assert not memory_watchdog.enabled
+
+    for _ in range(10):
+        assert memory_watchdog.check() is None
+
+
+def test_memory_watchdog_document_created(monkeypatch):
+    """Test that rendered documents are checked by the watchdog"""
+
+    rss = iter([100, 300])
+    monkeypatch.setattr(watchdog, "get_rss", lambda: next(rss))
+    memory_watchdog = watchdog.MemoryWatchdog(max_rss=200)
+
+    document_created.connect(memory_watchdog.document_created, sender=DummyDocument)
+    try:
+        for fullname in ("Richie Cunningham", "Marion Ross"):
+            DummyDocument(context_query={"fullname": fullname}).create(persist=False)
+    finally:
+        document_created.disconnect(
+            memory_watchdog.document_created, sender=DummyDocument
+        )
+
+    assert memory_watchdog.renders == 2
+    assert memory_watchdog.recycle_reason is not None
@@ -10,5 +10,10 @@ router = routers.DefaultRouter()
 router.register(r"requests", views.DocumentRequestViewSet)
 
 urlpatterns = [
+    path(
+        "downloads/<uuid:document_id>/",
+        views.document_download,
+        name="documents-download",
+    ),
     path("", include(router.urls)),
 ]
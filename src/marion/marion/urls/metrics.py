@@ -0,0 +1,13 @@
+"""Metrics Urls for the marion application"""
+
+from django.urls import path
+
+from .. import views
+
+urlpatterns = [
+    path(
+        "",
+        views.document_metrics,
+        name="documents-metrics",
+    )
+]
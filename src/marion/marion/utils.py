@@ -1,6 +1,7 @@
 """Documents generation utilities."""
 
 import mimetypes
+from io import BytesIO
 from pathlib import Path
 from urllib.parse import urlparse
 
@@ -10,14 +11,65 @@ from django.core.exceptions import SuspiciousFileOperation
 
 import weasyprint
 
+from . import defaults
+from .cache import LRUCache
+
 static_storage = storages["staticfiles"]
+static_files_cache = LRUCache(maxsize=defaults.STATIC_FILES_CACHE_MAX_BYTES, weigh=len)
+
+
+def read_static_file(path):
+    """Read a static file content from the static files cache or storage.
+
+    Static files content is cached in memory (as bytes) with a least recently
+    used eviction policy, the cache size being limited to
+    STATIC_FILES_CACHE_MAX_BYTES bytes. In debug mode, static files are always
+    read from the storage so that modified files are taken into account.
+
+    """
+
+    if settings.DEBUG:
+        with static_storage.open(path, "rb") as static_file:
+            return static_file.read()
+
+    content = static_files_cache.get(path)
+    if content is None:
+        with static_storage.open(path, "rb") as static_file:
+            content = static_file.read()
+        static_files_cache.set(path, content)
+    return content
+
+
+def preload_static_files(directories):
+    """Load static files from static storage directories in the cache.
+
+    Static files stored in sub-directories are also loaded. Files that do not
+    fit in the cache anymore are ignored.
+
+    """
+
+    for directory in directories:
+        try:
+            sub_directories, files = static_storage.listdir(directory)
+        except FileNotFoundError:
+            continue
+        for name in files:
+            path = f"{directory}/{name}"
+            size = static_storage.size(path)
+            if static_files_cache.size + size > static_files_cache.maxsize:
+                continue
+            read_static_file(path)
+        preload_static_files(
+            f"{directory}/{sub_directory}" for sub_directory in sub_directories
+        )
 
 
 def static_file_fetcher(url, *args, **kwargs):
     """Weasyprint static files fetcher.
 
     If the file URL starts with 'file://', it will be fetched from the configured
-    storage.
+    storage. Fetched static files content is cached in memory (see
+    read_static_file).
 
     The following code has been adapted from the django-weasyprint project [1].
 
@@ -37,7 +89,7 @@ def static_file_fetcher(url, *args, **kwargs):
 
         path = url_path.replace(settings.STATIC_URL, "", 1)
         try:
-            data["file_obj"] = static_storage.open(path, "rb")
+            data["file_obj"] = BytesIO(read_static_file(path))
         # A SuspiciousFileOperation is raised by Django if the file has been
         # found outside referenced static file paths. In this case, we ignore
         # this error and fallback to the default Weasyprint fetcher for files
@@ -1,22 +1,51 @@
 """Views for the marion application"""
 
+import hashlib
 import json
+import logging
+import re
 
 from django.conf import settings
 from django.core.exceptions import PermissionDenied, ValidationError
-from django.http import HttpResponse, HttpResponseBadRequest
+from django.core.files.storage import FileSystemStorage
+from django.http import (
+    FileResponse,
+    Http404,
+    HttpResponse,
+    HttpResponseBadRequest,
+    HttpResponseNotModified,
+    StreamingHttpResponse,
+)
+from django.shortcuts import get_object_or_404
 from django.template import Context
+from django.utils.http import parse_etags, quote_etag
 from django.utils.module_loading import import_string
+from django.views.decorators.http import require_safe
 
 from rest_framework import mixins, status, viewsets
+from rest_framework.decorators import action, api_view
+from rest_framework.negotiation import BaseContentNegotiation
 from rest_framework.response import Response
 
+from . import defaults, metrics
 from .exceptions import (
     DocumentIssuerContextQueryValidationError,
     DocumentIssuerContextValidationError,
 )
-from .models import DocumentRequest
+from .filters import DocumentRequestFilterBackend
+from .models import DocumentRequest, DocumentRequestStatus, IdempotencyKey
+from .pagination import DocumentRequestCursorPagination
 from .serializers import DocumentRequestSerializer
+from .storage import get_storage
+
+logger = logging.getLogger(__name__)
+
+# Errors that are reported to API clients
+DOCUMENT_REQUEST_ERRORS = (
+    DocumentIssuerContextQueryValidationError,
+    DocumentIssuerContextValidationError,
+    ValidationError,
+)
 
 
 class DocumentRequestViewSet(
@@ -25,26 +54,256 @@ class DocumentRequestViewSet(
     mixins.RetrieveModelMixin,
     viewsets.GenericViewSet,
 ):
-    """API endpoint that allows document requests to be viewed, listed or created"""
+    """API endpoint that allows document requests to be viewed, listed or created.
+
+    Document requests are listed using cursor pagination and can be filtered
+    by issuer and creation date (see the DocumentRequestFilterBackend class).
+
+    """
 
     # pylint: disable=too-many-ancestors
     queryset = DocumentRequest.objects.all()
     serializer_class = DocumentRequestSerializer
+    filter_backends = [DocumentRequestFilterBackend]
+    pagination_class = DocumentRequestCursorPagination
 
     def create(self, request, *args, **kwargs):
-        """Create a document request (and the corresponding document)"""
+        """Create a document request (and the corresponding document).
+
+        In the asynchronous request mode, the document will be generated later
+        by a worker: a 202 (accepted) response is returned. If documents
+        deduplication is active and an identical document request exists, it
+        is returned with a 200 (OK) response.
+
+        API clients can safely retry this call with the same Idempotency-Key
+        header: the response of the first call is returned (once completed)
+        instead of creating another document request.
+
+        """
+
+        key = request.headers.get("Idempotency-Key")
+        if key is None:
+            return self.create_document_request(request)
+        if not key or len(key) > IdempotencyKey.key.field.max_length:
+            return Response(
+                data={"error": "Invalid Idempotency-Key header"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        payload = json.dumps(request.data, sort_keys=True, default=str)
+        fingerprint = hashlib.sha256(f"{request.path}\n{payload}".encode()).hexdigest()
+        idempotency_key, claimed = IdempotencyKey.claim(key, fingerprint)
+
+        if not claimed:
+            if idempotency_key.fingerprint != fingerprint:
+                return Response(
+                    data={
+                        "error": (
+                            "Idempotency-Key has already been used for another "
+                            "request"
+                        )
+                    },
+                    status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                )
+            if not idempotency_key.wait(defaults.IDEMPOTENCY_KEY_WAIT_TIMEOUT):
+                return Response(
+                    data={
+                        "error": (
+                            "A request with the same Idempotency-Key is in progress"
+                        )
+                    },
+                    status=status.HTTP_409_CONFLICT,
+                    headers={"Retry-After": "1"},
+                )
+            return Response(
+                data=idempotency_key.response,
+                status=idempotency_key.status_code,
+                headers={"Idempotent-Replayed": "true"},
+            )
+
+        try:
+            response = self.create_document_request(request)
+        except Exception:
+            idempotency_key.release()
+            raise
+
+        # Server errors may be transient: the request can be retried
+        if response.status_code >= status.HTTP_500_INTERNAL_SERVER_ERROR:
+            idempotency_key.release()
+        else:
+            idempotency_key.complete(response.status_code, response.data)
+        return response
+
+    def create_document_request(self, request):
+        """Validate request data and save the document request"""
+
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
 
         try:
-            return super().create(request, *args, **kwargs)
-        except (
-            DocumentIssuerContextQueryValidationError,
-            DocumentIssuerContextValidationError,
-            ValidationError,
-        ) as error:
+            document_request, status_code = self.save_document_request(
+                DocumentRequest(**serializer.validated_data)
+            )
+        except DOCUMENT_REQUEST_ERRORS as error:
             return Response(
                 data={"error": str(error)}, status=status.HTTP_400_BAD_REQUEST
             )
 
+        data = self.get_serializer(document_request).data
+        return Response(
+            data, status=status_code, headers=self.get_success_headers(data)
+        )
+
+    # pylint: disable=no-self-use
+    def save_document_request(self, document_request):
+        """Save a new document request given the active request mode.
+
+        Returns the saved document request (or its existing duplicate) and the
+        corresponding response status code.
+
+        """
+
+        if defaults.DEDUPLICATE_DOCUMENTS:
+            duplicate = document_request.find_duplicate()
+            if duplicate is not None:
+                return duplicate, status.HTTP_200_OK
+
+        if defaults.DOCUMENT_REQUEST_MODE == "async":
+            document_request.enqueue()
+            return document_request, status.HTTP_202_ACCEPTED
+
+        if defaults.DOCUMENT_REQUEST_MODE == "lazy":
+            document_request.defer()
+            return document_request, status.HTTP_201_CREATED
+
+        document_request.save()
+        return document_request, status.HTTP_201_CREATED
+
+    @action(detail=False, methods=["post"], url_path="bulk")
+    def bulk(self, request):
+        """Create document requests (and the corresponding documents) in bulk.
+
+        The request payload is a list of document requests. All document
+        requests are validated before generating documents of valid ones (in
+        parallel with the process pool renderer). Results are returned for
+        each document request in the payload order, with a 207 (multi-status)
+        response if some of them failed. If documents deduplication is active,
+        existing identical document requests are returned and identical
+        document requests of the payload are only created once: the first one
+        is returned for the following ones.
+
+        """
+
+        if not isinstance(request.data, list):
+            return Response(
+                data={"error": "Expected a list of document requests"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if len(request.data) > defaults.BULK_MAX_ITEMS:
+            return Response(
+                data={
+                    "error": (
+                        f"Too many document requests (maximum: "
+                        f"{defaults.BULK_MAX_ITEMS})"
+                    )
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        results = [None] * len(request.data)
+        document_requests = {}
+        # Index of the first document request per context digest (of the
+        # issuer and context query) in the payload, and index of the first one
+        # for each following duplicate
+        first_indexes = {}
+        payload_duplicates = {}
+        for index, data in enumerate(request.data):
+            serializer = self.get_serializer(data=data)
+            if not serializer.is_valid():
+                results[index] = {
+                    "status": status.HTTP_400_BAD_REQUEST,
+                    "errors": serializer.errors,
+                }
+                continue
+            document_request = DocumentRequest(**serializer.validated_data)
+            try:
+                document_request.get_issuer()
+                duplicate = (
+                    document_request.find_duplicate()
+                    if defaults.DEDUPLICATE_DOCUMENTS
+                    else None
+                )
+            except DOCUMENT_REQUEST_ERRORS as error:
+                results[index] = {
+                    "status": status.HTTP_400_BAD_REQUEST,
+                    "error": str(error),
+                }
+                continue
+            if duplicate is not None:
+                results[index] = {
+                    "status": status.HTTP_200_OK,
+                    "data": self.get_serializer(duplicate).data,
+                }
+                continue
+            if defaults.DEDUPLICATE_DOCUMENTS:
+                digest = document_request.get_context_digest()
+                if digest in first_indexes:
+                    payload_duplicates[index] = first_indexes[digest]
+                    continue
+                first_indexes[digest] = index
+            document_requests[index] = document_request
+
+        if defaults.DOCUMENT_REQUEST_MODE == "async":
+            outcomes = [
+                (document_request, None)
+                for document_request in DocumentRequest.bulk_enqueue(
+                    document_requests.values()
+                )
+            ]
+            success_status = status.HTTP_202_ACCEPTED
+        elif defaults.DOCUMENT_REQUEST_MODE == "lazy":
+            outcomes = DocumentRequest.bulk_defer(document_requests.values())
+            success_status = status.HTTP_201_CREATED
+        else:
+            outcomes = DocumentRequest.bulk_generate(document_requests.values())
+            success_status = status.HTTP_201_CREATED
+
+        for index, (document_request, error) in zip(document_requests, outcomes):
+            if error is None:
+                results[index] = {
+                    "status": success_status,
+                    "data": self.get_serializer(document_request).data,
+                }
+            elif isinstance(error, DOCUMENT_REQUEST_ERRORS):
+                results[index] = {
+                    "status": status.HTTP_400_BAD_REQUEST,
+                    "error": str(error),
+                }
+            else:
+                logger.error("Document rendering failed", exc_info=error)
+                results[index] = {
+                    "status": status.HTTP_500_INTERNAL_SERVER_ERROR,
+                    "error": "Document rendering failed",
+                }
+
+        # Duplicates share the outcome of the first identical document request
+        for index, first_index in payload_duplicates.items():
+            results[index] = results[first_index]
+            if results[index]["status"] == success_status:
+                results[index] = {**results[index], "status": status.HTTP_200_OK}
+
+        return Response(
+            data={"results": results},
+            status=(
+                success_status
+                if all(
+                    result["status"] in (success_status, status.HTTP_200_OK)
+                    for result in results
+                )
+                else status.HTTP_207_MULTI_STATUS
+            ),
+        )
+
 
 def document_template_debug(request):
     """Document template debug view.
@@ -71,3 +330,194 @@ def document_template_debug(request):
     html = issuer.get_html().render(Context(context))
 
     return HttpResponse(html)
+
+
+@require_safe
+def document_metrics(request):  # pylint: disable=unused-argument
+    """Export document rendering metrics in the Prometheus text format.
+
+    This view is not protected: its access should be restricted to the
+    metrics collector (_e.g._ at the reverse proxy level).
+
+    """
+
+    if not metrics.is_enabled():
+        raise Http404
+
+    content, content_type = metrics.export()
+    return HttpResponse(content, content_type=content_type)
+
+
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def _parse_range(range_header, size):
+    """Parse a single byte range HTTP Range header.
+
+    Returns the (start, end) range (end being included) or None if the header
+    should be ignored (missing, invalid or multiple ranges). Raises a
+    ValueError if the range cannot be satisfied given the file size.
+
+    """
+
+    match = RANGE_RE.match(range_header or "")
+    if match is None:
+        return None
+
+    start, end = match.groups()
+    if not start and not end:
+        return None
+    if not start:
+        # Suffix range: the last N bytes
+        length = int(end)
+        if length == 0 or size == 0:
+            raise ValueError("Unsatisfiable range")
+        return max(size - length, 0), size - 1
+
+    start = int(start)
+    end = int(end) if end else size - 1
+    if start > end:
+        return None
+    if start >= size:
+        raise ValueError("Unsatisfiable range")
+    return start, min(end, size - 1)
+
+
+def _read_range(document_file, start, length, chunk_size):
+    """Read length bytes of a file from start, in chunks"""
+
+    with document_file:
+        document_file.seek(start)
+        while length > 0:
+            chunk = document_file.read(min(chunk_size, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def _get_sendfile_location(storage, document_name):
+    """Get the document location sent to the front proxy (if any)"""
+
+    if defaults.DOWNLOAD_SENDFILE_URL_PREFIX is not None:
+        return f"{defaults.DOWNLOAD_SENDFILE_URL_PREFIX}{document_name}"
+    if isinstance(storage, FileSystemStorage):
+        return storage.path(document_name)
+    return None
+
+
+def _strip_weak_etag(etag):
+    """Get the opaque tag of an entity tag (for weak comparison)"""
+    return etag[2:] if etag.startswith("W/") else etag
+
+
+class DocumentDownloadContentNegotiation(BaseContentNegotiation):
+    """Ignore the client Accept header for documents downloads.
+
+    Documents are always sent as PDF files: the Accept header of clients
+    expecting them (_e.g._ application/pdf) should not make the request fail
+    with a 406 (not acceptable) response. Errors are rendered with the first
+    configured renderer.
+
+    """
+
+    def select_parser(self, request, parsers):
+        return parsers[0]
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return (renderers[0], renderers[0].media_type)
+
+
+@api_view(["GET", "HEAD"])
+def document_download(request, document_id):
+    """Download a generated document.
+
+    The document is streamed in chunks from the documents storage, with
+    support for conditional (ETag) and single range requests. Lazy document
+    requests documents are rendered on first download (in the lazy request
+    mode, deleted documents are also rendered again). If the
+    DOWNLOAD_SENDFILE_HEADER setting is set, sending the file is delegated to
+    the front proxy (_e.g._ using the X-Accel-Redirect header with Nginx).
+
+    As documents may be rendered on download, the API authentication,
+    permission and throttling classes apply (see Django Rest Framework's
+    DEFAULT_*_CLASSES settings).
+
+    """
+
+    document_request = get_object_or_404(DocumentRequest, document_id=document_id)
+    storage = get_storage()
+    if (
+        document_request.status == DocumentRequestStatus.LAZY
+        or defaults.DOCUMENT_REQUEST_MODE == "lazy"
+    ):
+        document_name = document_request.find_or_render_document(storage)
+    else:
+        document_name = document_request.find_document_name(storage)
+    if document_name is None:
+        raise Http404("Document file not found")
+
+    size = storage.size(document_name)
+    try:
+        modified = int(storage.get_modified_time(document_name).timestamp() * 1e6)
+    except NotImplementedError:
+        modified = 0
+    etag = quote_etag(f"{document_id}-{modified:x}-{size:x}")
+    # If-None-Match uses the weak comparison function (RFC 9110)
+    if_none_match = parse_etags(request.headers.get("If-None-Match", ""))
+    if "*" in if_none_match or etag in map(_strip_weak_etag, if_none_match):
+        response = HttpResponseNotModified()
+        response["ETag"] = etag
+        return response
+
+    filename = f"{document_id}.pdf"
+    sendfile_location = (
+        _get_sendfile_location(storage, document_name)
+        if defaults.DOWNLOAD_SENDFILE_HEADER
+        else None
+    )
+    if sendfile_location is not None:
+        response = HttpResponse(content_type="application/pdf")
+        response[defaults.DOWNLOAD_SENDFILE_HEADER] = sendfile_location
+        response["Content-Disposition"] = f'inline; filename="{filename}"'
+        response["ETag"] = etag
+        return response
+
+    byte_range = None
+    if_range = request.headers.get("If-Range")
+    if if_range is None or if_range == etag:
+        try:
+            byte_range = _parse_range(request.headers.get("Range"), size)
+        except ValueError:
+            response = HttpResponse(
+                status=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE
+            )
+            response["Content-Range"] = f"bytes */{size}"
+            return response
+
+    document_file = storage.open(document_name, "rb")
+    if byte_range is None:
+        response = FileResponse(
+            document_file, content_type="application/pdf", filename=filename
+        )
+        response.block_size = defaults.DOWNLOAD_CHUNK_SIZE
+    else:
+        start, end = byte_range
+        response = StreamingHttpResponse(
+            _read_range(
+                document_file, start, end - start + 1, defaults.DOWNLOAD_CHUNK_SIZE
+            ),
+            status=status.HTTP_206_PARTIAL_CONTENT,
+            content_type="application/pdf",
+        )
+        response["Content-Length"] = end - start + 1
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+        response["Content-Disposition"] = f'inline; filename="{filename}"'
+
+    response["Accept-Ranges"] = "bytes"
+    response["ETag"] = etag
+    return response
+
+
+# The api_view decorator does not support setting the content negotiation class
+document_download.cls.content_negotiation_class = DocumentDownloadContentNegotiation
@@ -0,0 +1,119 @@
+"""Memory watchdog for the marion application.
+
+Weasyprint renderings allocate large layout trees and image buffers: long
+running processes rendering many documents (_e.g._ gunicorn workers) may grow
+until they get killed by the OOM killer in the middle of a request. The memory
+watchdog checks the process resident set size after each document rendering
+and flags the process for recycling once it exceeds the WORKER_MAX_RSS
+setting, or once it has rendered WORKER_MAX_RENDERS documents.
+
+Recycling the process is left to its manager, once the current work is done:
+see the post_request hook of the gunicorn configuration shipped in the docker
+image and the process_document_requests management command.
+
+"""
+
+import logging
+import os
+import resource
+
+from . import defaults
+
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = resource.getpagesize()
+
+
+def get_rss():
+    """Get the current process resident set size (in bytes).
+
+    Returns None if it cannot be read (/proc/self/statm is only available on
+    Linux).
+
+    """
+
+    try:
+        with open("/proc/self/statm", encoding="ascii") as statm:
+            return int(statm.read().split()[1]) * PAGE_SIZE
+    except OSError:
+        return None
+
+
+class MemoryWatchdog:
+    """Flag the current process for recycling when it uses too much memory.
+
+    Arguments:
+
+    - max_rss<int> = None
+
+        The resident set size (in bytes) above which the process should be
+        recycled (default: never).
+
+    - max_renders<int> = None
+
+        The number of rendered documents after which the process should be
+        recycled (default: never).
+
+    """
+
+    def __init__(self, max_rss=None, max_renders=None):
+        self.max_rss = max_rss
+        self.max_renders = max_renders
+        self.renders = 0
+        self.recycle_reason = None
+
+    @property
+    def enabled(self):
+        """Check whether the watchdog has a limit to enforce"""
+        return self.max_rss is not None or self.max_renders is not None
+
+    def reset(self):
+        """Reset the watchdog state, _e.g._ in a forked process"""
+
+        self.renders = 0
+        self.recycle_reason = None
+
+    def check(self):
+        """Count a rendered document and check the process limits.
+
+        Returns the reason why the process should be recycled or None.
+
+        """
+
+        self.renders += 1
+        if self.recycle_reason is not None:
+            return self.recycle_reason
+
+        if self.max_renders is not None and self.renders >= self.max_renders:
+            self.recycle_reason = f"{self.renders} documents rendered"
+        elif self.max_rss is not None:
+            rss = get_rss()
+            if rss is not None and rss > self.max_rss:
+                self.recycle_reason = (
+                    f"resident set size ({rss} bytes) exceeds {self.max_rss} bytes"
+                )
+
+        if self.recycle_reason is not None:
+            logger.warning(
+                "Process %d should be recycled: %s", os.getpid(), self.recycle_reason
+            )
+        return self.recycle_reason
+
+    # pylint: disable=unused-argument
+    def document_created(self, sender, **kwargs):
+        """Check the process limits once a document has been created.
+
+        This receiver is connected to the document_created signal when the
+        application starts if the watchdog is enabled.
+
+        """
+
+        self.check()
+
+
+memory_watchdog = MemoryWatchdog(
+    max_rss=defaults.WORKER_MAX_RSS, max_renders=defaults.WORKER_MAX_RENDERS
+)
+
+# Limits are enforced per process
+os.register_at_fork(after_in_child=memory_watchdog.reset)